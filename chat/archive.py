@@ -0,0 +1,276 @@
+"""
+Arxiu dels xats dels esdeveniments finalitzats.
+
+``archive_event`` desa tots els missatges visibles d'un esdeveniment en un sol fitxer
+(``ChatTranscript.file``) i esborra les seves files de ChatMessage, de manera que la
+col·lecció de missatges només conté els xats dels esdeveniments actius.
+
+Format del fitxer::
+
+    MAGIC | bloc 0 | bloc 1 | ... | índex | offset índex (8 bytes) | mida índex (8 bytes) | MAGIC
+
+Cada bloc és un tros de ``CHAT_ARCHIVE_BLOCK_SIZE`` missatges (una línia JSON per
+missatge, ordenats per id) comprimit amb zlib per separat. L'índex (JSON comprimit)
+guarda per a cada bloc el primer i l'últim id, la posició i la mida, així per llegir
+una pàgina només cal descomprimir els blocs que la contenen.
+
+Les vistes del xat llegeixen els xats arxivats amb ``transcripts.get(event_pk)``.
+"""
+import bisect
+import json
+import struct
+import threading
+import time
+import zlib
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import transaction
+from django.utils.dateparse import parse_datetime
+from django.utils.timesince import timesince
+
+from .models import ChatMessage, ChatTranscript
+
+BLOCK_SIZE = getattr(settings, 'CHAT_ARCHIVE_BLOCK_SIZE', 200)
+CHECK_SECONDS = getattr(settings, 'CHAT_ARCHIVE_CHECK_SECONDS', 30)
+
+MAGIC = b'SECHAT1\n'
+FOOTER = struct.Struct('>QQ')
+
+# Fitxers (índexs) i blocs descomprimits que es mantenen en memòria
+MAX_TRANSCRIPTS = 256
+MAX_BLOCKS = 64
+
+
+class ArchiveError(Exception):
+    pass
+
+
+def _entry(msg):
+    return {
+        'id': msg.id,
+        'user_id': msg.user_id,
+        'display_name': msg.user.username if msg.user else 'Anònim',
+        'message': msg.message,
+        'created_at': msg.created_at.isoformat(),
+    }
+
+
+def build_transcript(messages, block_size=BLOCK_SIZE):
+    """
+    Genera el contingut del fitxer a partir dels missatges (ordenats per id).
+    Retorna (bytes, índex).
+    """
+    parts = [MAGIC]
+    offset = len(MAGIC)
+    blocks = []
+    count = raw_size = 0
+    pending = []
+
+    def flush():
+        nonlocal offset, raw_size
+        raw = '\n'.join(json.dumps(entry, ensure_ascii=False) for entry in pending).encode()
+        data = zlib.compress(raw, 6)
+        blocks.append([pending[0]['id'], pending[-1]['id'], offset, len(data), len(pending)])
+        parts.append(data)
+        offset += len(data)
+        raw_size += len(raw)
+        pending.clear()
+
+    for msg in messages:
+        pending.append(_entry(msg))
+        count += 1
+        if len(pending) >= block_size:
+            flush()
+    if pending:
+        flush()
+
+    index = {
+        'version': 1,
+        'count': count,
+        'last_id': blocks[-1][1] if blocks else 0,
+        'raw_size': raw_size,
+        'blocks': blocks,
+    }
+    index_data = zlib.compress(json.dumps(index).encode())
+    parts.append(index_data)
+    parts.append(FOOTER.pack(offset, len(index_data)))
+    parts.append(MAGIC)
+    return b''.join(parts), index
+
+
+def archive_event(event, block_size=BLOCK_SIZE):
+    """
+    Arxiva el xat d'un esdeveniment i n'esborra els missatges de la base de dades.
+    Retorna el ChatTranscript creat.
+    """
+    if ChatTranscript.objects.filter(event=event).exists():
+        raise ArchiveError(f"El xat de l'esdeveniment {event.pk} ja està arxivat")
+
+    messages = (
+        ChatMessage.objects.filter(event=event, is_deleted=False)
+        .select_related('user')
+        .order_by('id')
+    )
+    content, index = build_transcript(messages.iterator(chunk_size=2000), block_size)
+
+    transcript = ChatTranscript(
+        event=event,
+        message_count=index['count'],
+        last_message_id=index['last_id'],
+        raw_size=index['raw_size'],
+        compressed_size=len(content),
+    )
+    transcript.file.save(f'{event.pk}.chat', ContentFile(content), save=False)
+
+    try:
+        with transaction.atomic():
+            # Un missatge escrit mentre s'arxivava es perdria en esborrar
+            if ChatMessage.objects.filter(event=event, is_deleted=False,
+                                          id__gt=index['last_id']).exists():
+                raise ArchiveError(f"L'esdeveniment {event.pk} encara rep missatges")
+            transcript.save()
+            ChatMessage.objects.filter(event=event).delete()
+    except Exception:
+        transcript.file.delete(save=False)
+        raise
+
+    from .cache import recent_messages
+    recent_messages.discard(event.pk)
+    transcripts.forget(event.pk)
+    return transcript
+
+
+def render_entry(entry, now):
+    """Diccionari per al frontend, igual que el dels missatges vius (però no es poden esborrar)"""
+    return {
+        'id': entry['id'],
+        'display_name': entry['display_name'],
+        'message': entry['message'],
+        'created_at': timesince(parse_datetime(entry['created_at']), now) + ' enrere',
+        'can_delete': False,
+        'is_highlighted': False,
+    }
+
+
+class TranscriptReader:
+    """Lectura per blocs d'un fitxer arxivat"""
+
+    def __init__(self, transcript, block_cache):
+        self.event_pk = transcript.event_id
+        self.file_name = transcript.file.name
+        self.storage = transcript.file.storage
+        self._block_cache = block_cache
+
+        with self.storage.open(self.file_name, 'rb') as handle:
+            handle.seek(-(FOOTER.size + len(MAGIC)), 2)
+            tail = handle.read()
+            if tail[FOOTER.size:] != MAGIC:
+                raise ArchiveError(f'Fitxer de xat arxivat malmès: {self.file_name}')
+            index_offset, index_length = FOOTER.unpack(tail[:FOOTER.size])
+            handle.seek(index_offset)
+            index = json.loads(zlib.decompress(handle.read(index_length)))
+
+        self.count = index['count']
+        self.last_id = index['last_id']
+        self.blocks = index['blocks']
+        self._first_ids = [block[0] for block in self.blocks]
+        self._last_ids = [block[1] for block in self.blocks]
+
+    def last(self, size):
+        """Els ``size`` missatges més recents, en ordre cronològic"""
+        entries = []
+        position = len(self.blocks)
+        while position > 0 and len(entries) < size:
+            position -= 1
+            entries = self._read(position) + entries
+        return entries[-size:] if size else []
+
+    def after(self, after_id, size):
+        """Fins a ``size`` missatges amb id més gran que ``after_id``"""
+        entries = []
+        position = bisect.bisect_right(self._last_ids, after_id)
+        while position < len(self.blocks) and len(entries) < size:
+            entries.extend(entry for entry in self._read(position) if entry['id'] > after_id)
+            position += 1
+        return entries[:size]
+
+    def before(self, before_id, size):
+        """Fins a ``size`` missatges amb id més petit que ``before_id``, en ordre cronològic"""
+        entries = []
+        position = bisect.bisect_left(self._first_ids, before_id)
+        while position > 0 and len(entries) < size:
+            position -= 1
+            entries = [entry for entry in self._read(position) if entry['id'] < before_id] + entries
+        return entries[-size:] if size else []
+
+    def _read(self, position):
+        key = (self.file_name, position)
+        entries = self._block_cache.get(key)
+        if entries is None:
+            _, _, offset, length, _ = self.blocks[position]
+            with self.storage.open(self.file_name, 'rb') as handle:
+                handle.seek(offset)
+                raw = zlib.decompress(handle.read(length))
+            entries = [json.loads(line) for line in raw.decode().split('\n')]
+            self._block_cache.put(key, entries)
+        return entries
+
+
+class _LRU:
+    def __init__(self, size):
+        self.size = size
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key not in self._items:
+                return default
+            self._items.move_to_end(key)
+            return self._items[key]
+
+    def put(self, key, value):
+        with self._lock:
+            self._items[key] = value
+            self._items.move_to_end(key)
+            while len(self._items) > self.size:
+                self._items.popitem(last=False)
+
+    def pop(self, key):
+        with self._lock:
+            self._items.pop(key, None)
+
+
+class TranscriptCache:
+    """
+    Sap quins esdeveniments tenen el xat arxivat. Els arxivats es recorden (un arxiu no
+    canvia); els que no ho estan es tornen a comprovar cada ``CHAT_ARCHIVE_CHECK_SECONDS``,
+    que és el temps que pot tardar un altre procés a veure un xat acabat d'arxivar.
+    """
+
+    def __init__(self, check_seconds=CHECK_SECONDS):
+        self.check_seconds = check_seconds
+        self._readers = _LRU(MAX_TRANSCRIPTS)
+        self._blocks = _LRU(MAX_BLOCKS)
+
+    def get(self, event_pk):
+        """TranscriptReader de l'esdeveniment, o None si el xat no està arxivat"""
+        cached = self._readers.get(event_pk)
+        if cached is not None:
+            reader, checked = cached
+            if reader is not None or time.monotonic() - checked < self.check_seconds:
+                return reader
+
+        transcript = ChatTranscript.objects.filter(event_id=event_pk).first()
+        reader = TranscriptReader(transcript, self._blocks) if transcript else None
+        self._readers.put(event_pk, (reader, time.monotonic()))
+        return reader
+
+    def forget(self, event_pk):
+        self._readers.pop(event_pk)
+
+
+# Instància única del procés
+transcripts = TranscriptCache()
@@ -0,0 +1,150 @@
+"""
+Broker en memòria per al xat en directe.
+
+Reparteix els missatges nous i les eliminacions d'un esdeveniment a tots els
+subscriptors connectats al canal de push (vegeu chat.stream) i desperta les
+peticions de long-poll que esperen en la condició de l'esdeveniment. Viu dins del
+procés ASGI: les vistes síncrones (que Django executa en un fil) publiquen i el
+bucle asyncio entrega els missatges.
+"""
+import asyncio
+import threading
+import time
+from collections import defaultdict
+
+# Segons sense publicacions després dels quals s'oblida la seqüència d'un esdeveniment
+# sense connexions (un long-poll la llegeix just abans d'esperar, no minuts abans)
+SEQUENCE_TTL = 300
+
+
+class ChatBroker:
+    """Subscripcions per esdeveniment amb una cua asyncio per connexió"""
+
+    # Missatges pendents màxims per connexió; un client massa lent es desconnecta
+    queue_size = 200
+
+    def __init__(self):
+        self._subscribers = defaultdict(set)
+        self._conditions = {}
+        self._waiters = defaultdict(int)
+        # esdeveniment -> (publicació global, instant): una entrada oblidada i tornada a crear
+        # no repeteix mai un valor antic
+        self._sequences = {}
+        self._published = 0
+        self._pruned_at = time.monotonic()
+        self._lock = threading.Lock()
+        self._loop = None
+
+    def subscribe(self, event_pk):
+        """Registra una connexió nova (s'ha de cridar des del bucle asyncio)"""
+        queue = asyncio.Queue(maxsize=self.queue_size)
+        with self._lock:
+            self._loop = asyncio.get_running_loop()
+            self._subscribers[event_pk].add(queue)
+        return queue
+
+    def unsubscribe(self, event_pk, queue):
+        with self._lock:
+            queues = self._subscribers.get(event_pk)
+            if queues is None:
+                return
+            queues.discard(queue)
+            if not queues:
+                del self._subscribers[event_pk]
+
+    def subscriber_count(self, event_pk):
+        with self._lock:
+            return len(self._subscribers.get(event_pk, ()))
+
+    def sequence(self, event_pk):
+        """Nombre de publicacions de l'esdeveniment; serveix per no perdre'n cap en esperar"""
+        with self._lock:
+            entry = self._sequences.get(event_pk)
+            return entry[0] if entry else 0
+
+    async def wait_for_publish(self, event_pk, since, timeout):
+        """
+        Espera (sense consultar la base de dades) que es publiqui alguna cosa a
+        l'esdeveniment després de la seqüència ``since``. Retorna False si s'esgota el temps.
+        """
+        with self._lock:
+            self._loop = asyncio.get_running_loop()
+            condition = self._conditions.get(event_pk)
+            if condition is None:
+                condition = self._conditions[event_pk] = asyncio.Condition()
+            self._waiters[event_pk] += 1
+
+        try:
+            async with condition:
+                await asyncio.wait_for(
+                    condition.wait_for(lambda: self.sequence(event_pk) != since),
+                    timeout,
+                )
+            return True
+        except asyncio.TimeoutError:
+            return False
+        finally:
+            with self._lock:
+                self._waiters[event_pk] -= 1
+                if self._waiters[event_pk] <= 0:
+                    del self._waiters[event_pk]
+                    self._conditions.pop(event_pk, None)
+
+    def publish(self, event_pk, kind, data):
+        """
+        Envia ``(kind, data)`` a tots els subscriptors de l'esdeveniment.
+        Es pot cridar des de qualsevol fil; sense subscriptors no fa res.
+        """
+        with self._lock:
+            self._published += 1
+            now = time.monotonic()
+            self._sequences[event_pk] = (self._published, now)
+            if now - self._pruned_at >= SEQUENCE_TTL:
+                self._prune(now)
+            queues = list(self._subscribers.get(event_pk, ()))
+            condition = self._conditions.get(event_pk)
+            loop = self._loop
+        if (not queues and condition is None) or loop is None or loop.is_closed():
+            return
+
+        item = (kind, data)
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+
+        if running is loop:
+            self._deliver(queues, item, condition)
+        else:
+            loop.call_soon_threadsafe(self._deliver, queues, item, condition)
+
+    def _prune(self, now):
+        """Descarta les seqüències velles dels esdeveniments sense connexions (amb el lock)"""
+        self._pruned_at = now
+        for event_pk, (_, published_at) in list(self._sequences.items()):
+            if (now - published_at >= SEQUENCE_TTL
+                    and event_pk not in self._subscribers and event_pk not in self._conditions):
+                del self._sequences[event_pk]
+
+    @staticmethod
+    def _deliver(queues, item, condition=None):
+        if condition is not None:
+            asyncio.ensure_future(ChatBroker._notify(condition))
+        for queue in queues:
+            try:
+                queue.put_nowait(item)
+            except asyncio.QueueFull:
+                # El client no llegeix prou de pressa: es buida la cua i se'l fa
+                # reconnectar, i en reconnectar recupera el que falta amb Last-Event-ID
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait(('overflow', None))
+
+    @staticmethod
+    async def _notify(condition):
+        async with condition:
+            condition.notify_all()
+
+
+# Instància única del procés
+broker = ChatBroker()
@@ -0,0 +1,376 @@
+"""
+Memòria cau en procés dels missatges recents del xat.
+
+Per a cada esdeveniment en directe es guarden els últims ``CHAT_BUFFER_SIZE`` missatges
+(ja preparats per enviar al frontend) en un buffer circular, i un registre de les
+últimes eliminacions per poder respondre els tombstones de ``?after=``. Els
+esdeveniments s'expulsen per LRU quan n'hi ha més de ``CHAT_BUFFER_MAX_EVENTS``. Els
+xats dels altres esdeveniments es llegeixen de la base de dades (o de l'arxiu).
+
+El buffer s'omple de la base de dades el primer cop que es llegeix l'esdeveniment i
+després l'actualitzen les vistes d'enviar i eliminar. Cada escriptura, un cop desada,
+incrementa la versió de l'esdeveniment a la memòria cau per defecte (``notify``); un
+procés només torna a la base de dades (i només per les novetats) quan la versió no és
+la seva, o com a seguretat si fa ``CHAT_BUFFER_REFRESH_SECONDS`` que no hi va. Sense
+escriptures, llegir el xat no fa cap consulta. Perquè les versions arribin als altres
+processos, la memòria cau per defecte ha de ser compartida (memcached, redis...).
+"""
+import threading
+import time
+from collections import OrderedDict, deque
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.utils import timezone
+from django.utils.timesince import timesince
+
+from events.models import Event
+from .models import ChatMessage
+
+BUFFER_SIZE = getattr(settings, 'CHAT_BUFFER_SIZE', 200)
+MAX_EVENTS = getattr(settings, 'CHAT_BUFFER_MAX_EVENTS', 500)
+REFRESH_SECONDS = getattr(settings, 'CHAT_BUFFER_REFRESH_SECONDS', 60)
+
+# Marge per a eliminacions que es desen just mentre es sincronitza
+REFRESH_MARGIN_SECONDS = 1
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+
+
+def _version_key(event_pk):
+    return f'chat:buffer:version:{event_pk}'
+
+
+class BufferedMessage:
+    """Un missatge del buffer: dades fixes ja serialitzades i estat d'eliminació"""
+
+    __slots__ = ('id', 'user_id', 'created_at', 'is_deleted', 'payload')
+
+    def __init__(self, msg):
+        self.id = msg.id
+        self.user_id = msg.user_id
+        self.created_at = msg.created_at
+        self.is_deleted = msg.is_deleted
+        self.payload = {
+            'id': msg.id,
+            'display_name': msg.user.username if msg.user else 'Anònim',
+            'message': msg.message,
+            'is_highlighted': False,
+        }
+
+    def render(self, user, now):
+        """Diccionari per al frontend; el temps relatiu i can_delete depenen de la petició"""
+        data = dict(self.payload)
+        data['created_at'] = timesince(self.created_at, now) + ' enrere'
+        data['can_delete'] = user.is_authenticated and self.user_id == user.id
+        return data
+
+
+def push_payload(msg):
+    """Missatge per al canal de push (SSE): cada client calcula can_delete amb user_id"""
+    return {**BufferedMessage(msg).render(AnonymousUser(), timezone.now()), 'user_id': msg.user_id}
+
+
+class _EventBuffer:
+    def __init__(self, messages, complete, deletions, deletions_complete, synced_at, version):
+        self.messages = deque(messages, maxlen=BUFFER_SIZE)
+        # True si el buffer conté tots els missatges de l'esdeveniment
+        self.complete = complete
+        self.deletions = deque(deletions, maxlen=BUFFER_SIZE)
+        # Les eliminacions d'aquest moment en endavant són totes al registre
+        self.deletions_since = _EPOCH if deletions_complete else deletions[0][1]
+        self.last_id = messages[-1].id if messages else 0
+        self.last_deleted_at = deletions[-1][1] if deletions else None
+        self.synced_at = synced_at
+        # Versió de l'esdeveniment (notify) que inclou el buffer
+        self.version = version
+        self.refreshed = time.monotonic()
+        self.lock = threading.Lock()
+
+    def add(self, entry):
+        """Afegeix un missatge mantenint l'ordre per id (els d'altres processos poden arribar tard)"""
+        if entry.id > self.last_id:
+            if len(self.messages) == self.messages.maxlen:
+                self.complete = False
+            self.messages.append(entry)
+            self.last_id = entry.id
+            return
+
+        if self.find(entry.id) is not None:
+            return
+        if self.messages and entry.id < self.messages[0].id and not self.complete:
+            return  # Més antic que tot el buffer: no hi cap
+        if len(self.messages) == self.messages.maxlen:
+            self.messages.popleft()
+            self.complete = False
+        position = len(self.messages)
+        while position > 0 and self.messages[position - 1].id > entry.id:
+            position -= 1
+        self.messages.insert(position, entry)
+
+    def mark_deleted(self, msg_id, deleted_at):
+        if any(deleted_id == msg_id for deleted_id, _ in self.deletions):
+            return
+        for entry in self.messages:
+            if entry.id == msg_id:
+                entry.is_deleted = True
+                break
+        if len(self.deletions) == self.deletions.maxlen:
+            self.deletions_since = self.deletions[0][1]
+        self.deletions.append((msg_id, deleted_at))
+        if self.last_deleted_at is None or deleted_at > self.last_deleted_at:
+            self.last_deleted_at = deleted_at
+
+    def find(self, msg_id):
+        for entry in reversed(self.messages):
+            if entry.id == msg_id:
+                return entry
+            if entry.id < msg_id:
+                break
+        return None
+
+
+class RecentMessageCache:
+    """Buffers circulars per esdeveniment amb expulsió LRU entre esdeveniments"""
+
+    def __init__(self, max_events=MAX_EVENTS, refresh_seconds=REFRESH_SECONDS):
+        self.max_events = max_events
+        self.refresh_seconds = refresh_seconds
+        self._buffers = OrderedDict()
+        self._lock = threading.Lock()
+
+    # --- Lectura -------------------------------------------------------------
+
+    def window(self, event_pk, size):
+        """
+        Els ``size`` missatges visibles més recents, o None si el buffer no els té
+        tots (o l'esdeveniment no existeix) i cal anar a la base de dades.
+        """
+        buffer = self._get(event_pk)
+        if buffer is None:
+            return None
+        with buffer.lock:
+            visible = [entry for entry in buffer.messages if not entry.is_deleted]
+            if len(visible) < size and not buffer.complete:
+                return None
+            return visible[-size:], self._synced_at(buffer)
+
+    def after(self, event_pk, after, size, deleted_since=None):
+        """
+        Missatges posteriors al cursor i ids eliminats des d'aleshores, o None si
+        el cursor és massa antic per al buffer.
+        """
+        buffer = self._get(event_pk)
+        if buffer is None:
+            return None
+        with buffer.lock:
+            if after == 0:
+                if not buffer.complete:
+                    return None
+                threshold = None
+            else:
+                cursor = buffer.find(after)
+                if cursor is None:
+                    return None
+                threshold = cursor.created_at
+                if deleted_since is not None and deleted_since > threshold:
+                    threshold = deleted_since
+                if threshold < buffer.deletions_since:
+                    return None
+
+            new = [entry for entry in buffer.messages
+                   if entry.id > after and not entry.is_deleted][:size]
+            deleted = []
+            if threshold is not None:
+                deleted = [msg_id for msg_id, deleted_at in buffer.deletions
+                           if msg_id <= after and deleted_at >= threshold]
+            return new, deleted, self._synced_at(buffer)
+
+    def before(self, event_pk, before, size):
+        """
+        Fins a ``size`` missatges visibles anteriors al cursor (l'últim és el més recent) i
+        si n'hi ha més d'antics, o None si el buffer no arriba prou enrere.
+        """
+        buffer = self._get(event_pk)
+        if buffer is None:
+            return None
+        with buffer.lock:
+            if buffer.find(before) is None:
+                return None
+            older = [entry for entry in buffer.messages
+                     if entry.id < before and not entry.is_deleted]
+            if len(older) <= size and not buffer.complete:
+                return None
+            return older[-size:], len(older) > size
+
+    def state(self, event_pk):
+        """(últim id, última eliminació) de l'esdeveniment, per a l'ETag"""
+        buffer = self._get(event_pk)
+        if buffer is None:
+            return None
+        with buffer.lock:
+            return buffer.last_id, buffer.last_deleted_at
+
+    # --- Escriptura (des de les vistes) ----------------------------------------
+
+    def append(self, msg):
+        buffer = self._peek(msg.event_id)
+        if buffer is not None:
+            with buffer.lock:
+                buffer.add(BufferedMessage(msg))
+
+    def mark_deleted(self, msg):
+        buffer = self._peek(msg.event_id)
+        if buffer is not None:
+            with buffer.lock:
+                buffer.mark_deleted(msg.id, msg.deleted_at)
+
+    def notify(self, event_pk):
+        """
+        Avisa els processos que l'esdeveniment té missatges nous o eliminats. Es crida
+        quan l'escriptura ja és a la base de dades (després del commit).
+        """
+        key = _version_key(event_pk)
+        cache.add(key, 0, None)
+        try:
+            version = cache.incr(key)
+        except ValueError:
+            return  # Expulsada entremig: els lectors tornaran a la base de dades igualment
+        buffer = self._peek(event_pk)
+        if buffer is not None:
+            with buffer.lock:
+                # El canvi ja hi és (append, mark_deleted); si n'hi ha d'altres pel mig, no
+                if buffer.version == version - 1:
+                    buffer.version = version
+
+    def discard(self, event_pk):
+        with self._lock:
+            self._buffers.pop(event_pk, None)
+
+    def expire(self, event_pks):
+        """
+        Esdeveniments que han deixat d'estar en directe sense passar per save (``update()``):
+        es descarten aquí i, amb una versió nova, els altres processos els descarten en llegir-los
+        """
+        for event_pk in event_pks:
+            self.discard(event_pk)
+            key = _version_key(event_pk)
+            cache.add(key, 0, None)
+            try:
+                cache.incr(key)
+            except ValueError:
+                pass  # Expulsada: els lectors ja tornaran a la base de dades
+
+    def clear(self):
+        with self._lock:
+            self._buffers.clear()
+
+    # --- Intern ----------------------------------------------------------------
+
+    def _peek(self, event_pk):
+        with self._lock:
+            return self._buffers.get(event_pk)
+
+    def _get(self, event_pk):
+        with self._lock:
+            buffer = self._buffers.get(event_pk)
+            if buffer is not None:
+                self._buffers.move_to_end(event_pk)
+
+        if buffer is None:
+            buffer = self._load(event_pk)
+            if buffer is None:
+                return None
+            with self._lock:
+                # Si un altre fil l'ha carregat alhora, es queda el primer
+                buffer = self._buffers.setdefault(event_pk, buffer)
+                self._buffers.move_to_end(event_pk)
+                while len(self._buffers) > self.max_events:
+                    self._buffers.popitem(last=False)
+        elif self._is_stale(event_pk, buffer) and not self._refresh(event_pk, buffer):
+            self.discard(event_pk)
+            return None
+        return buffer
+
+    def _synced_at(self, buffer):
+        """
+        Fins quan són segures les dades del buffer. Amb sincronització entre processos
+        és l'última sincronització (les eliminacions dels altres poden arribar més tard).
+        """
+        if self.refresh_seconds is None:
+            return timezone.now()
+        return buffer.synced_at
+
+    def _is_stale(self, event_pk, buffer):
+        if cache.get(_version_key(event_pk)) != buffer.version:
+            return True
+        return (self.refresh_seconds is not None
+                and time.monotonic() - buffer.refreshed >= self.refresh_seconds)
+
+    def _load(self, event_pk):
+        """Arrencada en fred: omple el buffer des de la base de dades una sola vegada"""
+        if not Event.objects.filter(pk=event_pk, status='live').exists():
+            return None
+
+        # La versió abans de consultar: un canvi fet entremig força una altra lectura
+        version = cache.get(_version_key(event_pk))
+        synced_at = timezone.now()
+        newest = list(
+            ChatMessage.objects.filter(event_id=event_pk)
+            .select_related('user')
+            .order_by('-id')[:BUFFER_SIZE]
+        )
+        newest.reverse()
+
+        deletions = list(
+            ChatMessage.objects.filter(event_id=event_pk, is_deleted=True)
+            .order_by('-deleted_at')
+            .values_list('id', 'deleted_at')[:BUFFER_SIZE]
+        )
+        deletions.reverse()
+
+        return _EventBuffer(
+            [BufferedMessage(msg) for msg in newest],
+            complete=len(newest) < BUFFER_SIZE,
+            deletions=deletions,
+            deletions_complete=len(deletions) < BUFFER_SIZE,
+            synced_at=synced_at,
+            version=version,
+        )
+
+    def _refresh(self, event_pk, buffer):
+        """
+        Porta només el que han escrit altres processos des de l'última sincronització.
+        Retorna False si l'esdeveniment ja no és en directe (el buffer es descarta).
+        """
+        with buffer.lock:
+            if not self._is_stale(event_pk, buffer):
+                return True  # Un altre fil ja ho ha fet mentre s'esperava
+            if not Event.objects.filter(pk=event_pk, status='live').exists():
+                return False
+            version = cache.get(_version_key(event_pk))
+            synced_at = timezone.now()
+            since = buffer.synced_at - timedelta(seconds=REFRESH_MARGIN_SECONDS)
+
+            new = ChatMessage.objects.filter(
+                event_id=event_pk, created_at__gte=since
+            ).select_related('user').order_by('id')
+            for msg in new:
+                buffer.add(BufferedMessage(msg))
+
+            deleted = ChatMessage.objects.filter(
+                event_id=event_pk, is_deleted=True, deleted_at__gte=since
+            ).order_by('deleted_at').values_list('id', 'deleted_at')
+            for msg_id, deleted_at in deleted:
+                buffer.mark_deleted(msg_id, deleted_at)
+
+            buffer.synced_at = synced_at
+            buffer.version = version
+            buffer.refreshed = time.monotonic()
+            return True
+
+
+# Instància única del procés
+recent_messages = RecentMessageCache()
@@ -0,0 +1,18 @@
+from django.core import checks
+
+from config.checks import shared_cache_error
+from .writebehind import write_behind
+
+
+@checks.register()
+def check_write_behind_cache(app_configs, **kwargs):
+    """Els ids de l'escriptura diferida es reserven a la memòria cau per defecte"""
+    if not write_behind.enabled:
+        return []
+    return shared_cache_error('CHAT_WRITE_BEHIND', 'chat.E001')
+
+
+@checks.register()
+def check_buffer_cache(app_configs, **kwargs):
+    """Les versions dels buffers del xat (chat.cache) s'incrementen a la memòria cau per defecte"""
+    return shared_cache_error('La memòria cau de missatges recents del xat (chat.cache)', 'chat.E002')
@@ -1,7 +1,6 @@
 from django import forms
 from .models import ChatMessage
-
-BAD_WORDS = ['puta', 'mierda', 'idiota']
+from .moderation import profanity
 
 
 class ChatMessageForm(forms.ModelForm):
@@ -23,8 +22,7 @@ class ChatMessageForm(forms.ModelForm):
         if not message:
             raise forms.ValidationError("El missatge no pot estar buit")
 
-        for word in BAD_WORDS:
-            if word in message.lower():
-                raise forms.ValidationError("Llenguatge ofensiu detectat")
+        if profanity.contains_profanity(message):
+            raise forms.ValidationError("Llenguatge ofensiu detectat")
 
         return message
@@ -0,0 +1,62 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from chat.archive import BLOCK_SIZE, ArchiveError, archive_event
+from chat.models import ChatTranscript
+from events.models import Event
+
+
+class Command(BaseCommand):
+    help = 'Arxiva en un fitxer comprimit el xat dels esdeveniments finalitzats i n\'esborra els missatges'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--event', type=int, action='append', dest='events',
+                            help='Arxiva només aquest esdeveniment (es pot repetir)')
+        parser.add_argument('--min-age-hours', type=float, default=24,
+                            help='Hores des de l\'última actualització de l\'esdeveniment')
+        parser.add_argument('--block-size', type=int, default=BLOCK_SIZE, help='Missatges per bloc')
+        parser.add_argument('--dry-run', action='store_true', help='Mostra què s\'arxivaria sense fer res')
+
+    def handle(self, *args, **options):
+        events = Event.objects.filter(status='finished')
+        if options['events']:
+            events = events.filter(pk__in=options['events'])
+        else:
+            limit = timezone.now() - timedelta(hours=options['min_age_hours'])
+            events = events.filter(updated_at__lte=limit)
+
+        archived = set(ChatTranscript.objects.values_list('event_id', flat=True))
+        pending = [event for event in events.order_by('pk') if event.pk not in archived]
+        if not pending:
+            self.stdout.write('No hi ha xats per arxivar.')
+            return
+
+        if options['dry_run']:
+            for event in pending:
+                self.stdout.write(f'  {event.pk}: {event.title}')
+            self.stdout.write(f'S\'arxivarien {len(pending)} xats.')
+            return
+
+        total_messages = total_raw = total_compressed = 0
+        for event in pending:
+            try:
+                transcript = archive_event(event, options['block_size'])
+            except ArchiveError as error:
+                self.stdout.write(self.style.WARNING(str(error)))
+                continue
+
+            total_messages += transcript.message_count
+            total_raw += transcript.raw_size
+            total_compressed += transcript.compressed_size
+            self.stdout.write(
+                f'  {event.pk}: {transcript.message_count} missatges, '
+                f'{transcript.raw_size} → {transcript.compressed_size} bytes'
+            )
+
+        ratio = total_raw / total_compressed if total_compressed else 0
+        self.stdout.write(self.style.SUCCESS(
+            f'Arxivats {total_messages} missatges: {total_raw} → {total_compressed} bytes '
+            f'({ratio:.1f}x)'
+        ))
@@ -0,0 +1,84 @@
+import statistics
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from chat.models import ChatMessage
+from chat.views import CHAT_WINDOW, get_messages_before
+from events.models import Event
+
+User = get_user_model()
+
+# Pàgines on es mostra la latència
+REPORT_PAGES = [1, 10, 100, 250, 500, 750, 1000]
+
+
+class Command(BaseCommand):
+    help = "Mesura la latència de l'historial del xat (?before=) de la pàgina 1 a la 1000, comparat amb offset"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--pages', type=int, default=1000, help='Pàgines a recórrer')
+        parser.add_argument('--repeat', type=int, default=5, help='Repeticions per pàgina mostrada')
+        parser.add_argument('--keep', action='store_true', help="No esborra l'esdeveniment de prova")
+
+    def handle(self, *args, **options):
+        user = User.objects.order_by('pk').first()
+        if user is None:
+            self.stdout.write(self.style.ERROR('No hi ha usuaris. Executa primer seed_users.'))
+            return
+
+        pages = options['pages']
+        total = pages * CHAT_WINDOW + 1
+        event = Event.objects.create(
+            title='Benchmark historial', description='Esdeveniment temporal del benchmark',
+            creator=user, scheduled_date=timezone.now(), status='live',
+            stream_url='https://www.twitch.tv/benchmark',
+        )
+
+        try:
+            self.stdout.write(f'Creant {total} missatges...')
+            ChatMessage.objects.bulk_create(
+                (ChatMessage(event=event, user=user, message=f'missatge {i}') for i in range(total)),
+                batch_size=2000,
+            )
+            newest = ChatMessage.objects.filter(event=event).order_by('-id').values_list('id', flat=True)[0]
+
+            # Recórrer l'historial sencer guardant el cursor de cada pàgina
+            cursors = {}
+            before = newest
+            for page in range(1, pages + 1):
+                cursors[page] = before
+                data = get_messages_before(event.pk, before, user)
+                if not data['has_more']:
+                    break
+                before = data['before']
+
+            self.stdout.write(f"{'pàgina':>7} {'before= (ms)':>14} {'offset (ms)':>13}")
+            for page in [page for page in REPORT_PAGES if page in cursors]:
+                keyset = self.measure(options['repeat'], get_messages_before, event.pk, cursors[page], user)
+                offset = self.measure(options['repeat'], self.offset_page, event, page)
+                self.stdout.write(f'{page:>7} {keyset:>14.2f} {offset:>13.2f}')
+        finally:
+            if not options['keep']:
+                event.delete()
+
+    @staticmethod
+    def offset_page(event, page):
+        """La mateixa pàgina amb LIMIT/OFFSET, per comparar"""
+        start = (page - 1) * CHAT_WINDOW
+        return list(
+            ChatMessage.objects.filter(event=event, is_deleted=False)
+            .select_related('user')
+            .order_by('-created_at', '-id')[start:start + CHAT_WINDOW]
+        )
+
+    @staticmethod
+    def measure(repeat, func, *args):
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            func(*args)
+            timings.append((time.perf_counter() - started) * 1000)
+        return statistics.median(timings)
@@ -0,0 +1,66 @@
+import random
+import string
+import time
+
+from django.core.management.base import BaseCommand
+
+from chat.moderation import DEFAULT_BAD_WORDS, ProfanityMatcher
+
+SAMPLE_MESSAGES = [
+    'Quin gol més bo!',
+    'Hola a tothom, des de Barcelona',
+    'Aquest streamer és el millor, segueix així',
+    'Alguien sabe a qué hora empieza la segunda parte?',
+    'jajajaja no puede ser',
+    'Quina jugada més idiota',
+    'Esto es una m1erd4',
+    'gg wp, ens veiem al proper directe',
+]
+
+
+def _old_filter(words, message):
+    """El filtre anterior de ChatMessageForm: una cerca de subcadena per paraula"""
+    lower = message.lower()
+    for word in words:
+        if word in lower:
+            return True
+    return False
+
+
+def _random_terms(count, rng):
+    terms = list(DEFAULT_BAD_WORDS)
+    while len(terms) < count:
+        terms.append(''.join(rng.choices(string.ascii_lowercase, k=rng.randint(5, 10))))
+    return terms
+
+
+class Command(BaseCommand):
+    help = 'Compara el filtre de llenguatge ofensiu compilat amb el bucle anterior sobre BAD_WORDS'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--messages', type=int, default=20000, help='Missatges per prova')
+        parser.add_argument('--sizes', default='3,100,1000,10000',
+                            help='Mides de la llista de paraules, separades per comes')
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        messages = [rng.choice(SAMPLE_MESSAGES) for _ in range(options['messages'])]
+
+        self.stdout.write(f"{'paraules':>8} {'bucle (µs/msg)':>16} {'compilat (µs/msg)':>19}")
+        for size in [int(value) for value in options['sizes'].split(',')]:
+            terms = _random_terms(size, rng)
+            matcher = ProfanityMatcher(terms=terms)
+
+            started = time.perf_counter()
+            for message in messages:
+                _old_filter(terms, message)
+            loop = time.perf_counter() - started
+
+            started = time.perf_counter()
+            for message in messages:
+                matcher.contains_profanity(message)
+            compiled = time.perf_counter() - started
+
+            per_message = 1_000_000 / len(messages)
+            self.stdout.write(f'{size:>8} {loop * per_message:>16.2f} {compiled * per_message:>19.2f}')
@@ -0,0 +1,41 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand
+
+from chat.ratelimit import CacheStore, ChatRateLimiter, LocalStore
+
+
+class Command(BaseCommand):
+    help = 'Mesura el cost per petició del límit de velocitat del xat amb cada magatzem'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--checks', type=int, default=200000, help='Comprovacions per prova')
+        parser.add_argument('--users', type=int, default=1000, help='Usuaris diferents')
+        parser.add_argument('--events', type=int, default=20, help='Esdeveniments diferents')
+        parser.add_argument('--cache', default='default', help='Memòria cau per a CacheStore')
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        requests = [
+            (rng.randrange(options['users']), rng.randrange(options['events']))
+            for _ in range(options['checks'])
+        ]
+
+        for label, store in [
+            ('LocalStore', LocalStore()),
+            (f"CacheStore ({options['cache']})", CacheStore(options['cache'])),
+        ]:
+            limiter = ChatRateLimiter(store=store, enabled=True)
+            rejected = 0
+            started = time.perf_counter()
+            for user_id, event_pk in requests:
+                if limiter.check(user_id, event_pk):
+                    rejected += 1
+            elapsed = time.perf_counter() - started
+
+            self.stdout.write(self.style.SUCCESS(
+                f'{label:<24} {elapsed * 1_000_000 / len(requests):>8.2f} µs/petició  '
+                f'({len(requests) / elapsed:,.0f} peticions/s, {rejected} rebutjades)'
+            ))
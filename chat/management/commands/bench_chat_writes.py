@@ -0,0 +1,82 @@
+from concurrent.futures import ThreadPoolExecutor
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.utils import timezone
+
+from chat.models import ChatMessage
+from chat.writebehind import ID_CACHE_KEY, ChatWriteBehind
+from events.models import Event
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = 'Mesura els missatges de xat desats per segon amb create() i amb write-behind per lots'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--messages', type=int, default=5000, help='Missatges per prova')
+        parser.add_argument('--threads', type=int, default=8, help='Fils que envien alhora')
+        parser.add_argument('--batch-size', type=int, default=100, help='Mida del lot del write-behind')
+        parser.add_argument('--flush-interval', type=float, default=0.5, help='Segons entre lots')
+        parser.add_argument('--keep', action='store_true', help="No esborra l'esdeveniment de prova")
+
+    def handle(self, *args, **options):
+        user = User.objects.order_by('pk').first()
+        if user is None:
+            self.stdout.write(self.style.ERROR('No hi ha usuaris. Executa primer seed_users.'))
+            return
+
+        event = Event.objects.create(
+            title='Benchmark xat', description='Esdeveniment temporal del benchmark',
+            creator=user, scheduled_date=timezone.now(), status='live',
+            stream_url='https://www.twitch.tv/benchmark',
+        )
+        total = options['messages']
+        threads = options['threads']
+
+        try:
+            direct = self.run(total, threads, lambda i: ChatMessage.objects.create(
+                event=event, user=user, message=f'missatge {i}'))
+            self.report('create() per missatge', total, direct)
+
+            # Els create() anteriors han fet avançar els ids: el comptador s'ha de refer
+            cache.delete(ID_CACHE_KEY)
+            writer = ChatWriteBehind(enabled=True, batch_size=options['batch_size'],
+                                     flush_interval=options['flush_interval'])
+            started = time.perf_counter()
+            accepted = self.run(total, threads, lambda i: writer.submit(ChatMessage(
+                event=event, user=user, message=f'missatge {i}')))
+            writer.close()
+            persisted = time.perf_counter() - started
+
+            self.report('write-behind (acceptats)', total, accepted)
+            self.report('write-behind (desats)', total, persisted)
+            self.stdout.write(f"  lots: {writer.stats['batches']}, fallits: {writer.stats['failed']}")
+
+            stored = ChatMessage.objects.filter(event=event).count()
+            if stored != total * 2:
+                self.stdout.write(self.style.WARNING(f'Esperats {total * 2} missatges, desats {stored}'))
+        finally:
+            if not options['keep']:
+                event.delete()
+
+    def run(self, total, threads, send):
+        def worker(indexes):
+            for i in indexes:
+                send(i)
+            connection.close()
+
+        chunks = [range(start, total, threads) for start in range(threads)]
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            list(pool.map(worker, chunks))
+        return time.perf_counter() - started
+
+    def report(self, label, total, seconds):
+        self.stdout.write(self.style.SUCCESS(
+            f'{label:<28} {total / seconds:>10.0f} missatges/s  ({seconds:.2f} s)'
+        ))
@@ -0,0 +1,30 @@
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0001_initial'),
+        ('chat', '0003_chatmessage_chat_event_visible_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChatTranscript',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('file', models.FileField(upload_to='chat_transcripts/')),
+                ('message_count', models.PositiveIntegerField(default=0)),
+                ('last_message_id', models.BigIntegerField(default=0)),
+                ('raw_size', models.PositiveIntegerField(default=0)),
+                ('compressed_size', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('event', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='chat_transcript', to='events.event')),
+            ],
+            options={
+                'verbose_name': 'Xat arxivat',
+                'verbose_name_plural': 'Xats arxivats',
+            },
+        ),
+    ]
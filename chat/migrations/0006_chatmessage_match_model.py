@@ -0,0 +1,31 @@
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0008_event_duration_ends_at'),
+        ('chat', '0005_chatmessage_chat_event_history_idx'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='chatmessage',
+            name='is_highlighted',
+        ),
+        migrations.AlterModelOptions(
+            name='chatmessage',
+            options={'ordering': ['created_at'], 'verbose_name': 'Missatge de Xat', 'verbose_name_plural': 'Missatges de Xat'},
+        ),
+        migrations.AlterField(
+            model_name='chatmessage',
+            name='event',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='events.event'),
+        ),
+        migrations.AlterField(
+            model_name='chatmessage',
+            name='message',
+            field=models.TextField(),
+        ),
+    ]
@@ -1,5 +1,6 @@
 from django.db import models
 from django.conf import settings
+from django.utils import timezone
 from django.utils.timesince import timesince
 from events.models import Event
 
@@ -10,13 +11,12 @@ class ChatMessage(models.Model):
     event = models.ForeignKey(Event, on_delete=models.CASCADE)
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     message = models.TextField()
-    created_at = models.DateTimeField(auto_now_add=True)
+    # Sense auto_now_add: l'escriptura diferida (chat/writebehind.py) la fixa en acceptar el missatge
+    created_at = models.DateTimeField(default=timezone.now)
 
     # Campos para eliminar mensajes
     is_deleted = models.BooleanField(default=False)
-
-    class Meta:
-        ordering = ['created_at']
+    deleted_at = models.DateTimeField(null=True, blank=True)
 
     def __str__(self):
         if self.is_deleted:
@@ -45,6 +45,12 @@ class ChatMessage(models.Model):
 
         return False
 
+    def soft_delete(self):
+        """Marca el missatge com eliminat i guarda quan s'ha fet (per als tombstones)"""
+        self.is_deleted = True
+        self.deleted_at = timezone.now()
+        self.save(update_fields=['is_deleted', 'deleted_at'])
+
     def get_user_display_name(self):
         """Retorna el display_name de l'usuari si existeix, sinó el username"""
         # Si el teu CustomUser té un camp display_name
@@ -59,4 +65,30 @@ class ChatMessage(models.Model):
     class Meta:
         ordering = ['created_at']  # Més antic primer
         verbose_name = 'Missatge de Xat'
-        verbose_name_plural = 'Missatges de Xat'
\ No newline at end of file
+        verbose_name_plural = 'Missatges de Xat'
+        indexes = [
+            # Finestra i historial del xat: missatges visibles d'un esdeveniment per (data, id)
+            models.Index(fields=['event', 'is_deleted', 'created_at', 'id'], name='chat_event_history_idx'),
+        ]
+
+
+class ChatTranscript(models.Model):
+    """
+    Xat arxivat d'un esdeveniment finalitzat: tots els missatges visibles en un sol
+    fitxer comprimit per blocs (format a chat/archive.py). Les files de ChatMessage
+    de l'esdeveniment s'esborren en arxivar-lo.
+    """
+    event = models.OneToOneField(Event, on_delete=models.CASCADE, related_name='chat_transcript')
+    file = models.FileField(upload_to='chat_transcripts/')
+    message_count = models.PositiveIntegerField(default=0)
+    last_message_id = models.BigIntegerField(default=0)
+    raw_size = models.PositiveIntegerField(default=0)  # Bytes dels missatges sense comprimir
+    compressed_size = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Xat arxivat de {self.event_id} ({self.message_count} missatges)"
+
+    class Meta:
+        verbose_name = 'Xat arxivat'
+        verbose_name_plural = 'Xats arxivats'
@@ -0,0 +1,175 @@
+"""
+Filtre de llenguatge ofensiu del xat.
+
+La llista de paraules es llegeix d'un fitxer de text (``CHAT_BAD_WORDS_FILE``, una
+paraula o expressió per línia, ``#`` per als comentaris) i es compila en un conjunt de
+termes normalitzats. Per revisar un missatge es normalitza una sola vegada (minúscules,
+sense accents i amb el leetspeak habitual desfet: ``1d10t4`` → ``idiota``), es parteix
+en paraules i cada paraula (o grup de paraules, per a les expressions) es busca al
+conjunt. El cost depèn de la mida del missatge, no de la de la llista, i només hi ha
+coincidència amb paraules senceres: ``computadora`` no conté ``puta``, i les formes
+compostes (``hijoputa``) només es detecten si són a la llista.
+
+Si el fitxer canvia es torna a carregar sol (com a molt cada
+``CHAT_BAD_WORDS_RELOAD_SECONDS`` segons), sense reiniciar el servidor.
+"""
+import logging
+import os
+import re
+import threading
+import time
+import unicodedata
+
+from django.conf import settings
+
+logger = logging.getLogger('chat.moderation')
+
+BAD_WORDS_FILE = getattr(
+    settings, 'CHAT_BAD_WORDS_FILE', os.path.join(os.path.dirname(__file__), 'bad_words.txt')
+)
+RELOAD_SECONDS = getattr(settings, 'CHAT_BAD_WORDS_RELOAD_SECONDS', 5)
+
+# Llista mínima si el fitxer no existeix
+DEFAULT_BAD_WORDS = ['puta', 'mierda', 'idiota']
+
+# Substitucions de leetspeak
+LEET = {
+    '0': 'o', '1': 'i', '3': 'e', '4': 'a', '5': 's', '7': 't', '8': 'b',
+    '@': 'a', '$': 's',
+}
+
+# Una paraula, un cop normalitzat el text
+WORD = re.compile(r'[^\W_]+')
+
+# Lletres repetides tres cops o més per allargar una paraula ("mieeerda")
+STRETCHED = re.compile(r'(.)\1{2,}')
+
+
+class _FoldTable(dict):
+    """
+    Taula per a ``str.translate``: minúscules, sense accents i sense leetspeak.
+    Cada caràcter es calcula el primer cop que apareix i després queda desat.
+    """
+
+    def __missing__(self, codepoint):
+        char = chr(codepoint)
+        if char in LEET:
+            folded = LEET[char]
+        else:
+            folded = ''.join(
+                part for part in unicodedata.normalize('NFKD', char.lower())
+                if not unicodedata.combining(part)
+            )
+        self[codepoint] = folded
+        return folded
+
+
+_FOLD = _FoldTable()
+
+
+def normalize(text):
+    """Text en minúscules, sense accents i sense leetspeak"""
+    return text.translate(_FOLD)
+
+
+def normalize_words(text):
+    return WORD.findall(normalize(text))
+
+
+def _load_terms(path):
+    with open(path, encoding='utf-8') as handle:
+        return [line.split('#', 1)[0].strip() for line in handle]
+
+
+class ProfanityMatcher:
+    """Conjunt compilat de termes prohibits amb recàrrega automàtica del fitxer"""
+
+    def __init__(self, path=BAD_WORDS_FILE, terms=None, reload_seconds=RELOAD_SECONDS):
+        self.path = path if terms is None else None
+        self.reload_seconds = reload_seconds
+        self._lock = threading.Lock()
+        self._mtime = None
+        self._checked = 0.0
+        self._compiled = self._compile(DEFAULT_BAD_WORDS if terms is None else terms)
+        if self.path is not None:
+            self.reload()
+
+    def find(self, text):
+        """Primer terme prohibit que apareix al text (normalitzat), o None"""
+        self._maybe_reload()
+        terms, max_words = self._compiled
+        folded = normalize(text)
+
+        match = self._scan(WORD.findall(folded), terms, max_words)
+        if match is None and STRETCHED.search(folded):
+            # Lletres allargades: es prova amb una i amb dues ("fuuuck", "asssshole")
+            for repl in (r'\1', r'\1\1'):
+                match = self._scan(WORD.findall(STRETCHED.sub(repl, folded)), terms, max_words)
+                if match is not None:
+                    break
+        return match
+
+    def contains_profanity(self, text):
+        return self.find(text) is not None
+
+    def reload(self):
+        """Torna a llegir el fitxer; si no es pot llegir es manté la llista actual"""
+        try:
+            mtime = os.stat(self.path).st_mtime
+            terms = _load_terms(self.path)
+        except OSError as error:
+            if self._mtime is not None:
+                logger.warning('No s\'ha pogut llegir %s: %s', self.path, error)
+            return False
+        self._compiled = self._compile(terms)
+        self._mtime = mtime
+        return True
+
+    def __len__(self):
+        return len(self._compiled[0])
+
+    # --- Intern ----------------------------------------------------------------
+
+    @staticmethod
+    def _scan(words, terms, max_words):
+        for start, word in enumerate(words):
+            if word in terms:
+                return word
+            # Expressions de diverses paraules
+            phrase = word
+            for extra in words[start + 1:start + max_words]:
+                phrase = f'{phrase} {extra}'
+                if phrase in terms:
+                    return phrase
+        return None
+
+    @staticmethod
+    def _compile(raw_terms):
+        terms = set()
+        for term in raw_terms:
+            words = normalize_words(term)
+            if words:
+                terms.add(' '.join(words))
+        max_words = max((term.count(' ') + 1 for term in terms), default=1)
+        return frozenset(terms), max_words
+
+    def _maybe_reload(self):
+        if self.path is None or self.reload_seconds is None:
+            return
+        now = time.monotonic()
+        if now - self._checked < self.reload_seconds:
+            return
+        with self._lock:
+            if now - self._checked < self.reload_seconds:
+                return
+            self._checked = now
+            try:
+                changed = os.stat(self.path).st_mtime != self._mtime
+            except OSError:
+                return
+            if changed:
+                self.reload()
+
+
+# Instància única del procés
+profanity = ProfanityMatcher()
@@ -0,0 +1,136 @@
+"""
+Límit de velocitat de les escriptures del xat (enviar i eliminar missatges).
+
+Cada parella (usuari, esdeveniment) té un token bucket de ``CHAT_RATE_LIMIT_USER_BURST``
+fitxes que es recarrega a ``CHAT_RATE_LIMIT_USER_RATE`` fitxes per segon, i cada
+esdeveniment en té un altre amb el límit global (``CHAT_RATE_LIMIT_EVENT_*``). Cada
+escriptura gasta una fitxa de cada; sense fitxes la vista respon 429 amb
+``Retry-After``.
+
+L'estat dels buckets es guarda a ``CHAT_RATE_LIMIT_STORE``:
+
+* ``chat.ratelimit.LocalStore`` (per defecte): un diccionari del procés. És el més ràpid,
+  però cada procés compta pel seu compte.
+* ``chat.ratelimit.CacheStore``: la memòria cau ``CHAT_RATE_LIMIT_CACHE`` de Django. Si és
+  compartida (fitxers, memcached, redis...) el límit val per a tots els processos.
+"""
+import math
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.http import JsonResponse
+from django.utils.module_loading import import_string
+
+ENABLED = getattr(settings, 'CHAT_RATE_LIMIT', True)
+USER_RATE = getattr(settings, 'CHAT_RATE_LIMIT_USER_RATE', 1)
+USER_BURST = getattr(settings, 'CHAT_RATE_LIMIT_USER_BURST', 5)
+EVENT_RATE = getattr(settings, 'CHAT_RATE_LIMIT_EVENT_RATE', 50)
+EVENT_BURST = getattr(settings, 'CHAT_RATE_LIMIT_EVENT_BURST', 200)
+STORE = getattr(settings, 'CHAT_RATE_LIMIT_STORE', 'chat.ratelimit.LocalStore')
+CACHE_ALIAS = getattr(settings, 'CHAT_RATE_LIMIT_CACHE', 'default')
+
+
+def _take(state, now, rate, burst):
+    """
+    Gasta una fitxa del bucket ``state`` = (fitxes, instant). Retorna el nou estat i
+    els segons que falten per tenir-ne una (0 si s'ha pogut gastar).
+    """
+    if state is None:
+        tokens = burst
+    else:
+        tokens, stamp = state
+        tokens = min(burst, tokens + (now - stamp) * rate)
+    if tokens >= 1:
+        return (tokens - 1, now), 0.0
+    return (tokens, now), (1 - tokens) / rate
+
+
+class LocalStore:
+    """Buckets en un diccionari del procés"""
+
+    # Quan se supera, s'esborren els buckets que ja tornen a estar plens
+    max_keys = 100_000
+
+    def __init__(self):
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def take(self, key, rate, burst):
+        now = time.monotonic()
+        with self._lock:
+            state, retry_after = _take(self._buckets.get(key), now, rate, burst)
+            self._buckets[key] = state
+            if len(self._buckets) > self.max_keys:
+                self._prune(now)
+        return retry_after
+
+    def clear(self):
+        with self._lock:
+            self._buckets.clear()
+
+    def _prune(self, now):
+        # Un bucket sense ús des de fa més del que tarda a omplir-se és igual que un de nou
+        max_idle = max(USER_BURST / USER_RATE, EVENT_BURST / EVENT_RATE)
+        for key, (_, stamp) in list(self._buckets.items()):
+            if now - stamp >= max_idle:
+                del self._buckets[key]
+
+
+class CacheStore:
+    """
+    Buckets a una memòria cau de Django, compartida entre processos.
+    La lectura i l'escriptura no són atòmiques: dues peticions exactament simultànies
+    poden gastar la mateixa fitxa, però el límit es manté a la llarga.
+    """
+
+    key_prefix = 'chat:ratelimit:'
+
+    def __init__(self, alias=CACHE_ALIAS):
+        self.cache = caches[alias]
+
+    def take(self, key, rate, burst):
+        cache_key = self.key_prefix + ':'.join(str(part) for part in key)
+        now = time.time()
+        state, retry_after = _take(self.cache.get(cache_key), now, rate, burst)
+        # El bucket es pot oblidar quan ja s'ha tornat a omplir
+        self.cache.set(cache_key, state, timeout=math.ceil(burst / rate) + 1)
+        return retry_after
+
+
+class ChatRateLimiter:
+    """Límit per (usuari, esdeveniment) i límit global per esdeveniment"""
+
+    def __init__(self, store=None, enabled=ENABLED):
+        self.store = store if store is not None else import_string(STORE)()
+        self.enabled = enabled
+
+    def check(self, user_id, event_pk):
+        """
+        Gasta una fitxa de l'usuari i una de l'esdeveniment. Retorna 0 si es pot escriure
+        o els segons que cal esperar. Primer es mira l'usuari, perquè qui envia massa
+        no gasti les fitxes de l'esdeveniment de la resta.
+        """
+        if not self.enabled:
+            return 0.0
+        retry_after = self.store.take(('user', user_id, event_pk), USER_RATE, USER_BURST)
+        if retry_after:
+            return retry_after
+        return self.store.take(('event', event_pk), EVENT_RATE, EVENT_BURST)
+
+
+def rate_limited_response(retry_after):
+    """Resposta 429 en el mateix format JSON que la resta de vistes del xat"""
+    seconds = max(1, math.ceil(retry_after))
+    response = JsonResponse(
+        {'success': False, 'error': f"Massa missatges. Torna-ho a provar d'aquí a {seconds} s",
+         'retry_after': seconds},
+        status=429,
+    )
+    response['Retry-After'] = str(seconds)
+    return response
+
+
+# Instància única del procés
+chat_limiter = ChatRateLimiter()
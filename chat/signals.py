@@ -0,0 +1,28 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from events.models import Event
+from .archive import transcripts
+from .cache import recent_messages
+from .models import ChatTranscript
+
+
+@receiver(post_delete, sender=Event)
+def discard_chat_buffer(sender, instance, **kwargs):
+    """Un esdeveniment esborrat ja no ha de servir missatges des de la memòria cau"""
+    recent_messages.discard(instance.pk)
+
+
+@receiver(post_save, sender=Event)
+def discard_ended_chat_buffer(sender, instance, **kwargs):
+    """Només es guarden a la memòria cau els xats dels esdeveniments en directe"""
+    if instance.status != 'live':
+        recent_messages.discard(instance.pk)
+
+
+@receiver(post_delete, sender=ChatTranscript)
+def delete_transcript_file(sender, instance, **kwargs):
+    """El fitxer d'un xat arxivat s'esborra amb el seu registre (o amb l'esdeveniment)"""
+    transcripts.forget(instance.event_id)
+    if instance.file:
+        instance.file.delete(save=False)
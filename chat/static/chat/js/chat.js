@@ -1,4 +1,9 @@
 document.addEventListener('DOMContentLoaded', () => {
+    // El xat inclòs (chat_box.html) ja gestiona la càrrega incremental dels missatges
+    if (window.chatBoxInitialized) {
+        return;
+    }
+
     const messagesBox = document.getElementById('chat-messages');
     const form = document.getElementById('chat-form');
     const input = document.getElementById('chat-message-input');
@@ -67,92 +72,132 @@ document.addEventListener('DOMContentLoaded', () => {
         });
     }
 
-    // Cargar mensajes
+    // Cursor de l'últim missatge rebut i ETag de l'última resposta
+    let lastId = null;
+    let lastEtag = null;
+
+    // Crear el node d'un missatge
+    function buildMessage(msg) {
+        const div = document.createElement('div');
+        div.className = 'chat-message';
+        div.dataset.id = msg.id;
+        div.dataset.canDelete = msg.can_delete;
+
+        if (msg.is_highlighted) {
+            div.classList.add('highlighted');
+        }
+
+        // Contenido del mensaje
+        let messageContent = escapeHtml(msg.message);
+
+        // Botón de eliminar (solo si can_delete es true)
+        let deleteButton = '';
+        if (msg.can_delete) {
+            deleteButton = `
+                <button class="btn btn-sm btn-outline-danger delete-btn ms-2"
+                        onclick="deleteMessage(${msg.id}, this)"
+                        title="Eliminar missatge">
+                    🗑️
+                </button>
+            `;
+        }
+
+        div.innerHTML = `
+            <div class="message-header">
+                <div class="d-flex justify-content-between align-items-start">
+                    <div class="flex-grow-1">
+                        <strong class="message-user">${escapeHtml(msg.display_name)}</strong>
+                        <small class="message-time text-muted ms-2">${escapeHtml(msg.created_at)}</small>
+                    </div>
+                    ${deleteButton}
+                </div>
+            </div>
+            <div class="message-content mt-2">
+                ${messageContent}
+            </div>
+        `;
+        return div;
+    }
+
+    // Cargar mensajes (la primera vegada la finestra sencera, després només les novetats)
     function loadMessages() {
-        fetch(`/chat/${eventId}/messages/`)
+        const fullReload = lastId === null;
+        const url = fullReload
+            ? `/chat/${eventId}/messages/`
+            : `/chat/${eventId}/messages/?after=${lastId}`;
+        const headers = {};
+        if (lastEtag) {
+            headers['If-None-Match'] = lastEtag;
+        }
+
+        fetch(url, { headers: headers, cache: 'no-store' })
             .then(response => {
+                if (response.status === 304) {
+                    return null;  // Res de nou
+                }
                 if (!response.ok) {
                     throw new Error(`HTTP error! status: ${response.status}`);
                 }
+                lastEtag = response.headers.get('ETag');
                 return response.json();
             })
             .then(data => {
-                if (data.messages && data.messages.length > 0) {
-                    // Guardar posición actual de scroll
-                    const isScrolledToBottom =
-                        messagesBox.scrollHeight - messagesBox.clientHeight <= messagesBox.scrollTop + 1;
+                if (data === null) {
+                    return;
+                }
 
-                    // Limpiar contenedor
-                    messagesBox.innerHTML = '';
+                if (data.reset) {
+                    // El cursor ja no és vàlid: tornar a carregar la finestra
+                    lastId = null;
+                    lastEtag = null;
+                    loadMessages();
+                    return;
+                }
 
-                    // Actualizar contador
-                    if (counter) {
-                        counter.textContent = data.messages.length;
-                    }
+                // Guardar posición actual de scroll
+                const isScrolledToBottom =
+                    messagesBox.scrollHeight - messagesBox.clientHeight <= messagesBox.scrollTop + 1;
 
-                    // Crear mensajes
-                    data.messages.forEach(msg => {
-                        const div = document.createElement('div');
-                        div.className = 'chat-message';
-                        div.dataset.id = msg.id;
-                        div.dataset.canDelete = msg.can_delete;
-
-                        if (msg.is_highlighted) {
-                            div.classList.add('highlighted');
-                        }
-
-                        // Contenido del mensaje
-                        let messageContent = escapeHtml(msg.message);
-
-                        // Botón de eliminar (solo si can_delete es true)
-                        let deleteButton = '';
-                        if (msg.can_delete) {
-                            deleteButton = `
-                                <button class="btn btn-sm btn-outline-danger delete-btn ms-2"
-                                        onclick="deleteMessage(${msg.id}, this)"
-                                        title="Eliminar missatge">
-                                    🗑️
-                                </button>
-                            `;
-                        }
-
-                        div.innerHTML = `
-                            <div class="message-header">
-                                <div class="d-flex justify-content-between align-items-start">
-                                    <div class="flex-grow-1">
-                                        <strong class="message-user">${escapeHtml(msg.display_name)}</strong>
-                                        <small class="message-time text-muted ms-2">${escapeHtml(msg.created_at)}</small>
-                                    </div>
-                                    ${deleteButton}
-                                </div>
-                            </div>
-                            <div class="message-content mt-2">
-                                ${messageContent}
-                            </div>
-                        `;
-
-                        messagesBox.appendChild(div);
+                if (fullReload) {
+                    messagesBox.innerHTML = '';
+                } else {
+                    // Tombstones: treure els missatges eliminats
+                    (data.deleted || []).forEach(id => {
+                        const el = messagesBox.querySelector(`.chat-message[data-id="${id}"]`);
+                        if (el) el.remove();
                     });
+                }
 
-                    // Scroll al final si estaba abajo
-                    if (isScrolledToBottom) {
-                        messagesBox.scrollTop = messagesBox.scrollHeight;
-                    }
+                const fresh = (data.messages || []).filter(
+                    msg => !messagesBox.querySelector(`.chat-message[data-id="${msg.id}"]`)
+                );
+                if (fresh.length > 0) {
+                    const empty = messagesBox.querySelector('.no-messages');
+                    if (empty) empty.remove();
+                }
+                fresh.forEach(msg => messagesBox.appendChild(buildMessage(msg)));
+
+                const total = messagesBox.querySelectorAll('.chat-message').length;
+                if (counter) {
+                    counter.textContent = total;
+                }
 
-                } else if (data.messages && data.messages.length === 0) {
+                if (total === 0 && !messagesBox.querySelector('.no-messages')) {
                     // Solo mostrar "no hay mensajes" si realmente está vacío
-                    if (!messagesBox.querySelector('.no-messages')) {
-                        messagesBox.innerHTML = `
-                            <div class="no-messages text-center text-muted p-5">
-                                <i class="fas fa-comments fa-2x mb-3"></i>
-                                <p class="mb-0">No hi ha missatges encara.<br>Sigues el primer a escriure!</p>
-                            </div>`;
-                    }
-                    if (counter) {
-                        counter.textContent = '0';
-                    }
+                    messagesBox.innerHTML = `
+                        <div class="no-messages text-center text-muted p-5">
+                            <i class="fas fa-comments fa-2x mb-3"></i>
+                            <p class="mb-0">No hi ha missatges encara.<br>Sigues el primer a escriure!</p>
+                        </div>`;
+                }
+
+                // Scroll al final si estaba abajo
+                if (isScrolledToBottom) {
+                    messagesBox.scrollTop = messagesBox.scrollHeight;
                 }
 
+                lastId = data.last_id;
+
                 // Si hay error, mostrarlo
                 if (data.error) {
                     console.error('Error del servidor:', data.error);
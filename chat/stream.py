@@ -0,0 +1,178 @@
+"""
+Canal de push del xat amb Server-Sent Events.
+
+``ChatStreamMiddleware`` embolcalla l'aplicació ASGI de Django (config/asgi.py) i
+atén directament la URL ``chat_stream`` (chat/urls.py): cada connexió queda oberta i rep
+els missatges nous i les eliminacions que publiquen les vistes a chat.broker.
+La resta de peticions passen a Django sense canvis.
+
+Les consultes es fan fora del cicle de petició de Django (sense ``request_started`` ni
+``request_finished``), així que cada una tanca les connexions caducades o trencades
+abans i després, com faria Django.
+"""
+import asyncio
+import functools
+import json
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import AnonymousUser
+from django.db import close_old_connections
+from django.urls import Resolver404, resolve
+
+from .broker import broker
+
+STREAM_URL_NAME = 'chat_stream'
+
+# Segons entre comentaris buits perquè els proxies no tallin la connexió
+KEEPALIVE_SECONDS = 15
+
+# Temps que el navegador espera abans de reconnectar (mil·lisegons)
+RETRY_MS = 3000
+
+
+def _format_event(kind, data, event_id=None):
+    """Converteix un esdeveniment al format de text de SSE"""
+    lines = []
+    if event_id is not None:
+        lines.append(f'id: {event_id}')
+    lines.append(f'event: {kind}')
+    lines.append(f'data: {json.dumps(data)}')
+    return ('\n'.join(lines) + '\n\n').encode()
+
+
+def _database(func):
+    """Executa ``func`` en el fil de sync_to_async gestionant la connexió com una petició"""
+    @functools.wraps(func)
+    def wrapper(*args):
+        close_old_connections()
+        try:
+            return func(*args)
+        finally:
+            close_old_connections()
+    return sync_to_async(wrapper)
+
+
+def _stream_event_pk(path):
+    """event_pk si ``path`` és la URL del stream del xat, si no None"""
+    try:
+        match = resolve(path)
+    except Resolver404:
+        return None
+    if match.url_name != STREAM_URL_NAME:
+        return None
+    return match.kwargs['event_pk']
+
+
+@_database
+def _event_exists(event_pk):
+    from events.models import Event
+    return Event.objects.filter(pk=event_pk).exists()
+
+
+@_database
+def _missed_messages(event_pk, after):
+    from .views import get_messages_after
+    return get_messages_after(event_pk, after, AnonymousUser())
+
+
+def _parse_last_event_id(scope):
+    for name, value in scope.get('headers', []):
+        if name == b'last-event-id':
+            try:
+                return int(value)
+            except ValueError:
+                return None
+    return None
+
+
+class ChatStreamMiddleware:
+    """Middleware ASGI que serveix el stream SSE del xat i delega la resta a Django"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'http' and scope.get('method') == 'GET':
+            path = scope['path']
+            root_path = scope.get('root_path', '')
+            if root_path and path.startswith(root_path):
+                path = path[len(root_path):]
+            event_pk = _stream_event_pk(path)
+            if event_pk is not None:
+                await self.stream(event_pk, scope, receive, send)
+                return
+        await self.app(scope, receive, send)
+
+    async def stream(self, event_pk, scope, receive, send):
+        if not await _event_exists(event_pk):
+            await send({
+                'type': 'http.response.start',
+                'status': 404,
+                'headers': [(b'content-type', b'text/plain; charset=utf-8')],
+            })
+            await send({'type': 'http.response.body', 'body': b'Event no trobat'})
+            return
+
+        # Subscriure abans de consultar el que falta perquè no es perdi res entremig
+        queue = broker.subscribe(event_pk)
+        disconnected = asyncio.ensure_future(self._wait_disconnect(receive))
+        try:
+            await send({
+                'type': 'http.response.start',
+                'status': 200,
+                'headers': [
+                    (b'content-type', b'text/event-stream'),
+                    (b'cache-control', b'no-cache'),
+                    (b'x-accel-buffering', b'no'),
+                ],
+            })
+            await self._send(send, f'retry: {RETRY_MS}\n\n'.encode())
+
+            # Reconnexió: enviar el que s'ha perdut des de l'últim id rebut
+            last_id = _parse_last_event_id(scope)
+            if last_id is not None:
+                missed = await _missed_messages(event_pk, last_id)
+                if missed is None or missed.get('reset'):
+                    await self._send(send, _format_event('reset', {}))
+                else:
+                    for msg_id in missed['deleted']:
+                        await self._send(send, _format_event('delete', {'id': msg_id}))
+                    for msg in missed['messages']:
+                        await self._send(send, _format_event('message', msg, msg['id']))
+
+            while not disconnected.done():
+                getter = asyncio.ensure_future(queue.get())
+                done, _ = await asyncio.wait(
+                    {getter, disconnected},
+                    timeout=KEEPALIVE_SECONDS,
+                    return_when=asyncio.FIRST_COMPLETED,
+                )
+                if getter not in done:
+                    getter.cancel()
+                    if not disconnected.done():
+                        await self._send(send, b': keepalive\n\n')
+                    continue
+
+                kind, data = getter.result()
+                if kind == 'overflow':
+                    break
+                event_id = data['id'] if kind == 'message' else None
+                await self._send(send, _format_event(kind, data, event_id))
+        finally:
+            broker.unsubscribe(event_pk, queue)
+            client_gone = disconnected.done()
+            disconnected.cancel()
+
+        if not client_gone:
+            await send({'type': 'http.response.body', 'body': b'', 'more_body': False})
+
+    @staticmethod
+    async def _send(send, chunk):
+        await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+
+    @staticmethod
+    async def _wait_disconnect(receive):
+        while True:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                return
@@ -1,3 +1,499 @@
-from django.test import TestCase
+import asyncio
+import os
+import sys
+import tempfile
+import threading
+import time
+import traceback
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import DatabaseError
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from config.querybudget import max_queries
+from events.models import Event
+from .archive import TranscriptCache, archive_event
+from .broker import SEQUENCE_TTL, ChatBroker, broker
+from .cache import _version_key, recent_messages
+from .checks import check_buffer_cache, check_write_behind_cache
+from .models import ChatMessage, ChatTranscript
+from .moderation import ProfanityMatcher, normalize, profanity
+from .ratelimit import CacheStore, ChatRateLimiter, LocalStore, chat_limiter, rate_limited_response
+from .stream import _stream_event_pk
+from .views import _millis, chat_load_messages, chat_send_message
+from .writebehind import ChatWriteBehind
+
+User = get_user_model()
+
+PAYLOAD_FIELDS = {'id', 'display_name', 'message', 'created_at', 'can_delete', 'is_highlighted'}
+
+
+class ChatTestCase(TestCase):
+    """Un esdeveniment en directe amb tres missatges i les memòries cau del procés buides"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='anna', password='secret')
+        cls.event = Event.objects.create(
+            title='Directe de prova', description='Prova', creator=cls.user,
+            scheduled_date=timezone.now(), status='live', stream_url='https://www.twitch.tv/prova',
+        )
+        cls.messages = [
+            ChatMessage.objects.create(event=cls.event, user=cls.user, message=f'missatge {number}')
+            for number in range(3)
+        ]
+
+    def setUp(self):
+        recent_messages.clear()
+        cache.clear()
+        chat_limiter.store.clear()
+        self.url = reverse('chat_load_messages', args=[self.event.pk])
+
+    def load(self, **params):
+        return self.client.get(self.url, params)
+
+
+class ChatLoadMessagesTests(ChatTestCase):
+
+    def test_window_keeps_the_frontend_fields(self):
+        data = self.load().json()
+        self.assertEqual([message['id'] for message in data['messages']], [msg.id for msg in self.messages])
+        for message in data['messages']:
+            self.assertEqual(set(message), PAYLOAD_FIELDS)
+
+    def test_unchanged_chat_answers_304(self):
+        response = self.load()
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+        self.assertEqual(response['ETag'], etag)
+
+        self.client.force_login(self.user)
+        self.client.post(reverse('chat_send_message', args=[self.event.pk]), {'message': 'nou'})
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_after_returns_only_newer_messages(self):
+        data = self.load(after=self.messages[0].id).json()
+        self.assertEqual([message['id'] for message in data['messages']], [msg.id for msg in self.messages[1:]])
+        self.assertEqual(data['last_id'], self.messages[-1].id)
+        self.assertEqual(data['deleted'], [])
+
+        data = self.load(after=self.messages[-1].id).json()
+        self.assertEqual(data['messages'], [])
+        self.assertEqual(data['last_id'], self.messages[-1].id)
+
+    def test_deleted_message_is_sent_as_tombstone(self):
+        synced_at = self.load().json()['synced_at']
+        self.client.force_login(self.user)
+        deleted = self.messages[1]
+        response = self.client.post(reverse('chat_delete_message', args=[deleted.pk]))
+        self.assertTrue(response.json()['success'])
+
+        data = self.load(after=self.messages[-1].id, deleted_since=synced_at).json()
+        self.assertEqual(data['deleted'], [deleted.id])
+        self.assertNotIn(deleted.id, [message['id'] for message in self.load().json()['messages']])
+
+        # Eliminacions anteriors a deleted_since: el client ja les té
+        later = _millis(timezone.now()) + 1000
+        data = self.load(after=self.messages[-1].id, deleted_since=later).json()
+        self.assertEqual(data['deleted'], [])
+
+    def test_database_error_in_etag_returns_json(self):
+        # La primera lectura de l'ETag (l'arxiu del xat) falla
+        with mock.patch('chat.views.transcripts.get', side_effect=DatabaseError('caiguda')):
+            response = self.load()
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('messages', response.json())
+
+
+class RecentMessageCacheTests(ChatTestCase):
+
+    def test_unchanged_chat_is_served_without_queries(self):
+        self.load()
+        with self.assertNumQueries(0):
+            recent_messages.window(self.event.pk, 50)
+
+    def test_write_from_another_process_is_picked_up(self):
+        self.load()
+        # Un altre procés desa un missatge i incrementa la versió
+        other = ChatMessage.objects.create(event=self.event, user=self.user, message='des de fora')
+        cache.add(_version_key(self.event.pk), 0, None)
+        cache.incr(_version_key(self.event.pk))
+        ids = [message['id'] for message in self.load().json()['messages']]
+        self.assertIn(other.id, ids)
+        self.assertEqual(recent_messages._peek(self.event.pk).version, cache.get(_version_key(self.event.pk)))
+
+    def test_only_live_events_are_buffered(self):
+        self.load()
+        self.assertIsNotNone(recent_messages._peek(self.event.pk))
+
+        self.event.status = 'finished'
+        self.event.save()
+        self.assertIsNone(recent_messages._peek(self.event.pk))
+        self.assertEqual(len(self.load().json()['messages']), 3)
+        self.assertIsNone(recent_messages._peek(self.event.pk))
+
+    def test_several_processes_need_a_shared_cache(self):
+        self.assertEqual(check_buffer_cache(None), [])
+        with override_settings(WEB_PROCESSES=2):
+            self.assertEqual([error.id for error in check_buffer_cache(None)], ['chat.E002'])
+
+
+class ChatWriteBehindTests(ChatTestCase):
+
+    def setUp(self):
+        super().setUp()
+        # Sense el fil: els lots es desen quan el test crida flush()
+        self.write_behind = ChatWriteBehind(enabled=True)
+        mock.patch.object(self.write_behind, '_ensure_thread').start()
+        mock.patch('chat.views.write_behind', self.write_behind).start()
+        self.publish = mock.patch('chat.writebehind.broker.publish').start()
+        self.addCleanup(mock.patch.stopall)
+        self.client.force_login(self.user)
+
+    def send(self, text):
+        response = self.client.post(reverse('chat_send_message', args=[self.event.pk]), {'message': text})
+        return response.json()['message']['id']
+
+    def visible_ids(self):
+        return [message['id'] for message in self.load().json()['messages']]
+
+    def test_message_is_published_once_saved(self):
+        self.load()
+        msg_id = self.send('en cua')
+        created_at = self.write_behind.pending(msg_id).created_at
+        self.assertNotIn(msg_id, self.visible_ids())
+        self.publish.assert_not_called()
+
+        self.write_behind.flush()
+        self.assertEqual(ChatMessage.objects.get(pk=msg_id).created_at, created_at)
+        self.assertIn(msg_id, self.visible_ids())
+        self.publish.assert_called_once()
+        self.assertEqual(self.publish.call_args.args[:2], (self.event.pk, 'message'))
+
+    def delete(self, msg_id):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post(reverse('chat_delete_message', args=[msg_id])).json()
+
+    def test_deleting_a_queued_message_does_not_flush(self):
+        msg_id = self.send('me la repenso')
+        self.assertTrue(self.delete(msg_id)['success'])
+        self.assertEqual(self.write_behind.pending_count(), 1)
+        self.assertFalse(ChatMessage.objects.filter(pk=msg_id).exists())
+
+        self.write_behind.flush()
+        self.assertTrue(ChatMessage.objects.get(pk=msg_id).is_deleted)
+        self.assertNotIn(msg_id, self.visible_ids())
+        # Ni el missatge ni la seva eliminació: cap client l'havia rebut
+        self.publish.assert_not_called()
+
+    def test_deleting_a_published_message_is_announced(self):
+        msg_id = self.send('publicat')
+        self.write_behind.flush()
+        self.publish.reset_mock()
+        self.assertTrue(self.delete(msg_id)['success'])
+        self.assertTrue(ChatMessage.objects.get(pk=msg_id).is_deleted)
+        self.publish.assert_called_once_with(self.event.pk, 'delete', {'id': msg_id})
+
+    def test_deleting_a_message_of_a_lost_batch(self):
+        msg_id = self.send('es perdrà')
+        msg = self.write_behind.pending(msg_id)
+        with mock.patch('chat.writebehind.ChatMessage.objects.bulk_create', side_effect=DatabaseError), \
+                self.assertLogs('chat.writebehind', 'ERROR'):
+            for _ in range(3):
+                self.write_behind.flush()
+        self.assertIsNone(self.write_behind.pending(msg_id))
+
+        # La vista ja no el troba; i si l'esperava mentre es perdia, no hi ha res a desar
+        self.assertEqual(self.delete(msg_id)['error'], 'Missatge no trobat')
+        self.assertFalse(self.write_behind.soft_delete(msg))
+        self.assertFalse(ChatMessage.objects.filter(pk=msg_id).exists())
+        self.publish.assert_not_called()
+
+    def test_several_processes_need_a_shared_cache(self):
+        with mock.patch('chat.checks.write_behind', self.write_behind):
+            self.assertEqual(check_write_behind_cache(None), [])
+            with override_settings(WEB_PROCESSES=2):
+                self.assertEqual([error.id for error in check_write_behind_cache(None)], ['chat.E001'])
+
+
+class ChatArchiveTests(ChatTestCase):
+    """Un xat acabat de 23 missatges visibles arxivat en blocs de 4"""
+
+    def setUp(self):
+        super().setUp()
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        media_root = override_settings(MEDIA_ROOT=media.name)
+        media_root.enable()
+        self.addCleanup(media_root.disable)
+
+        self.event.status = 'finished'
+        self.event.save()
+        ChatMessage.objects.bulk_create(
+            ChatMessage(event=self.event, user=self.user, message=f'arxiu {number}') for number in range(21)
+        )
+        ChatMessage.objects.filter(pk=self.messages[1].pk).update(is_deleted=True)
+        self.visible = list(
+            ChatMessage.objects.filter(event=self.event, is_deleted=False).order_by('id').values_list('id', flat=True)
+        )
+        self.transcript = archive_event(self.event, block_size=4)
+        # Un lector propi: el del procés es podria quedar blocs d'un altre test amb el mateix nom
+        self.reader = TranscriptCache().get(self.event.pk)
+
+    def ids(self, entries):
+        return [entry['id'] for entry in entries]
+
+    def test_messages_move_to_the_file(self):
+        self.assertFalse(ChatMessage.objects.filter(event=self.event).exists())
+        self.assertEqual(self.transcript.message_count, 23)
+        self.assertEqual(self.transcript.last_message_id, self.visible[-1])
+        self.assertEqual(self.ids(self.load().json()['messages']), self.visible)
+
+    def test_window_after_and_before_round_trip(self):
+        self.assertEqual(self.ids(self.reader.last(5)), self.visible[-5:])
+        self.assertEqual(self.ids(self.reader.last(100)), self.visible)
+        # L'eliminat no hi és: el cursor que hi apunta segueix funcionant
+        self.assertEqual(self.ids(self.reader.after(self.messages[1].id, 3)), self.visible[1:4])
+        self.assertEqual(self.ids(self.reader.after(self.visible[5], 6)), self.visible[6:12])
+        self.assertEqual(self.ids(self.reader.after(self.visible[-1], 5)), [])
+        self.assertEqual(self.ids(self.reader.before(self.visible[10], 6)), self.visible[4:10])
+        self.assertEqual(self.ids(self.reader.before(self.visible[0], 5)), [])
+
+    def test_block_index(self):
+        self.assertEqual(len(self.reader.blocks), 6)
+        self.assertEqual([block[4] for block in self.reader.blocks], [4, 4, 4, 4, 4, 3])
+        self.assertEqual([(block[0], block[1]) for block in self.reader.blocks],
+                         [(self.visible[start], self.visible[min(start + 3, 22)]) for start in range(0, 23, 4)])
+        # Els blocs són seguits, just després de la capçalera
+        offsets = [(block[2], block[3]) for block in self.reader.blocks]
+        for (offset, length), (next_offset, _) in zip(offsets, offsets[1:]):
+            self.assertEqual(offset + length, next_offset)
+
+        # Una pàgina del mig només llegeix els blocs que la contenen
+        with mock.patch.object(self.reader, '_read', wraps=self.reader._read) as read:
+            self.reader.after(self.visible[9], 4)
+        self.assertEqual([call.args[0] for call in read.call_args_list], [2, 3])
+
+    def test_deleting_the_event_deletes_the_file(self):
+        path = self.transcript.file.path
+        self.assertTrue(os.path.exists(path))
+        self.event.delete()
+        self.assertFalse(ChatTranscript.objects.exists())
+        self.assertFalse(os.path.exists(path))
+
+
+class ChatRateLimitTests(ChatTestCase):
+
+    def test_sending_too_fast_answers_429(self):
+        self.client.force_login(self.user)
+        url = reverse('chat_send_message', args=[self.event.pk])
+        for number in range(5):
+            self.assertTrue(self.client.post(url, {'message': f'ràfega {number}'}).json()['success'])
+
+        response = self.client.post(url, {'message': 'un de massa'})
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response['Retry-After'], '1')
+        self.assertEqual(response.json()['retry_after'], 1)
+        self.assertFalse(ChatMessage.objects.filter(message='un de massa').exists())
+
+    def test_retry_after_rounds_up_to_whole_seconds(self):
+        self.assertEqual(rate_limited_response(0.2)['Retry-After'], '1')
+        self.assertEqual(rate_limited_response(2.3)['Retry-After'], '3')
+
+    def test_buckets_refill(self):
+        for store, clock in ((LocalStore(), 'chat.ratelimit.time.monotonic'),
+                             (CacheStore(), 'chat.ratelimit.time.time')):
+            with self.subTest(store=type(store).__name__), mock.patch(clock) as now:
+                limiter = ChatRateLimiter(store=store, enabled=True)
+                now.return_value = 1000.0
+                self.assertEqual([limiter.check(self.user.pk, self.event.pk) for _ in range(5)], [0] * 5)
+                self.assertAlmostEqual(limiter.check(self.user.pk, self.event.pk), 1.0)
+
+                # A una fitxa per segon: mig segon després en falta mitja
+                now.return_value = 1000.5
+                self.assertAlmostEqual(limiter.check(self.user.pk, self.event.pk), 0.5)
+                now.return_value = 1001.5
+                self.assertEqual(limiter.check(self.user.pk, self.event.pk), 0)
+
+                # Després d'una estona es torna a tenir la ràfega sencera, no més
+                now.return_value = 1100.0
+                self.assertEqual([limiter.check(self.user.pk, self.event.pk) for _ in range(5)], [0] * 5)
+                self.assertGreater(limiter.check(self.user.pk, self.event.pk), 0)
+
+    def test_throttled_users_do_not_spend_the_event_tokens(self):
+        limiter = ChatRateLimiter(store=LocalStore(), enabled=True)
+        with mock.patch('chat.ratelimit.EVENT_BURST', 6):
+            for _ in range(20):
+                limiter.check(self.user.pk, self.event.pk)
+            self.assertEqual(limiter.check(self.user.pk + 1, self.event.pk), 0)
+            self.assertGreater(limiter.check(self.user.pk + 2, self.event.pk), 0)
+
+
+class ProfanityFilterTests(SimpleTestCase):
+
+    def setUp(self):
+        self.matcher = ProfanityMatcher(terms=['puta', 'idiota', 'mierda', 'hijo de puta'])
+
+    def test_normalize_folds_case_accents_and_leetspeak(self):
+        self.assertEqual(normalize('ÀRBRE Cançó'), 'arbre canco')
+        self.assertEqual(normalize('1d10t4'), 'idiota')
+        self.assertEqual(self.matcher.find('ets un 1D10T4!'), 'idiota')
+        self.assertEqual(self.matcher.find('quina m13rd@'), 'mierda')
+
+    def test_accented_terms_match_plain_text(self):
+        matcher = ProfanityMatcher(terms=['imbècil', 'cabrón'])
+        self.assertEqual(matcher.find('IMBECIL'), 'imbecil')
+        self.assertEqual(matcher.find('cabron'), 'cabron')
+        self.assertEqual(matcher.find('Cabrón'), 'cabron')
+
+    def test_stretched_letters(self):
+        self.assertEqual(self.matcher.find('mieeeeerda'), 'mierda')
+        self.assertEqual(self.matcher.find('puuuuta'), 'puta')
+        # Amb dues lletres seguides a la paraula
+        self.assertEqual(ProfanityMatcher(terms=['asshole']).find('asssssshole'), 'asshole')
+
+    def test_phrases_match_across_words(self):
+        self.assertEqual(self.matcher.find('Hijo   de PUTA'), 'hijo de puta')
+        self.assertIsNone(ProfanityMatcher(terms=['hijo de puta']).find('hijo de la puta'))
+
+    def test_only_whole_words(self):
+        self.assertIsNone(self.matcher.find('M\'he comprat una computadora'))
+        self.assertIsNone(self.matcher.find('disputa'))
+
+    def test_compound_forms_must_be_listed(self):
+        # Sense substrings: "hijoputa" no conté la paraula "puta"...
+        self.assertIsNone(self.matcher.find('hijoputa'))
+        # ...però la llista del xat la porta com a terme propi
+        self.assertEqual(profanity.find('HIJOPUT4'), 'hijoputa')
+
+
+class ChatWaitMessagesTests(ChatTestCase):
+    """Long-poll amb el client asíncron (ASGIRequest): l'espera és real"""
+
+    def wait(self, after, event_pk=None, **params):
+        url = reverse('chat_wait_messages', args=[event_pk or self.event.pk])
+        return self.async_client.get(url, {'after': after, **params})
+
+    async def test_returns_at_once_if_there_are_newer_messages(self):
+        started = time.monotonic()
+        data = (await self.wait(self.messages[0].id, timeout=5)).json()
+        self.assertLess(time.monotonic() - started, 1)
+        self.assertEqual([message['id'] for message in data['messages']],
+                         [msg.id for msg in self.messages[1:]])
+
+    async def test_wakes_up_when_a_message_is_published(self):
+        waiting = asyncio.ensure_future(self.wait(self.messages[-1].id, timeout=5))
+        await asyncio.sleep(0.2)
+        self.assertFalse(waiting.done())
+
+        def send():
+            # Com el camí d'escriptura: primer al buffer i després la publicació
+            msg = ChatMessage.objects.create(event=self.event, user=self.user, message='nou')
+            recent_messages.append(msg)
+            recent_messages.notify(self.event.pk)
+            return msg
+
+        msg = await sync_to_async(send)()
+        started = time.monotonic()
+        broker.publish(self.event.pk, 'message', {'id': msg.id})
+        data = (await asyncio.wait_for(waiting, 2)).json()
+        self.assertLess(time.monotonic() - started, 1)
+        self.assertEqual([message['id'] for message in data['messages']], [msg.id])
+
+    async def test_timeout_returns_nothing_new(self):
+        started = time.monotonic()
+        data = (await self.wait(self.messages[-1].id, timeout=0.3)).json()
+        self.assertGreaterEqual(time.monotonic() - started, 0.3)
+        self.assertEqual((data['messages'], data['deleted']), ([], []))
+
+    async def test_deleted_messages_return_at_once(self):
+        await sync_to_async(self.messages[1].soft_delete)()
+        data = (await self.wait(self.messages[-1].id, timeout=5)).json()
+        self.assertEqual(data['messages'], [])
+        self.assertEqual(data['deleted'], [self.messages[1].id])
+
+    async def test_missing_event_and_cursor(self):
+        data = (await self.wait(self.messages[-1].id, event_pk=999999, timeout=5)).json()
+        self.assertEqual(data['error'], 'Event no trobat')
+        response = await self.async_client.get(reverse('chat_wait_messages', args=[self.event.pk]))
+        self.assertEqual(response.status_code, 400)
+
+    async def test_can_delete_depends_on_the_session_user(self):
+        data = (await self.wait(self.messages[0].id)).json()
+        self.assertFalse(any(message['can_delete'] for message in data['messages']))
+
+        await sync_to_async(self.async_client.force_login)(self.user)
+        data = (await self.wait(self.messages[0].id)).json()
+        self.assertTrue(all(message['can_delete'] for message in data['messages']))
+
+
+class ChatQueryBudgetTests(ChatTestCase):
+    """Les vistes del xat no passen del pressupost que declaren amb @query_budget"""
+
+    def test_load_messages(self):
+        # En fred (omple el buffer) i després amb ?after= i l'ETag
+        with max_queries(chat_load_messages.query_budget):
+            etag = self.load()['ETag']
+        with max_queries(chat_load_messages.query_budget):
+            self.load(after=self.messages[0].id)
+        with max_queries(chat_load_messages.query_budget):
+            self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+
+    def test_send_message(self):
+        self.client.force_login(self.user)
+        url = reverse('chat_send_message', args=[self.event.pk])
+        with max_queries(chat_send_message.query_budget):
+            self.assertTrue(self.client.post(url, {'message': 'dins del pressupost'}).json()['success'])
+
+    async def test_waiting_long_poll_does_not_hold_a_thread(self):
+        url = reverse('chat_wait_messages', args=[self.event.pk])
+        header = mock.patch('config.querybudget.RESPONSE_HEADER', True)
+        header.start()
+        self.addCleanup(header.stop)
+        waiting = asyncio.ensure_future(self.async_client.get(url, {'after': self.messages[-1].id, 'timeout': 1}))
+        await asyncio.sleep(0.3)
+        self.assertFalse(waiting.done())
+
+        # Mentre espera, cap fil és dins de la cadena de middleware (async_to_sync)
+        current = threading.get_ident()
+        busy = [
+            ident for ident, frame in sys._current_frames().items()
+            if ident != current and any(entry.filename.endswith('querybudget.py')
+                                        for entry in traceback.extract_stack(frame))
+        ]
+        self.assertEqual(busy, [])
+        response = await waiting
+        self.assertEqual(response.json()['messages'], [])
+        # Les consultes fetes amb sync_to_async també es compten
+        self.assertGreater(int(response['X-Query-Count']), 0)
+
+
+class ChatStreamTests(ChatTestCase):
+
+    def test_stream_url_comes_from_the_urlconf(self):
+        self.assertEqual(_stream_event_pk(reverse('chat_stream', args=[self.event.pk])), self.event.pk)
+        self.assertIsNone(_stream_event_pk(self.url))
+        self.assertIsNone(_stream_event_pk('/no/existeix/'))
+
+    def test_idle_sequences_are_forgotten(self):
+        broker = ChatBroker()
+        broker.publish(1, 'message', {})
+        before = broker.sequence(1)
+        self.assertGreater(before, 0)
+
+        broker._prune(time.monotonic() + SEQUENCE_TTL)
+        self.assertEqual(broker._sequences, {})
+        # Tornada a crear, la seqüència no repeteix cap valor anterior
+        broker.publish(1, 'message', {})
+        self.assertGreater(broker.sequence(1), before)
@@ -3,6 +3,8 @@ from . import views
 
 urlpatterns = [
     path('<int:event_pk>/messages/', views.chat_load_messages, name='chat_load_messages'),
+    path('<int:event_pk>/messages/wait/', views.chat_wait_messages, name='chat_wait_messages'),
+    path('<int:event_pk>/stream/', views.chat_stream, name='chat_stream'),  # Servit per chat.stream amb ASGI
     path('<int:event_pk>/send/', views.chat_send_message, name='chat_send_message'),
     path('message/<int:message_pk>/delete/', views.chat_delete_message, name='chat_delete_message'),  # Esta debe existir
 ]
\ No newline at end of file
@@ -1,57 +1,306 @@
-from django.http import JsonResponse
+from datetime import datetime, timezone as dt_timezone
+
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from django.http import HttpResponse, JsonResponse
 from django.shortcuts import get_object_or_404
 from django.views.decorators.http import require_POST
 from django.views.decorators.csrf import csrf_exempt
 from django.contrib.auth.decorators import login_required
+from django.db import transaction
 from django.utils import timezone
-from django.utils.timesince import timesince
+from django.utils.cache import get_conditional_response
+from django.utils.http import quote_etag
 
+from .archive import render_entry, transcripts
+from .broker import broker
+from .cache import BufferedMessage, push_payload, recent_messages
+from .ratelimit import chat_limiter, rate_limited_response
+from .writebehind import write_behind
 from .models import ChatMessage
 from .forms import ChatMessageForm
+from config.querybudget import query_budget
 from events.models import Event
 
+# Màxim de missatges que es retornen en una sola resposta
+CHAT_WINDOW = 50
 
-@csrf_exempt
-def chat_load_messages(request, event_pk):
-    """Cargar mensajes del chat"""
+# Segons màxims que el long-poll manté una petició oberta
+LONG_POLL_TIMEOUT = 25
+
+
+def _parse_cursor(value):
+    """Converteix el paràmetre ?after= en un id enter (o None si no és vàlid)"""
     try:
-        # 1. Obtener evento
-        event = Event.objects.get(pk=event_pk)
+        cursor = int(value)
+    except (TypeError, ValueError):
+        return None
+    return cursor if cursor >= 0 else None
 
-        # 2. Consulta SIMPLE - sin exclude() primero
-        all_messages = ChatMessage.objects.filter(event=event)
 
-        # 3. Filtrar en Python (evita problemas Djongo)
-        messages = []
-        for msg in all_messages[:100]:  # Máximo 100
-            if not getattr(msg, 'is_deleted', False):
-                messages.append(msg)
+def _parse_synced_at(value):
+    """Converteix el paràmetre ?deleted_since= (mil·lisegons) en un datetime"""
+    try:
+        millis = int(value)
+    except (TypeError, ValueError):
+        return None
+    return datetime.fromtimestamp(millis / 1000, tz=dt_timezone.utc)
 
-        # 4. Preparar datos
-        data = []
-        for msg in messages[:50]:  # Máximo 50 al frontend
-            display_name = msg.user.username if msg.user else 'Anònim'
 
-            # Calcular si el usuario actual puede eliminar este mensaje
-            can_delete = (
-                request.user.is_authenticated and
-                msg.user == request.user and
-                not getattr(msg, 'is_deleted', False)
-            )
+def _now_millis():
+    return _millis(timezone.now())
 
-            data.append({
-                'id': msg.id,
-                'display_name': display_name,
-                'message': msg.message,
-                'created_at': timesince(msg.created_at, timezone.now()) + ' enrere',
-                'can_delete': can_delete,
-                'is_highlighted': False,
-            })
 
-        return JsonResponse({'messages': data})
+def _serialize_message(msg, user):
+    """Converteix un ChatMessage al diccionari que espera el frontend"""
+    return BufferedMessage(msg).render(user, timezone.now())
+
+
+def _millis(value):
+    return int(value.timestamp() * 1000)
+
+
+def _archived_response(entries, last_id):
+    """Resposta a partir d'un xat arxivat (chat.archive): sense eliminacions possibles"""
+    now = timezone.now()
+    return {
+        'messages': [render_entry(entry, now) for entry in entries],
+        'deleted': [],
+        'last_id': last_id,
+        'synced_at': _millis(now),
+    }
+
+
+def _chat_etag(request, event_pk):
+    """
+    ETag del xat d'un esdeveniment: canvia quan arriba un missatge nou o se n'elimina un.
+    Surt de la memòria cau de missatges recents (o de dues consultes petites si no hi és),
+    així un client sense novetats rep un 304 buit sense que es llegeixi ni se serialitzi res.
+    """
+    transcript = transcripts.get(event_pk)
+    state = recent_messages.state(event_pk) if transcript is None else None
+    if transcript is not None:
+        # Xat arxivat: ja no canvia
+        last_id, last_deleted = transcript.last_id, None
+    elif state is not None:
+        last_id, last_deleted = state
+    else:
+        messages = ChatMessage.objects.filter(event_id=event_pk)
+        last_id = messages.order_by('-id').values_list('id', flat=True).first()
+        last_deleted = (
+            messages.filter(is_deleted=True)
+            .order_by('-deleted_at')
+            .values_list('deleted_at', flat=True)
+            .first()
+        )
+    deleted_stamp = _millis(last_deleted) if last_deleted else 0
+    user_id = request.user.id if request.user.is_authenticated else 0
+    after = request.GET.get('after', '')
+    before = request.GET.get('before', '')
+    return f'chat-{event_pk}-{after}-{before}-{last_id or 0}-{deleted_stamp}-{user_id}'
+
+
+def get_recent_messages(event_pk, user):
+    """
+    Finestra inicial del xat: els CHAT_WINDOW missatges visibles més recents, en ordre
+    cronològic. Normalment surt de la memòria cau (chat.cache); si no, una sola consulta
+    (amb l'autor per JOIN) que fa servir l'índex (event, is_deleted, created_at, id).
+    Retorna None si l'esdeveniment no existeix.
+    """
+    transcript = transcripts.get(event_pk)
+    if transcript is not None:
+        entries = transcript.last(CHAT_WINDOW)
+        return _archived_response(entries, entries[-1]['id'] if entries else 0)
+
+    cached = recent_messages.window(event_pk, CHAT_WINDOW)
+    if cached is not None:
+        entries, synced_at = cached
+        now = timezone.now()
+        return {
+            'messages': [entry.render(user, now) for entry in entries],
+            'deleted': [],
+            'last_id': entries[-1].id if entries else 0,
+            'synced_at': _millis(synced_at),
+        }
+
+    if not Event.objects.filter(pk=event_pk).exists():
+        return None
+
+    newest = list(
+        ChatMessage.objects.filter(event_id=event_pk, is_deleted=False)
+        .select_related('user')
+        .order_by('-created_at', '-id')[:CHAT_WINDOW]
+    )
+    newest.reverse()
+
+    data = [_serialize_message(msg, user) for msg in newest]
+
+    # Cursor per a les peticions incrementals (?after=)
+    last_id = newest[-1].id if newest else 0
+
+    return {'messages': data, 'deleted': [], 'last_id': last_id, 'synced_at': _now_millis()}
+
+
+def get_messages_after(event_pk, after, user, deleted_since=None):
+    """
+    Missatges nous des del cursor ``after`` (l'últim id que té el client) i
+    tombstones dels missatges eliminats des d'aleshores.
+    Si el client envia ``deleted_since`` (el ``synced_at`` de la resposta anterior)
+    només es repeteixen les eliminacions posteriors.
+    També el fan servir el canal de push (chat.stream) i el long-poll.
+    Retorna None si l'esdeveniment no existeix.
+    """
+    transcript = transcripts.get(event_pk)
+    if transcript is not None:
+        entries = transcript.after(after, CHAT_WINDOW)
+        return _archived_response(entries, entries[-1]['id'] if entries else after)
+
+    cached = recent_messages.after(event_pk, after, CHAT_WINDOW, deleted_since)
+    if cached is not None:
+        entries, deleted, synced_at = cached
+        now = timezone.now()
+        return {
+            'messages': [entry.render(user, now) for entry in entries],
+            'deleted': deleted,
+            'last_id': entries[-1].id if entries else after,
+            'synced_at': _millis(synced_at),
+        }
+
+    if not Event.objects.filter(pk=event_pk).exists():
+        return None
+
+    if after == 0:
+        # Xat buit quan el client el va carregar: tot és nou i no hi ha res a esborrar
+        cursor_created_at = None
+    else:
+        cursor_created_at = (
+            ChatMessage.objects.filter(pk=after, event_id=event_pk)
+            .values_list('created_at', flat=True)
+            .first()
+        )
+    if after and cursor_created_at is None:
+        # Cursor desconegut: el client ha de tornar a carregar la finestra sencera
+        return {'messages': [], 'deleted': [], 'last_id': after, 'reset': True,
+                'synced_at': _now_millis()}
+
+    new_messages = list(
+        ChatMessage.objects.filter(event_id=event_pk, id__gt=after, is_deleted=False)
+        .select_related('user')
+        .order_by('id')[:CHAT_WINDOW]
+    )
+
+    # Un missatge eliminat després de crear-se el del cursor pot estar a la pantalla del client
+    synced_at = _now_millis()
+    deleted = []
+    if cursor_created_at is not None:
+        deleted_threshold = cursor_created_at
+        if deleted_since is not None and deleted_since > deleted_threshold:
+            deleted_threshold = deleted_since
+        deleted = list(
+            ChatMessage.objects.filter(
+                event_id=event_pk,
+                id__lte=after,
+                is_deleted=True,
+                deleted_at__gte=deleted_threshold,
+            ).values_list('id', flat=True)
+        )
+
+    data = [_serialize_message(msg, user) for msg in new_messages]
+    last_id = new_messages[-1].id if new_messages else after
+
+    return {'messages': data, 'deleted': deleted, 'last_id': last_id, 'synced_at': synced_at}
+
+
+def get_messages_before(event_pk, before, user):
+    """
+    Pàgina d'historial: els CHAT_WINDOW missatges visibles anteriors al missatge
+    ``before`` en l'ordre (created_at, id), en ordre cronològic. Paginació per clau:
+    sigui quina sigui la profunditat, és una lectura per rang de l'índex
+    (event, is_deleted, created_at, id) a partir del cursor, sense offset.
+    ``before`` de la resposta és el cursor de la pàgina següent.
+    Retorna None si l'esdeveniment no existeix.
+    """
+    now = timezone.now()
+
+    transcript = transcripts.get(event_pk)
+    if transcript is not None:
+        entries = transcript.before(before, CHAT_WINDOW + 1)
+        has_more = len(entries) > CHAT_WINDOW
+        page = [render_entry(entry, now) for entry in entries[-CHAT_WINDOW:]]
+        return _history_response(page, has_more)
+
+    cached = recent_messages.before(event_pk, before, CHAT_WINDOW)
+    if cached is not None:
+        entries, has_more = cached
+        return _history_response([entry.render(user, now) for entry in entries], has_more)
+
+    cursor = (
+        ChatMessage.objects.filter(pk=before, event_id=event_pk)
+        .values_list('created_at', flat=True)
+        .first()
+    )
+    if cursor is None:
+        if not Event.objects.filter(pk=event_pk).exists():
+            return None
+        return _history_response([], False)
+
+    older = list(
+        ChatMessage.objects.filter(event_id=event_pk, is_deleted=False)
+        .filter(created_at__lte=cursor)
+        .exclude(created_at=cursor, id__gte=before)
+        .select_related('user')
+        .order_by('-created_at', '-id')[:CHAT_WINDOW + 1]
+    )
+    has_more = len(older) > CHAT_WINDOW
+    page = older[:CHAT_WINDOW]
+    page.reverse()
+    return _history_response([_serialize_message(msg, user) for msg in page], has_more)
+
+
+def _history_response(messages, has_more):
+    return {
+        'messages': messages,
+        'before': messages[0]['id'] if messages else None,
+        'has_more': has_more,
+    }
+
+
+@query_budget(8)
+@csrf_exempt
+def chat_load_messages(request, event_pk):
+    """
+    Cargar mensajes del chat.
+
+    Sense paràmetres retorna la finestra de missatges visibles. Amb ``?after=<id>``
+    retorna només els missatges nous i els ids eliminats des d'aquest cursor
+    (o des de ``?deleted_since=``, el ``synced_at`` de la resposta anterior).
+    Amb ``?before=<id>`` retorna la pàgina d'historial anterior a aquest missatge.
+    Si el client ja té l'ETag actual (``If-None-Match``) respon 304 sense cos.
+    """
+    try:
+        # Dins del try: si falla la base de dades, la resposta és la mateixa de sempre
+        etag = quote_etag(_chat_etag(request, event_pk))
+        response = get_conditional_response(request, etag=etag)
+        if response is not None:
+            response['ETag'] = etag
+            return response
+
+        after = _parse_cursor(request.GET.get('after'))
+        before = _parse_cursor(request.GET.get('before'))
+        if before is not None:
+            data = get_messages_before(event_pk, before, request.user)
+        elif after is not None:
+            deleted_since = _parse_synced_at(request.GET.get('deleted_since'))
+            data = get_messages_after(event_pk, after, request.user, deleted_since)
+        else:
+            data = get_recent_messages(event_pk, request.user)
+
+        if data is None:
+            return JsonResponse({'messages': [], 'error': 'Event no trobat'})
+        response = JsonResponse(data)
+        response['ETag'] = etag
+        return response
 
-    except Event.DoesNotExist:
-        return JsonResponse({'messages': [], 'error': 'Event no trobat'})
     except Exception as e:
         # Si hay error, devolver datos de prueba
         return JsonResponse({
@@ -68,6 +317,54 @@ def chat_load_messages(request, event_pk):
         })
 
 
+async def chat_wait_messages(request, event_pk):
+    """
+    Long-poll: com ``chat_load_messages?after=`` però, si no hi ha res de nou, manté
+    la petició oberta fins que es publica un missatge a l'esdeveniment o s'esgota el temps.
+    L'espera es fa sobre la condició asyncio de l'esdeveniment (chat.broker), sense tornar
+    a consultar la base de dades. Amb WSGI no hi ha bucle compartit i respon de seguida.
+    """
+    after = _parse_cursor(request.GET.get('after'))
+    if after is None:
+        return JsonResponse({'messages': [], 'error': 'Falta el paràmetre after'}, status=400)
+
+    try:
+        timeout = min(float(request.GET.get('timeout', LONG_POLL_TIMEOUT)), LONG_POLL_TIMEOUT)
+    except ValueError:
+        timeout = LONG_POLL_TIMEOUT
+    deleted_since = _parse_synced_at(request.GET.get('deleted_since'))
+
+    # La sessió es carrega de manera síncrona: resoldre l'usuari abans d'esperar
+    user = await sync_to_async(_resolve_user)(request)
+
+    # Llegir la seqüència abans de consultar perquè no es perdi cap publicació entremig
+    sequence = broker.sequence(event_pk)
+    data = await sync_to_async(get_messages_after)(event_pk, after, user, deleted_since)
+    if data is None:
+        return JsonResponse({'messages': [], 'error': 'Event no trobat'})
+    if data['messages'] or data['deleted'] or data.get('reset') or not isinstance(request, ASGIRequest):
+        return JsonResponse(data)
+
+    if await broker.wait_for_publish(event_pk, sequence, timeout):
+        data = await sync_to_async(get_messages_after)(event_pk, after, user, deleted_since)
+    return JsonResponse(data)
+
+
+def _resolve_user(request):
+    request.user.is_authenticated  # Força la càrrega de la sessió
+    return request.user
+
+
+def chat_stream(request, event_pk):
+    """
+    El canal de push (SSE) el serveix chat.stream.ChatStreamMiddleware des de config/asgi.py.
+    Si arriba aquí és que l'aplicació corre amb WSGI: el client torna al polling.
+    """
+    return HttpResponse('El xat en directe necessita el servidor ASGI', status=501,
+                        content_type='text/plain; charset=utf-8')
+
+
+@query_budget(6)
 @login_required
 @require_POST
 def chat_send_message(request, event_pk):
@@ -78,16 +375,30 @@ def chat_send_message(request, event_pk):
         if event.status != 'live':
             return JsonResponse({'success': False, 'error': 'Event no actiu'})
 
-        message_text = request.POST.get('message', '').strip()
-        if not message_text:
+        retry_after = chat_limiter.check(request.user.id, event.pk)
+        if retry_after:
+            return rate_limited_response(retry_after)
+
+        if not request.POST.get('message', '').strip():
             return JsonResponse({'success': False, 'error': 'Missatge buit'})
 
-        # Crear mensaje
-        msg = ChatMessage.objects.create(
-            event=event,
-            user=request.user,
-            message=message_text
-        )
+        # Validar amb el formulari (filtre de llenguatge ofensiu inclòs)
+        form = ChatMessageForm(request.POST)
+        if not form.is_valid():
+            return JsonResponse({'success': False, 'error': form.errors['message'][0]})
+
+        # Crear mensaje (amb write-behind es desa més tard, en lot, i es publica llavors)
+        msg = ChatMessage(event=event, user=request.user, message=form.cleaned_data['message'])
+        if write_behind.enabled:
+            write_behind.submit(msg)
+        else:
+            msg.save()
+            # Actualitzar la memòria cau i avisar els altres processos i els subscriptors
+            # del canal de push (SSE)
+            recent_messages.append(msg)
+            payload = push_payload(msg)
+            transaction.on_commit(lambda: recent_messages.notify(event.pk))
+            transaction.on_commit(lambda: broker.publish(event.pk, 'message', payload))
 
         return JsonResponse({
             'success': True,
@@ -105,22 +416,31 @@ def chat_send_message(request, event_pk):
         return JsonResponse({'success': False, 'error': str(e)})
 
 
+@query_budget(6)
 @login_required
 @require_POST
 def chat_delete_message(request, message_pk):
     """Eliminar mensaje"""
     try:
-        msg = ChatMessage.objects.get(pk=message_pk)
+        # Pot ser un missatge acceptat que encara espera el seu lot
+        msg = write_behind.pending(message_pk) or ChatMessage.objects.get(pk=message_pk)
 
         # Verificar permisos: solo el autor puede eliminar
-        if request.user != msg.user and not request.user.is_staff:
+        if request.user.pk != msg.user_id and not request.user.is_staff:
             return JsonResponse({
                 'success': False,
                 'error': 'No tens permisos per eliminar aquest missatge'
             })
 
-        msg.is_deleted = True
-        msg.save()
+        retry_after = chat_limiter.check(request.user.id, msg.event_id)
+        if retry_after:
+            return rate_limited_response(retry_after)
+
+        # Un missatge que encara era a la cua (o s'ha perdut) no l'ha rebut cap client
+        if write_behind.soft_delete(msg):
+            recent_messages.mark_deleted(msg)
+            transaction.on_commit(lambda: recent_messages.notify(msg.event_id))
+            transaction.on_commit(lambda: broker.publish(msg.event_id, 'delete', {'id': msg.id}))
 
         return JsonResponse({'success': True})
 
@@ -0,0 +1,229 @@
+"""
+Escriptura diferida (write-behind) dels missatges del xat.
+
+Amb ``CHAT_WRITE_BEHIND = True``, ``chat_send_message`` no fa un ``create()`` per
+missatge: el missatge rep un id i la data al moment, es respon a l'usuari i un fil en
+segon pla el desa amb ``bulk_create`` en lots de ``CHAT_WRITE_BEHIND_BATCH_SIZE`` o cada
+``CHAT_WRITE_BEHIND_FLUSH_INTERVAL`` segons, el que passi primer. Fins que el lot no és
+a la base de dades el missatge no entra a la memòria cau ni es publica al canal de push.
+
+Els ids es reserven amb ``cache.incr`` sobre la memòria cau per defecte de Django,
+començant pel màxim id desat. Si hi ha diversos processos, la memòria cau ha de ser
+compartida (memcached, redis...) perquè no es repeteixin ids: ``manage.py check`` ho
+exigeix amb ``WEB_PROCESSES > 1`` (chat/checks.py). Si la clau es perd, es continua
+``ID_RECOVERY_GAP`` ids més enllà del màxim desat, per sobre dels pendents dels altres
+processos. Tots els missatges s'han de crear per aquest camí mentre el mode estigui actiu.
+
+Eliminar un missatge que encara és a la cua no força cap escriptura: es desa ja
+eliminat amb el seu lot (``soft_delete``) i, com que no s'havia publicat, no cal avisar
+ningú. Si el lot s'ha perdut no hi ha res a eliminar.
+
+Els lots pendents es desen en tancar el procés (atexit). Si un lot falla es
+reintenta uns quants cops; si continua fallant es registra a ``chat.writebehind``
+amb els ids perduts i es compta a ``stats['failed']``.
+"""
+import atexit
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import Max
+from django.utils import timezone
+
+from .broker import broker
+from .cache import push_payload, recent_messages
+from .models import ChatMessage
+
+logger = logging.getLogger('chat.writebehind')
+
+ENABLED = getattr(settings, 'CHAT_WRITE_BEHIND', False)
+BATCH_SIZE = getattr(settings, 'CHAT_WRITE_BEHIND_BATCH_SIZE', 100)
+FLUSH_INTERVAL = getattr(settings, 'CHAT_WRITE_BEHIND_FLUSH_INTERVAL', 0.5)
+
+# Intents abans de donar un lot per perdut
+MAX_ATTEMPTS = 3
+
+ID_CACHE_KEY = 'chat:writebehind:last_id'
+
+# Ids que se salten si la memòria cau perd la clau: més que els que poden estar pendents
+ID_RECOVERY_GAP = 100000
+
+
+class ChatWriteBehind:
+    """Cua de missatges pendents amb un fil que els desa per lots"""
+
+    def __init__(self, enabled=ENABLED, batch_size=BATCH_SIZE, flush_interval=FLUSH_INTERVAL):
+        self.enabled = enabled
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.stats = {'queued': 0, 'flushed': 0, 'batches': 0, 'failed': 0}
+        self._pending = []
+        self._retry = []
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopping = False
+        self._thread = None
+        self._last_id = 0
+
+    def submit(self, msg):
+        """
+        Assigna id i data a un ChatMessage sense desar i el posa a la cua.
+        El missatge retornat ja es pot serialitzar i publicar.
+        """
+        msg.id = self._next_id()
+        msg.created_at = timezone.now()
+        with self._lock:
+            self._pending.append(msg)
+            self.stats['queued'] += 1
+            full = len(self._pending) >= self.batch_size
+        self._ensure_thread()
+        if full:
+            self._wakeup.set()
+        return msg
+
+    def pending_count(self):
+        with self._lock:
+            return len(self._pending) + len(self._retry)
+
+    def pending(self, message_pk):
+        """El missatge ``message_pk`` si encara espera el seu lot"""
+        with self._lock:
+            for msg in self._retry + self._pending:
+                if msg.id == message_pk:
+                    return msg
+        return None
+
+    def soft_delete(self, msg):
+        """
+        Marca el missatge com eliminat. Si encara és a la cua es desarà ja eliminat; si
+        s'està desant, s'espera aquell lot (sense forçar-ne cap altre) i s'actualitza la fila.
+        Retorna True si el missatge era a la base de dades (i publicat): només aleshores
+        cal anunciar l'eliminació.
+        """
+        if not msg._state.adding:
+            msg.soft_delete()
+            return True
+        if self._mark_queued_deleted(msg):
+            return False
+        with self._flush_lock:
+            # El lot ja s'ha desat, ha fallat i torna a ser a la cua, o s'ha perdut
+            if self._mark_queued_deleted(msg):
+                return False
+        if msg._state.adding:
+            return False  # Lot perdut (ja registrat a _report_lost): la fila no existeix
+        msg.soft_delete()
+        return True
+
+    def flush(self):
+        """Desa ara tot el que hi ha pendent (en lots de batch_size)"""
+        with self._flush_lock:
+            with self._lock:
+                batch, self._pending = self._retry + self._pending, []
+                self._retry = []
+
+            for start in range(0, len(batch), self.batch_size):
+                self._write(batch[start:start + self.batch_size])
+
+    def close(self):
+        """Atura el fil i desa el que quedi; es crida en tancar el procés"""
+        self._stopping = True
+        self._wakeup.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout=self.flush_interval * 4 + 5)
+        self.flush()
+        with self._lock:
+            lost = self._retry
+            self._retry = []
+        if lost:
+            self._report_lost(lost)
+
+    # --- Intern ----------------------------------------------------------------
+
+    def _write(self, batch):
+        for msg in batch:
+            msg._writebehind_attempts = getattr(msg, '_writebehind_attempts', 0) + 1
+        try:
+            ChatMessage.objects.bulk_create(batch)
+        except Exception:
+            logger.exception('No s\'ha pogut desar un lot de %d missatges del xat', len(batch))
+            retry = [msg for msg in batch if msg._writebehind_attempts < MAX_ATTEMPTS]
+            lost = [msg for msg in batch if msg._writebehind_attempts >= MAX_ATTEMPTS]
+            with self._lock:
+                self._retry.extend(retry)
+            if lost:
+                self._report_lost(lost)
+            return
+        with self._lock:
+            self.stats['flushed'] += len(batch)
+            self.stats['batches'] += 1
+        self._publish(batch)
+
+    def _publish(self, batch):
+        """Ara que són a la base de dades: memòria cau, altres processos i canal de push"""
+        for msg in batch:
+            recent_messages.append(msg)
+        for event_pk in {msg.event_id for msg in batch}:
+            recent_messages.notify(event_pk)
+        for msg in batch:
+            if not msg.is_deleted:
+                broker.publish(msg.event_id, 'message', push_payload(msg))
+
+    def _mark_queued_deleted(self, msg):
+        with self._lock:
+            if not any(queued is msg for queued in self._retry + self._pending):
+                return False
+            msg.is_deleted = True
+            msg.deleted_at = timezone.now()
+            return True
+
+    def _report_lost(self, lost):
+        with self._lock:
+            self.stats['failed'] += len(lost)
+        logger.error(
+            'S\'han perdut %d missatges del xat després de %d intents (ids: %s)',
+            len(lost), MAX_ATTEMPTS, ', '.join(str(msg.id) for msg in lost),
+        )
+
+    def _run(self):
+        while not self._stopping:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            if self._stopping:
+                break
+            started = time.monotonic()
+            self.flush()
+            if self._retry:
+                # Donar temps a la base de dades abans de reintentar
+                time.sleep(max(0.0, self.flush_interval - (time.monotonic() - started)))
+        connection.close()
+
+    def _ensure_thread(self):
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None and not self._stopping:
+                self._thread = threading.Thread(
+                    target=self._run, name='chat-writebehind', daemon=True
+                )
+                self._thread.start()
+                atexit.register(self.close)
+
+    def _next_id(self):
+        try:
+            next_id = cache.incr(ID_CACHE_KEY)
+        except ValueError:
+            # Primer id (o la memòria cau ha perdut la clau): continuar pel més alt conegut,
+            # tenint en compte els pendents d'aquest procés i, amb el salt, els dels altres
+            last = (ChatMessage.objects.aggregate(last=Max('id'))['last'] or 0) + ID_RECOVERY_GAP
+            cache.add(ID_CACHE_KEY, max(last, self._last_id), timeout=None)
+            next_id = cache.incr(ID_CACHE_KEY)
+        self._last_id = max(self._last_id, next_id)
+        return next_id
+
+
+# Instància única del procés
+write_behind = ChatWriteBehind()
@@ -2,6 +2,8 @@
 ASGI config for config project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+The Django application is wrapped by ``chat.stream.ChatStreamMiddleware``, which
+serves the chat push channel (``/chat/<event_pk>/stream/``) directly.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/4.1/howto/deployment/asgi/
@@ -13,4 +15,9 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+# S'importa després de get_asgi_application() perquè Django ja estigui configurat
+from chat.stream import ChatStreamMiddleware  # noqa: E402
+
+application = ChatStreamMiddleware(django_application)
@@ -0,0 +1,367 @@
+"""
+Micro-benchmarks dels camins que s'executen a cada petició (comanda ``benchmark``).
+
+Cada cas (``@benchmark``) prepara el que necessita a partir de les dades de prova
+(``Fixture``) i retorna la funció que es mesura. ``measure`` la crida ``number`` vegades
+per ronda (les que calguin perquè una ronda duri ``ROUND_SECONDS``) durant ``rounds``
+rondes i en treu el temps per crida: mediana, mínim i p95. Les consultes es compten a
+part, en una crida fora del cronòmetre.
+
+Els resultats es desen com a fitxer de referència (``save``) i les execucions següents es
+comparen amb ell (``compare``): un cas és una regressió si el mínim puja més del llindar
+(multiplicat per la ``tolerance`` del cas) o si fa més consultes que abans. El mínim és
+el que menys depèn de la resta de la màquina; els casos que escriuen i desfan la
+transacció varien més i hi tenen més marge. ``confirm`` torna a mesurar els casos que
+només han sortit més lents abans de donar-los per regressió.
+Els temps són de la màquina: la referència s'ha de desar i comparar a la mateixa màquina,
+sense altra feina (per això el fitxer per defecte no es versiona).
+
+Només s'executen amb una base de dades marcada com a d'un sol ús
+(``DISPOSABLE_DATABASE = True``, com a ``config.settings_loadtest``): hi creen dades de
+prova. Els casos que escriuen ho fan dins d'una transacció que es desfà.
+"""
+import gc
+import json
+import platform
+import statistics
+import time
+from io import StringIO
+
+import django
+from django import forms
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management import CommandError, call_command
+from django.db import connection, transaction
+from django.db.models import Count
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from chat.forms import ChatMessageForm
+from chat.models import ChatMessage
+from chat.views import chat_load_messages
+from events.models import Event
+from events.pagination import KeysetPaginator
+from events.scheduler import apply_transitions
+from events.search import search_index
+from events.views import event_list_view
+
+from .loadtest import percentile
+
+User = get_user_model()
+
+# Dades de prova que es creen si la base de dades és buida (seed_users + seed_events)
+FIXTURE = {'users': 200, 'follows': 5, 'events': 2000, 'messages': 20000, 'seed': 42}
+
+# Durada mínima d'una ronda: per sota, el rellotge, el bucle i les interrupcions pesen massa
+ROUND_SECONDS = 0.2
+
+# Vegades que es torna a mesurar un cas que ha sortit més lent
+RETRIES = 2
+
+# Esdeveniments dels casos que recorren models (etiquetes, URL del stream)
+MODEL_SAMPLE = 500
+
+CHAT_SAMPLES = [
+    'Hola a tothom!',
+    'Quin directe més bo, gràcies per fer-lo',
+    '   ',
+    'Algú sap a quina hora comença la segona part del torneig de demà?',
+    'Això és una mierda',
+    'Visca el gaming ' * 20,
+]
+
+BENCHMARKS = {}
+TOLERANCES = {}
+
+
+def benchmark(name, tolerance=1):
+    """
+    Registra un cas: ``setup(fixture)`` retorna la funció sense arguments que es mesura.
+    ``tolerance`` multiplica el llindar de regressió del cas.
+    """
+    def register(setup):
+        BENCHMARKS[name] = setup
+        TOLERANCES[name] = tolerance
+        return setup
+    return register
+
+
+class Fixture:
+    """El que fan servir els casos, llegit de les dades de prova"""
+
+    def __init__(self):
+        self.user = User.objects.filter(is_active=True, is_superuser=False).order_by('pk').first()
+        busiest = (
+            ChatMessage.objects.filter(is_deleted=False).values('event')
+            .annotate(total=Count('pk')).order_by('-total', 'event').first()
+        )
+        self.chat_event_pk = busiest['event'] if busiest else None
+        self.events = list(Event.objects.order_by('pk')[:MODEL_SAMPLE])
+        self.counts = {
+            'users': User.objects.count(),
+            'events': Event.objects.count(),
+            'messages': ChatMessage.objects.count(),
+        }
+
+    @classmethod
+    def ensure(cls, write=None):
+        """Crea les dades de prova si no hi ha cap esdeveniment"""
+        if not getattr(settings, 'DISPOSABLE_DATABASE', False):
+            raise CommandError(
+                f"La base de dades {settings.DATABASES['default']['NAME']} no és de proves: els "
+                "benchmarks hi escriuen. Fes servir DJANGO_SETTINGS_MODULE=config.settings_loadtest "
+                "(DISPOSABLE_DATABASE = True)."
+            )
+        if not Event.objects.exists():
+            if write:
+                write(f"Creant les dades de prova ({FIXTURE['events']} esdeveniments, "
+                      f"{FIXTURE['messages']} missatges)...")
+            quiet = {'stdout': StringIO(), 'seed': FIXTURE['seed'], 'workers': 1}
+            call_command('seed_users', users=FIXTURE['users'], follows=FIXTURE['follows'], **quiet)
+            call_command('seed_events', events=FIXTURE['events'], messages=FIXTURE['messages'], **quiet)
+        return cls()
+
+    def request(self, path, **params):
+        request = RequestFactory().get(path, params)
+        request.user = self.user
+        return request
+
+
+def _view(view, request, **kwargs):
+    def run():
+        response = view(request, **kwargs)
+        if response.status_code != 200:
+            raise RuntimeError(f'{request.get_full_path()} ha respost {response.status_code}')
+    return run
+
+
+def _rolled_back(func):
+    """Cada crida (també l'escalfament i la de comptar consultes) es desfà en acabar"""
+    def run():
+        with transaction.atomic():
+            func()
+            transaction.set_rollback(True)
+    return run
+
+
+@benchmark('chat_load_messages')
+def chat_window(fixture):
+    url = reverse('chat_load_messages', args=[fixture.chat_event_pk])
+    return _view(chat_load_messages, fixture.request(url), event_pk=fixture.chat_event_pk)
+
+
+@benchmark('chat_load_messages ?after=')
+def chat_poll(fixture):
+    # Un client que porta 20 missatges de retard
+    ids = ChatMessage.objects.filter(event_id=fixture.chat_event_pk).order_by('-id').values_list('id', flat=True)
+    after = ids[20] if len(ids) > 20 else 0
+    url = reverse('chat_load_messages', args=[fixture.chat_event_pk])
+    return _view(chat_load_messages, fixture.request(url, after=after), event_pk=fixture.chat_event_pk)
+
+
+@benchmark('ChatMessageForm.clean_message')
+def clean_message(fixture):
+    form = ChatMessageForm()
+
+    def run():
+        for message in CHAT_SAMPLES:
+            form.cleaned_data = {'message': message}
+            try:
+                form.clean_message()
+            except forms.ValidationError:
+                pass
+    return run
+
+
+@benchmark('event_list_view ?search=')
+def event_search(fixture):
+    return _view(event_list_view, fixture.request(reverse('events:event_list'), search='música indie'))
+
+
+@benchmark('event_list_view ?category=&status=')
+def event_filter(fixture):
+    request = fixture.request(reverse('events:event_list'), category='music', status='finished')
+    return _view(event_list_view, request)
+
+
+@benchmark('event_list_view ?cursor=')
+def event_page(fixture):
+    # Tercera pàgina del llistat sencer
+    paginator = KeysetPaginator(Event.objects.all(), 12)
+    cursor = paginator.get_page(paginator.get_page().next_cursor).next_cursor
+    return _view(event_list_view, fixture.request(reverse('events:event_list'), cursor=cursor))
+
+
+@benchmark('Event.get_stream_embed_url')
+def stream_embed_url(fixture):
+    events = fixture.events
+
+    def run():
+        for event in events:
+            event.get_stream_embed_url()
+    return run
+
+
+@benchmark('Event.get_stream_embed_url (sense desar)')
+def stream_embed_url_unsaved(fixture):
+    # Files anteriors a backfill_stream_embeds: la URL es calcula a cada crida
+    events = [Event(stream_url=event.stream_url) for event in fixture.events]
+
+    def run():
+        for event in events:
+            event.get_stream_embed_url()
+    return run
+
+
+@benchmark('Event.get_tags_list')
+def tags_list(fixture):
+    events = fixture.events
+
+    def run():
+        for event in events:
+            # Sense la llista guardada: es mesura el càlcul
+            event.__dict__.pop('_tags_list', None)
+            event.get_tags_list()
+    return run
+
+
+@benchmark('update_event_statuses', tolerance=2)
+def update_statuses(fixture):
+    # La passada periòdica: normalment no hi ha res pendent, però si n'hi ha no es desa
+    return _rolled_back(lambda: call_command('update_event_statuses', allow_local_cache=True, stdout=StringIO()))
+
+
+@benchmark('update_event_statuses (200 canvis)', tolerance=2)
+def update_statuses_due(fixture):
+    # Una hora fixa de les dades (no del rellotge) amb 200 programats ja començats
+    scheduled = Event.objects.filter(status='scheduled').order_by('scheduled_date')
+    moment = scheduled.values_list('scheduled_date', flat=True)[min(199, scheduled.count() - 1)]
+
+    return _rolled_back(lambda: apply_transitions(moment))
+
+
+def measure(func, rounds):
+    """Temps per crida (µs) de ``rounds`` rondes i consultes d'una crida"""
+    func()  # Escalfament: memòries cau, plantilles, connexió
+    # Com timeit: sense el col·lector d'escombraries, que s'activa segons el que s'ha creat abans
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        number, timings = _rounds(func, rounds)
+    finally:
+        if enabled:
+            gc.enable()
+
+    with CaptureQueriesContext(connection) as queries:
+        func()
+    return {
+        'median_us': round(statistics.median(timings), 2),
+        'min_us': round(timings[0], 2),
+        'p95_us': round(percentile(timings, 95), 2),
+        'queries': len(queries),
+        'number': number,
+        'rounds': rounds,
+    }
+
+
+def _rounds(func, rounds):
+    """(crides per ronda, temps per crida de cada ronda ordenats)"""
+    number = 1
+    while True:
+        started = time.perf_counter()
+        for _ in range(number):
+            func()
+        elapsed = time.perf_counter() - started
+        if elapsed >= ROUND_SECONDS:
+            break
+        number *= 2 if elapsed * 4 >= ROUND_SECONDS else 10
+
+    timings = []
+    for _ in range(rounds):
+        started = time.perf_counter()
+        for _ in range(number):
+            func()
+        timings.append((time.perf_counter() - started) / number * 1e6)
+    timings.sort()
+    return number, timings
+
+
+def run(names, rounds, fixture):
+    """{nom: resultat} dels casos ``names`` (en l'ordre del registre)"""
+    # L'índex de cerca, de les dades d'aquesta base de dades
+    search_index.build_from_db()
+    results = {}
+    try:
+        for name, setup in BENCHMARKS.items():
+            if name in names:
+                results[name] = measure(setup(fixture), rounds)
+    finally:
+        # Els canvis d'estat desfets també han passat per l'índex en memòria
+        search_index.build_from_db()
+    return results
+
+
+def metadata(fixture, rounds):
+    return {
+        'created_at': timezone.now().isoformat(),
+        'settings': settings.SETTINGS_MODULE,
+        'database': settings.DATABASES['default']['ENGINE'],
+        'python': platform.python_version(),
+        'django': django.get_version(),
+        'machine': platform.machine(),
+        'fixture': fixture.counts,
+        'rounds': rounds,
+    }
+
+
+def save(path, meta, results):
+    with open(path, 'w') as handle:
+        json.dump({'meta': meta, 'results': results}, handle, indent=2)
+
+
+def load(path):
+    with open(path) as handle:
+        return json.load(handle)
+
+
+def compare(results, baseline, threshold):
+    """
+    [(nom, resultat, referència, canvi del mínim en %, regressió)] de cada cas; referència
+    i canvi són None si el cas no és al fitxer de referència
+    """
+    rows = []
+    for name, result in results.items():
+        reference = baseline['results'].get(name)
+        if reference is None:
+            rows.append((name, result, None, None, False))
+            continue
+        change = (result['min_us'] - reference['min_us']) / reference['min_us'] * 100
+        slower = change > threshold * TOLERANCES.get(name, 1)
+        regressed = slower or result['queries'] > reference['queries']
+        rows.append((name, result, reference, change, regressed))
+    return rows
+
+
+def confirm(results, baseline, threshold, fixture, rounds, retries=RETRIES, write=None):
+    """
+    Com ``compare``, però abans torna a mesurar (fins a ``retries`` vegades) els casos que
+    només han sortit més lents i es queda amb la mesura més ràpida de cada un
+    """
+    rows = compare(results, baseline, threshold)
+    for _ in range(retries):
+        slower = [
+            name for name, result, reference, _, regressed in rows
+            if regressed and result['queries'] <= reference['queries']
+        ]
+        if not slower:
+            break
+        if write:
+            write(f"Es tornen a mesurar: {', '.join(slower)}")
+        for name, result in run(slower, rounds, fixture).items():
+            if result['min_us'] < results[name]['min_us']:
+                results[name] = result
+        rows = compare(results, baseline, threshold)
+    return rows
@@ -0,0 +1,34 @@
+"""
+Comprovacions de configuració comunes a les apps (``manage.py check``, que també fan
+``runserver`` i ``migrate``).
+
+Diverses parts guarden a ``CACHES['default']`` l'estat que han de veure tots els
+processos (ids de l'escriptura diferida, versions i generacions de les memòries cau).
+Una memòria cau local (LocMem) només la veu el seu procés: amb més d'un procés
+(``WEB_PROCESSES``) cal una de compartida (memcached, redis...).
+"""
+from django.conf import settings
+from django.core import checks
+
+LOCAL_CACHE_BACKENDS = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+def cache_is_shared(alias='default'):
+    """False si cada procés té la seva pròpia memòria cau ``alias``"""
+    return settings.CACHES[alias]['BACKEND'] not in LOCAL_CACHE_BACKENDS
+
+
+def shared_cache_error(feature, id, alias='default'):
+    """Llista amb un error si ``feature`` necessita compartir ``alias`` entre processos i no es pot"""
+    processes = getattr(settings, 'WEB_PROCESSES', 1)
+    if processes <= 1 or cache_is_shared(alias):
+        return []
+    return [checks.Error(
+        f"{feature} necessita que CACHES['{alias}'] sigui compartida entre processos "
+        f"i és {settings.CACHES[alias]['BACKEND']} amb WEB_PROCESSES = {processes}.",
+        hint="Fes servir memcached o redis, o WEB_PROCESSES = 1 si només hi ha un procés.",
+        id=id,
+    )]
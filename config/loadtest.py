@@ -0,0 +1,428 @@
+"""
+Generador de càrrega en procés per a la barreja de trànsit de StreamEvents (comanda
+``loadtest``).
+
+Cada usuari simulat és un generador (``visitor``) que decideix les peticions (``Request``)
+i les pauses (``Pause``) segons l'escenari: navegar pel llistat i els detalls, mirar un
+directe consultant el xat cada ``poll_interval`` segons (com chat_box.html) i enviar
+ràfegues de missatges. Els conductors l'executen contra l'aplicació sense servidor ni
+xarxa: ``run_wsgi`` amb un fil per usuari sobre ``config.wsgi.application`` i ``run_asgi``
+amb una tasca asyncio per usuari sobre ``config.asgi.application``.
+
+De cada petició es guarda la latència, l'estat i les consultes a la base de dades (la
+capçalera ``X-Query-Count`` de ``QueryBudgetMiddleware``, que cal activar amb
+``QUERY_BUDGET_HEADER``; les respostes en streaming no la porten), agrupades pel nom
+de la URL.
+"""
+import asyncio
+import io
+import json
+import math
+import random
+import re
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+from urllib.parse import unquote, urlencode
+
+from django.conf import settings
+from django.urls import reverse
+from django.utils.crypto import get_random_string
+
+DEFAULT_SCENARIO = {
+    'users': 20,  # Usuaris simultanis
+    'duration': 30,  # Segons de mesura
+    'ramp_up': 2,  # Segons en què arrenquen tots els usuaris
+    'authenticated': 0.5,  # Part dels usuaris amb sessió (només aquests envien missatges)
+    'mix': {'browse': 50, 'watch': 40, 'burst': 10},  # Pes de cada tipus de visita
+    'think_time': [1.0, 3.0],  # Pausa entre pàgines (mínim, màxim)
+    'poll_interval': 3.0,  # El xat es consulta cada 3 s
+    'watch_seconds': 30,  # Temps mirant un directe
+    'send_probability': 0.05,  # Probabilitat d'enviar un missatge a cada consulta del xat
+    'burst_messages': 10,  # Missatges d'una ràfega
+    'burst_interval': 0.2,  # Segons entre els missatges d'una ràfega
+}
+
+HOST = 'loadtest'
+
+
+class Request:
+    __slots__ = ('name', 'method', 'path', 'query', 'headers', 'body')
+
+    def __init__(self, name, path, query=None, method='GET', headers=None, data=None):
+        self.name = name
+        self.method = method
+        self.path = path
+        self.query = urlencode(query or {})
+        self.headers = dict(headers or {})
+        self.body = urlencode(data).encode() if data else b''
+        if data:
+            self.headers['Content-Type'] = 'application/x-www-form-urlencoded'
+
+
+class Pause:
+    __slots__ = ('seconds',)
+
+    def __init__(self, seconds):
+        self.seconds = seconds
+
+
+class Response:
+    __slots__ = ('status', 'headers', 'body')
+
+    def __init__(self, status, headers, body):
+        self.status = status
+        self.headers = headers
+        self.body = body
+
+    def json(self):
+        try:
+            return json.loads(self.body)
+        except ValueError:
+            return {}
+
+
+class Session:
+    """Galetes d'un usuari simulat: sessió (si n'hi ha) i CSRF"""
+
+    def __init__(self, session_key=None):
+        self.csrf = get_random_string(32)
+        self.cookies = {settings.CSRF_COOKIE_NAME: self.csrf}
+        if session_key:
+            self.cookies[settings.SESSION_COOKIE_NAME] = session_key
+        self.authenticated = bool(session_key)
+
+    def headers(self, request):
+        headers = {'Cookie': '; '.join(f'{name}={value}' for name, value in self.cookies.items())}
+        if request.method == 'POST':
+            headers['X-CSRFToken'] = self.csrf
+        headers.update(request.headers)
+        return headers
+
+
+class Targets:
+    """Esdeveniments on van els usuaris: els populars (Zipf) reben gran part de les visites"""
+
+    def __init__(self, event_pks, live_pks, exponent=1.1):
+        self.event_pks = list(event_pks)
+        self.live_pks = list(live_pks)
+        self._event_weights = _zipf(len(self.event_pks), exponent)
+        self._live_weights = _zipf(len(self.live_pks), exponent)
+
+    def event(self, rng):
+        return rng.choices(self.event_pks, cum_weights=self._event_weights)[0] if self.event_pks else None
+
+    def live(self, rng):
+        return rng.choices(self.live_pks, cum_weights=self._live_weights)[0] if self.live_pks else None
+
+
+def _zipf(count, exponent):
+    total, weights = 0.0, []
+    for rank in range(1, count + 1):
+        total += 1 / rank ** exponent
+        weights.append(total)
+    return weights
+
+
+# --- Comportament dels usuaris --------------------------------------------------------
+
+def visitor(scenario, targets, session, rng, deadline):
+    """Generador d'un usuari: produeix Request/Pause i rep la Response de cada Request"""
+    kinds = list(scenario['mix'])
+    weights = [scenario['mix'][kind] for kind in kinds]
+    while time.monotonic() < deadline:
+        kind = rng.choices(kinds, weights=weights)[0]
+        if kind == 'burst' and session.authenticated:
+            yield from _burst(scenario, targets, session, rng)
+        elif kind in ('watch', 'burst'):
+            yield from _watch(scenario, targets, session, rng, deadline)
+        else:
+            yield from _browse(scenario, targets, rng)
+
+
+def _think(scenario, rng):
+    low, high = scenario['think_time']
+    return Pause(rng.uniform(low, high))
+
+
+def _browse(scenario, targets, rng):
+    yield Request('home', reverse('home'))
+    yield _think(scenario, rng)
+    query = {}
+    roll = rng.random()
+    if roll < 0.3:
+        query['category'] = rng.choice(CATEGORIES)
+    elif roll < 0.4:
+        query['status'] = 'live'
+    response = yield Request('events:event_list', reverse('events:event_list'), query)
+    # A vegades, la pàgina següent (el cursor surt a l'enllaç de la paginació)
+    cursor = _next_cursor(response)
+    if cursor and rng.random() < 0.3:
+        yield _think(scenario, rng)
+        yield Request('events:event_list', reverse('events:event_list'), {**query, 'cursor': cursor})
+    pk = targets.event(rng)
+    if pk:
+        yield _think(scenario, rng)
+        yield Request('events:event_detail', reverse('events:event_detail', kwargs={'pk': pk}))
+    yield _think(scenario, rng)
+
+
+def _watch(scenario, targets, session, rng, deadline):
+    pk = targets.live(rng)
+    if pk is None:
+        yield from _browse(scenario, targets, rng)
+        return
+    yield Request('events:event_detail', reverse('events:event_detail', kwargs={'pk': pk}))
+    messages_url = reverse('chat_load_messages', kwargs={'event_pk': pk})
+    send_url = reverse('chat_send_message', kwargs={'event_pk': pk})
+    response = yield Request('chat_load_messages', messages_url)
+    last_id, synced_at, etag = _chat_state(response, 0, None, None)
+
+    until = min(time.monotonic() + scenario['watch_seconds'], deadline)
+    while time.monotonic() < until:
+        yield Pause(scenario['poll_interval'])
+        query = {'after': last_id}
+        if synced_at is not None:
+            query['deleted_since'] = synced_at
+        response = yield Request('chat_load_messages', messages_url, query,
+                                 headers={'If-None-Match': etag} if etag else None)
+        last_id, synced_at, etag = _chat_state(response, last_id, synced_at, etag)
+        if session.authenticated and rng.random() < scenario['send_probability']:
+            yield Request('chat_send_message', send_url, method='POST',
+                          data={'message': rng.choice(MESSAGES)})
+
+
+def _burst(scenario, targets, session, rng):
+    pk = targets.live(rng)
+    if pk is None:
+        return
+    send_url = reverse('chat_send_message', kwargs={'event_pk': pk})
+    for _ in range(scenario['burst_messages']):
+        yield Request('chat_send_message', send_url, method='POST', data={'message': rng.choice(MESSAGES)})
+        yield Pause(scenario['burst_interval'])
+    yield _think(scenario, rng)
+
+
+def _chat_state(response, last_id, synced_at, etag):
+    if response.status == 304:
+        return last_id, synced_at, etag
+    data = response.json()
+    ids = [message.get('id', 0) for message in data.get('messages', [])]
+    return (
+        max([last_id, *ids]),
+        data.get('synced_at', synced_at),
+        response.headers.get('etag', etag),
+    )
+
+
+def _next_cursor(response):
+    """Cursor de l'enllaç «Següent» de la paginació, si n'hi ha"""
+    match = NEXT_CURSOR.search(response.body) if response.status == 200 else None
+    return unquote(match.group(1).decode()) if match else None
+
+
+NEXT_CURSOR = re.compile('href="\\?cursor=([^"&]+)[^"]*">Següent'.encode())
+CATEGORIES = ['gaming', 'music', 'technology', 'education', 'art', 'talk', 'sports', 'entertainment']
+MESSAGES = ['Hola!', 'Quina passada', 'Es talla una mica', 'Genial!', 'Bravo!', 'Gràcies!', 'Brutal']
+
+
+# --- Resultats ------------------------------------------------------------------------
+
+class Recorder:
+    """Latència, estat i consultes de cada petició, per nom de URL (compartit entre fils)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.statuses = defaultdict(Counter)
+        self.queries = defaultdict(list)
+        self.started = self.finished = None
+
+    def add(self, name, seconds, response):
+        count = response.headers.get('x-query-count')
+        with self._lock:
+            self.latencies[name].append(seconds * 1000)
+            self.statuses[name][str(response.status)] += 1
+            if count is not None:
+                self.queries[name].append(int(count))
+
+    def report(self):
+        elapsed = self.finished - self.started
+        urls = {name: _summary(latencies, self.statuses[name], self.queries[name], elapsed)
+                for name, latencies in sorted(self.latencies.items())}
+        everything = [latency for latencies in self.latencies.values() for latency in latencies]
+        statuses = sum(self.statuses.values(), Counter())
+        queries = [count for counts in self.queries.values() for count in counts]
+        return {'elapsed': round(elapsed, 3), 'totals': _summary(everything, statuses, queries, elapsed),
+                'urls': urls}
+
+
+def _summary(latencies, statuses, queries, elapsed):
+    ordered = sorted(latencies)
+    return {
+        'requests': len(ordered),
+        'throughput': round(len(ordered) / elapsed, 2) if elapsed else 0.0,
+        'errors': sum(count for status, count in statuses.items() if int(status) >= 500),
+        'status': dict(sorted(statuses.items())),
+        'mean_ms': round(sum(ordered) / len(ordered), 3) if ordered else None,
+        'p50_ms': percentile(ordered, 50),
+        'p95_ms': percentile(ordered, 95),
+        'p99_ms': percentile(ordered, 99),
+        'max_ms': round(ordered[-1], 3) if ordered else None,
+        'queries_mean': round(sum(queries) / len(queries), 2) if queries else None,
+        'queries_max': max(queries) if queries else None,
+    }
+
+
+def percentile(ordered, rank):
+    """Percentil pel mètode del rang més proper sobre una llista ordenada"""
+    if not ordered:
+        return None
+    index = max(math.ceil(rank / 100 * len(ordered)) - 1, 0)
+    return round(ordered[index], 3)
+
+
+# --- Conductors -----------------------------------------------------------------------
+
+def _wsgi_environ(request, session):
+    environ = {
+        'REQUEST_METHOD': request.method,
+        'PATH_INFO': request.path,
+        'QUERY_STRING': request.query,
+        'SERVER_NAME': HOST,
+        'SERVER_PORT': '80',
+        'SERVER_PROTOCOL': 'HTTP/1.1',
+        'REMOTE_ADDR': '127.0.0.1',
+        'HTTP_HOST': HOST,
+        'CONTENT_LENGTH': str(len(request.body)),
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': 'http',
+        'wsgi.input': io.BytesIO(request.body),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': False,
+        'wsgi.run_once': False,
+    }
+    for name, value in session.headers(request).items():
+        key = name.upper().replace('-', '_')
+        environ[key if key == 'CONTENT_TYPE' else f'HTTP_{key}'] = value
+    return environ
+
+
+def wsgi_request(application, request, session):
+    captured = {}
+
+    def start_response(status, headers, exc_info=None):
+        captured['status'] = int(status.split(' ', 1)[0])
+        captured['headers'] = {name.lower(): value for name, value in headers}
+
+    result = application(_wsgi_environ(request, session), start_response)
+    try:
+        body = b''.join(result)
+    finally:
+        if hasattr(result, 'close'):
+            result.close()
+    return Response(captured['status'], captured['headers'], body)
+
+
+async def asgi_request(application, request, session):
+    scope = {
+        'type': 'http',
+        'asgi': {'version': '3.0'},
+        'http_version': '1.1',
+        'method': request.method,
+        'scheme': 'http',
+        'path': request.path,
+        'raw_path': request.path.encode(),
+        'query_string': request.query.encode(),
+        'root_path': '',
+        'headers': [(b'host', HOST.encode())] + [
+            (name.lower().encode(), value.encode()) for name, value in session.headers(request).items()
+        ],
+        'client': ('127.0.0.1', 0),
+        'server': (HOST, 80),
+    }
+    done = asyncio.Event()
+    pending = [{'type': 'http.request', 'body': request.body, 'more_body': False}]
+    captured = {'body': []}
+
+    async def receive():
+        if pending:
+            return pending.pop()
+        await done.wait()
+        return {'type': 'http.disconnect'}
+
+    async def send(message):
+        if message['type'] == 'http.response.start':
+            captured['status'] = message['status']
+            captured['headers'] = {name.decode().lower(): value.decode() for name, value in message['headers']}
+        elif message['type'] == 'http.response.body':
+            captured['body'].append(message.get('body', b''))
+            if not message.get('more_body'):
+                done.set()
+
+    await application(scope, receive, send)
+    done.set()
+    return Response(captured['status'], captured['headers'], b''.join(captured['body']))
+
+
+def run_wsgi(application, scenario, targets, sessions, seed, recorder):
+    """Un fil per usuari; torna quan acaba ``scenario['duration']``"""
+    recorder.started = time.monotonic()
+    deadline = recorder.started + scenario['ramp_up'] + scenario['duration']
+
+    def user(index):
+        rng = random.Random(f'{seed}:{index}')
+        time.sleep(scenario['ramp_up'] * index / max(len(sessions), 1))
+        steps = visitor(scenario, targets, sessions[index], rng, deadline)
+        response = None
+        try:
+            while True:
+                step = steps.send(response)
+                response = None
+                if isinstance(step, Pause):
+                    time.sleep(max(min(step.seconds, deadline - time.monotonic()), 0))
+                    continue
+                started = time.perf_counter()
+                response = wsgi_request(application, step, sessions[index])
+                recorder.add(step.name, time.perf_counter() - started, response)
+        except StopIteration:
+            pass
+
+    threads = [threading.Thread(target=user, args=(index,), daemon=True) for index in range(len(sessions))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    recorder.finished = time.monotonic()
+
+
+def run_asgi(application, scenario, targets, sessions, seed, recorder):
+    """Una tasca asyncio per usuari en un sol bucle d'esdeveniments"""
+
+    async def user(index, deadline):
+        rng = random.Random(f'{seed}:{index}')
+        await asyncio.sleep(scenario['ramp_up'] * index / max(len(sessions), 1))
+        steps = visitor(scenario, targets, sessions[index], rng, deadline)
+        response = None
+        try:
+            while True:
+                step = steps.send(response)
+                response = None
+                if isinstance(step, Pause):
+                    await asyncio.sleep(max(min(step.seconds, deadline - time.monotonic()), 0))
+                    continue
+                started = time.perf_counter()
+                response = await asgi_request(application, step, sessions[index])
+                recorder.add(step.name, time.perf_counter() - started, response)
+        except StopIteration:
+            pass
+
+    async def main():
+        recorder.started = time.monotonic()
+        deadline = recorder.started + scenario['ramp_up'] + scenario['duration']
+        await asyncio.gather(*(user(index, deadline) for index in range(len(sessions))))
+        recorder.finished = time.monotonic()
+
+    asyncio.run(main())
@@ -0,0 +1,204 @@
+"""
+Pressupost de consultes per vista i detecció de N+1.
+
+``QueryBudgetMiddleware`` registra, per a cada petició, quantes consultes fa la vista, el
+temps que hi passa (el que tarden djongo i pymongo a respondre cada ``execute``) i les
+consultes repetides amb la mateixa forma (empremta). Avisa al logger ``querybudget``
+quan una vista passa del pressupost que declara amb ``@query_budget(n)`` (o de
+``QUERY_BUDGET_DEFAULT``) o quan una mateixa consulta es repeteix
+``QUERY_BUDGET_REPEAT_THRESHOLD`` vegades o més, que sol ser un N+1.
+
+Funciona amb WSGI i amb ASGI: amb ASGI la cadena és asíncrona i les vistes asíncrones
+(el long-poll del xat) esperen al bucle sense ocupar cap fil.
+
+Les respostes en streaming (``StreamingHttpResponse``) fan les consultes mentre s'envia
+el cos, quan les capçaleres ja han sortit: es compten fins que s'acaba el cos i no porten
+``X-Query-Count`` ni ``X-Query-Time``.
+
+Per als tests::
+
+    with max_queries(3):
+        client.get(url)
+
+falla amb la llista de consultes si se'n fan més de 3.
+"""
+import logging
+import re
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+logger = logging.getLogger('querybudget')
+
+DEFAULT_BUDGET = getattr(settings, 'QUERY_BUDGET_DEFAULT', None)
+REPEAT_THRESHOLD = getattr(settings, 'QUERY_BUDGET_REPEAT_THRESHOLD', 5)
+RESPONSE_HEADER = getattr(settings, 'QUERY_BUDGET_HEADER', settings.DEBUG)
+
+NUMBERS = re.compile(r'\b\d+\b')
+STRINGS = re.compile(r"'(?:[^']|'')*'")
+PLACEHOLDER_LISTS = re.compile(r'\((?:%s|\?)(?:\s*,\s*(?:%s|\?))+\)')
+SPACES = re.compile(r'\s+')
+
+
+def fingerprint(sql):
+    """Forma de la consulta sense valors, per trobar les que es repeteixen"""
+    sql = STRINGS.sub('?', sql)
+    sql = NUMBERS.sub('?', sql)
+    sql = PLACEHOLDER_LISTS.sub('(...)', sql)
+    return SPACES.sub(' ', sql).strip()
+
+
+# Enregistradors actius del context actual; sync_to_async copia el context al fil on s'executa
+_recording = ContextVar('querybudget_recording', default=())
+
+
+def _dispatch(execute, sql, params, many, context):
+    """execute_wrapper fix de cada connexió: passa la consulta als enregistradors del context"""
+    recorders = _recording.get()
+    if not recorders:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        duration = time.perf_counter() - started
+        for recorder in recorders:
+            recorder.add(context['connection'].alias, sql, duration)
+
+
+def _install(connection):
+    if _dispatch not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_dispatch)
+
+
+def _on_connection_created(sender, connection, **kwargs):
+    # Les connexions són per fil: així també les tenen els fils de sync_to_async
+    _install(connection)
+
+
+connection_created.connect(_on_connection_created)
+
+
+class QueryRecorder:
+    """Guarda cada consulta (sql, segons) feta al context on s'enregistra"""
+
+    def __init__(self):
+        self.queries = []
+        self.aliases = None
+
+    def add(self, alias, sql, duration):
+        if self.aliases is None or alias in self.aliases:
+            self.queries.append((sql, duration))
+
+    @contextmanager
+    def record(self, using=None):
+        """Registra les consultes d'una connexió (o de totes) mentre dura el bloc, també les de sync_to_async"""
+        self.aliases = {using} if using else None
+        for alias in ([using] if using else connections):
+            _install(connections[alias])
+        _recording.set(_recording.get() + (self,))
+        try:
+            yield self
+        finally:
+            # Sense token: el bloc d'una resposta en streaming es pot tancar des d'un altre context
+            _recording.set(tuple(recorder for recorder in _recording.get() if recorder is not self))
+
+    def __len__(self):
+        return len(self.queries)
+
+    @property
+    def total_time(self):
+        return sum(duration for _, duration in self.queries)
+
+    def repeated(self, threshold=REPEAT_THRESHOLD):
+        """[(empremta, vegades)] de les consultes que es repeteixen ``threshold`` vegades o més"""
+        counts = Counter(fingerprint(sql) for sql, _ in self.queries)
+        return [(shape, count) for shape, count in counts.most_common() if count >= threshold]
+
+    def summary(self):
+        return f'{len(self)} consultes, {self.total_time * 1000:.1f} ms'
+
+
+def query_budget(limit):
+    """Decorador de vista: nombre màxim de consultes que hauria de fer"""
+    def decorator(view):
+        view.query_budget = limit
+        return view
+    return decorator
+
+
+class QueryBudgetMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        recorder = QueryRecorder()
+        with recorder.record():
+            response = self.get_response(request)
+        return self._finish(request, response, recorder)
+
+    async def __acall__(self, request):
+            # Les consultes de sync_to_async es fan en un altre fil però amb aquest context: es registren
+        recorder = QueryRecorder()
+        with recorder.record():
+            response = await self.get_response(request)
+        return self._finish(request, response, recorder)
+
+    def _finish(self, request, response, recorder):
+        if response.streaming:
+            response.streaming_content = self._record_stream(request, response.streaming_content, recorder)
+            return response
+
+        self._report(request, recorder)
+        if RESPONSE_HEADER:
+            response['X-Query-Count'] = str(len(recorder))
+            response['X-Query-Time'] = f'{recorder.total_time * 1000:.1f}'
+        return response
+
+    def _record_stream(self, request, content, recorder):
+        """El cos d'una resposta en streaming, continuant el recompte mentre es genera"""
+        try:
+            with recorder.record():
+                yield from content
+        finally:
+            self._report(request, recorder)
+
+    def _report(self, request, recorder):
+        budget = getattr(request, 'query_budget', DEFAULT_BUDGET)
+        view = getattr(request, 'query_budget_view', request.path)
+        if budget is not None and len(recorder) > budget:
+            logger.warning('%s: %s (pressupost %d)', view, recorder.summary(), budget)
+        for shape, count in recorder.repeated():
+            logger.warning('%s: consulta repetida %d vegades (possible N+1): %s', view, count, shape)
+        logger.debug('%s: %s', view, recorder.summary())
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        budget = getattr(view_func, 'query_budget', None)
+        if budget is not None:
+            request.query_budget = budget
+        request.query_budget_view = f'{view_func.__module__}.{view_func.__name__}'
+
+
+@contextmanager
+def max_queries(limit, using=None):
+    """Per als tests: falla si el bloc fa més de ``limit`` consultes"""
+    recorder = QueryRecorder()
+    with recorder.record(using):
+        yield recorder
+    if len(recorder) > limit:
+        listing = '\n'.join(f'  {index}. {sql}' for index, (sql, _) in enumerate(recorder.queries, 1))
+        raise AssertionError(f'{len(recorder)} consultes, el màxim és {limit}:\n{listing}')
@@ -0,0 +1,159 @@
+"""
+Eines compartides de les comandes de dades de prova (``seed_users``, ``seed_events``).
+
+El treball es reparteix en trossos de ``CHUNK_SIZE`` files. Cada tros té el seu propi
+generador aleatori (``chunk_random``): amb la mateixa llavor (i, a ``seed_events``, la
+mateixa ``--anchor``) surten les mateixes dades amb qualsevol nombre de processos. ``run_chunks`` executa els trossos en
+``workers`` processos i cada procés genera i insereix (``bulk_create``) els seus: el que
+costa és preparar les files a l'ORM, no l'escriptura. Les dades que necessiten tots
+els trossos (claus d'usuaris, pesos...) es passen una sola vegada a cada procés i es
+llegeixen amb ``context()``.
+"""
+import multiprocessing
+import os
+import random
+import time
+from collections import deque
+from contextlib import contextmanager
+from itertools import accumulate
+
+from django.db import connections, transaction
+
+# Files per tros (no depèn dels processos ni del lot, perquè les dades no canviïn)
+CHUNK_SIZE = 10000
+
+# Valors per consulta __in
+LOOKUP_SIZE = 500
+
+# Trossos en curs per procés: prou per no esperar, sense acumular resultats a memòria
+IN_FLIGHT_PER_WORKER = 2
+
+_context = None
+
+
+def context():
+    """Dades compartides de l'execució actual (les que s'han passat a ``run_chunks``)"""
+    return _context
+
+
+def _set_context(value):
+    global _context
+    _context = value
+
+
+def chunk_random(seed, label, index):
+    """Generador aleatori del tros ``index`` (el mateix a cada execució amb la mateixa llavor)"""
+    return random.Random(f'{seed}:{label}:{index}')
+
+
+def chunks(total, size=CHUNK_SIZE):
+    """[(índex, inici, final)] per recórrer ``total`` files"""
+    return [(index, start, min(start + size, total)) for index, start in enumerate(range(0, total, size))]
+
+
+def skewed_weights(count, exponent):
+    """
+    Pesos acumulats de Zipf (el primer pesa 1, el segon 1/2^s...) per a
+    ``random.choices(..., cum_weights=...)``: uns pocs elements s'emporten gran part
+    de les eleccions.
+    """
+    return list(accumulate(1 / (rank ** exponent) for rank in range(1, count + 1)))
+
+
+def bulk_insert(model, objects, batch_size):
+    """``bulk_create`` per lots, cadascun en una transacció; retorna quantes files"""
+    objects = list(objects)
+    for start in range(0, len(objects), batch_size):
+        with transaction.atomic(using=model.objects.db):
+            model.objects.bulk_create(objects[start:start + batch_size], batch_size=batch_size)
+    return len(objects)
+
+
+def lookup(model, field, values, column='pk'):
+    """{valor de ``field``: valor de ``column``} de les files amb ``field`` en ``values``"""
+    values = list(values)
+    found = {}
+    for start in range(0, len(values), LOOKUP_SIZE):
+        rows = model.objects.filter(**{f'{field}__in': values[start:start + LOOKUP_SIZE]})
+        found.update(rows.order_by().values_list(field, column))
+    return found
+
+
+@contextmanager
+def explicit_timestamps(model, *names):
+    """Desa les dates que porten els objectes en camps ``auto_now``/``auto_now_add``"""
+    fields = [model._meta.get_field(name) for name in names]
+    saved = [(field.auto_now, field.auto_now_add) for field in fields]
+    for field in fields:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, (auto_now, auto_now_add) in zip(fields, saved):
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+def run_chunks(func, tasks, shared=None, workers=1):
+    """
+    ``func(task)`` per a cada tros, en ``workers`` processos; retorna els resultats en
+    ordre a mesura que acaben. ``shared`` és el que retorna ``context()`` dins ``func``.
+    """
+    if workers <= 1:
+        _set_context(shared)
+        try:
+            for task in tasks:
+                yield func(task)
+        finally:
+            _set_context(None)
+        return
+
+    # Cada procés obre la seva connexió: no se n'ha d'heretar cap d'oberta
+    connections.close_all()
+    methods = multiprocessing.get_all_start_methods()
+    pool_context = multiprocessing.get_context('fork' if 'fork' in methods else None)
+    with pool_context.Pool(workers, initializer=_set_context, initargs=(shared,)) as pool:
+        pending = deque()
+        for task in tasks:
+            pending.append(pool.apply_async(func, (task,)))
+            if len(pending) >= workers * IN_FLIGHT_PER_WORKER:
+                yield pending.popleft().get()
+        while pending:
+            yield pending.popleft().get()
+
+
+def default_workers():
+    # SQLite només admet un escriptor alhora: més processos només s'esperarien entre ells
+    if connections['default'].vendor == 'sqlite':
+        return 1
+    return os.cpu_count() or 1
+
+
+class Throughput:
+    """Ritme d'inserció: informa cada ``every`` segons i en acabar"""
+
+    def __init__(self, label, write, total=None, every=5):
+        self.label = label
+        self.write = write
+        self.total = total
+        self.every = every
+        self.count = 0
+        self.started = self._reported = time.perf_counter()
+
+    @property
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+    @property
+    def rate(self):
+        return self.count / self.elapsed if self.elapsed else 0.0
+
+    def add(self, count):
+        self.count += count
+        now = time.perf_counter()
+        if now - self._reported >= self.every:
+            self._reported = now
+            progress = f'{self.count:,}/{self.total:,}' if self.total else f'{self.count:,}'
+            self.write(f'  {self.label}: {progress} ({self.rate:,.0f}/s)')
+
+    def summary(self):
+        return f'{self.count:,} {self.label} en {self.elapsed:.1f} s ({self.rate:,.0f}/s)'
@@ -21,6 +21,7 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'config.querybudget.QueryBudgetMiddleware',  # Consultes per vista i avisos de N+1
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -86,6 +87,88 @@ LOGOUT_REDIRECT_URL = 'login'  # MOD: Destí després de tancar sessió
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+# Processos que serveixen peticions (workers de gunicorn/uvicorn). Amb més d'un,
+# CACHES['default'] ha de ser compartida: ho comprova manage.py check (config/checks.py)
+# LocMem només serveix per a un sol procés: les generacions i versions que invaliden les
+# pàgines, les facetes, els calendaris i els buffers del xat es queden al procés que desa
+WEB_PROCESSES = int(os.environ.get('WEB_PROCESSES', 1))
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    # Targetes d'esdeveniment renderitzades (events/cards.py); descarta les menys usades
+    'event_cards': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'event-cards',
+        'OPTIONS': {'MAX_ENTRIES': 5000},
+    },
+}
+
+# Xat: memòria cau dels missatges recents (chat/cache.py)
+CHAT_BUFFER_SIZE = 200  # Missatges guardats per esdeveniment
+CHAT_BUFFER_MAX_EVENTS = 500  # Esdeveniments en memòria (LRU)
+CHAT_BUFFER_REFRESH_SECONDS = 60  # Relectura de seguretat; els canvis arriben abans per la versió a CACHES['default']
+
+# Xat: escriptura diferida per lots en moments de molta activitat (chat/writebehind.py)
+CHAT_WRITE_BEHIND = False  # Amb WEB_PROCESSES > 1 necessita una memòria cau compartida
+CHAT_WRITE_BEHIND_BATCH_SIZE = 100  # Missatges per bulk_create
+CHAT_WRITE_BEHIND_FLUSH_INTERVAL = 0.5  # Segons màxims que un missatge espera el seu lot
+
+# Xat: filtre de llenguatge ofensiu (chat/moderation.py)
+CHAT_BAD_WORDS_FILE = BASE_DIR / 'chat' / 'bad_words.txt'  # Una paraula o expressió per línia
+CHAT_BAD_WORDS_RELOAD_SECONDS = 5  # Cada quant es mira si el fitxer ha canviat
+
+# Xat: límit d'escriptures per usuari i per esdeveniment (chat/ratelimit.py)
+CHAT_RATE_LIMIT = True
+CHAT_RATE_LIMIT_USER_BURST = 5  # Missatges seguits que pot enviar un usuari
+CHAT_RATE_LIMIT_USER_RATE = 1  # Missatges per segon a la llarga
+CHAT_RATE_LIMIT_EVENT_BURST = 200
+CHAT_RATE_LIMIT_EVENT_RATE = 50
+CHAT_RATE_LIMIT_STORE = 'chat.ratelimit.LocalStore'  # 'chat.ratelimit.CacheStore' per compartir-lo entre processos
+CHAT_RATE_LIMIT_CACHE = 'default'  # Memòria cau de CacheStore
+
+# Xat: arxiu dels xats dels esdeveniments finalitzats (chat/archive.py, comanda archive_chat)
+CHAT_ARCHIVE_BLOCK_SIZE = 200  # Missatges per bloc comprimit
+CHAT_ARCHIVE_CHECK_SECONDS = 30  # Cada quant es comprova si un xat s'ha arxivat
+
+# Esdeveniments: índex de cerca en memòria (events/search.py, comanda rebuild_search_index)
+EVENT_SEARCH_INDEX_FILE = BASE_DIR / 'events_search.idx'  # Instantània que carreguen els processos
+EVENT_SEARCH_REFRESH_SECONDS = 5  # Cada quant es porten els canvis d'altres processos
+EVENT_SEARCH_TOMBSTONE_DAYS = 7  # Dies que es guarden els esborrats (DeletedEvent) per als altres processos
+
+# Esdeveniments: etiquetes normalitzades i núvol d'etiquetes (events/tags.py, comanda rebuild_tags)
+EVENT_TAG_CLOUD_SIZE = 20  # Etiquetes que es mostren al llistat
+EVENT_TAG_CLOUD_SECONDS = 300  # Temps màxim a la memòria cau (es buida quan canvien les etiquetes)
+
+# Esdeveniments: paginació per clau dels llistats (events/pagination.py)
+EVENT_COUNT_CACHE_SECONDS = 60  # Els totals que es mostren poden anar endarrerits fins a aquest temps
+
+# Esdeveniments: recomptes per categoria i estat del llistat (events/facets.py)
+EVENT_FACET_CACHE_SECONDS = 300  # Es deixen de fer servir abans si es desa o s'esborra un esdeveniment (a qualsevol procés si CACHES['default'] és compartida)
+
+# Esdeveniments: targetes renderitzades a la memòria cau (events/cards.py)
+EVENT_CARD_CACHE = 'event_cards'  # Àlies de CACHES
+EVENT_CARD_CACHE_SECONDS = 3600  # Temps màxim que es mostren dades velles del creador
+
+# Esdeveniments: pàgines senceres per als visitants anònims (events/pagecache.py)
+EVENT_PAGE_CACHE_SECONDS = 300  # Es descarten totes abans si canvia qualsevol esdeveniment (a qualsevol procés si CACHES['default'] és compartida)
+EVENT_PAGE_CACHE_LOCK_SECONDS = 10  # Temps màxim que un procés es reserva generar una pàgina
+EVENT_PAGE_CACHE_LOCK_WAIT = 2  # Segons que els altres l'esperen abans de generar-la ells
+
+# Esdeveniments: calendari per dies o hores i "en directe o començant aviat" (events/calendar.py)
+EVENT_CALENDAR_CACHE_SECONDS = 60  # Per finestra; es descarten abans si canvia un esdeveniment
+EVENT_UPCOMING_HOURS = 2  # Hores endavant del bloc "Ara i properament" de la pàgina d'inici
+
+# Esdeveniments: canvis d'estat automàtics (events/scheduler.py, comanda update_event_statuses --daemon)
+# La comanda és un altre procés: demana una CACHES['default'] compartida (o --allow-local-cache)
+EVENT_STATUS_POLL_SECONDS = 1  # Retard màxim a veure un esdeveniment creat o reprogramat
+EVENT_STATUS_HORIZON_MINUTES = 60  # Minuts endavant de les hores de canvi que es tenen al heap
+
+# Consultes per petició (config/querybudget.py)
+QUERY_BUDGET_DEFAULT = 30  # Per a les vistes sense @query_budget (None per no avisar)
+QUERY_BUDGET_REPEAT_THRESHOLD = 5  # Repeticions d'una mateixa consulta que es consideren N+1
+
 from django.contrib.messages import constants as messages  # MOD: Per personalitzar etiquetes missatges
 MESSAGE_TAGS = {  # MOD: Adaptació a classes Bootstrap
     messages.DEBUG: 'debug',
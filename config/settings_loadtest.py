@@ -0,0 +1,50 @@
+"""
+Configuració per a les proves de càrrega en una sola màquina (comanda ``loadtest``).
+
+SQLite local en lloc de MongoDB, sense DEBUG (guardaria totes les consultes a memòria) i
+amb la capçalera ``X-Query-Count`` per comptar les consultes de cada petició::
+
+    export DJANGO_SETTINGS_MODULE=config.settings_loadtest
+    python manage.py migrate
+    python manage.py seed_users --users 2000 --follows 20
+    python manage.py seed_events --events 20000 --messages 200000
+    python manage.py loadtest --users 50 --duration 60 --output loadtest.json
+
+Els micro-benchmarks (comanda ``benchmark``) també hi funcionen, amb una base de dades
+apart que creen ells mateixos::
+
+    LOADTEST_DATABASE=benchmark.sqlite3 python manage.py benchmark --save
+    LOADTEST_DATABASE=benchmark.sqlite3 python manage.py benchmark
+"""
+import os
+
+from .settings import *  # noqa: F401,F403
+from .settings import BASE_DIR
+
+DEBUG = False
+ALLOWED_HOSTS = ['*']
+
+DATABASES = {
+    'default': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.environ.get('LOADTEST_DATABASE', BASE_DIR / 'loadtest.sqlite3'),
+        'OPTIONS': {'timeout': 30},  # Molts fils escrivint a la vegada
+    }
+}
+
+EVENT_SEARCH_INDEX_FILE = BASE_DIR / 'loadtest_search.idx'
+
+# Base de dades de proves: els benchmarks hi poden crear dades (config/benchmarks.py)
+DISPOSABLE_DATABASE = True
+
+QUERY_BUDGET_HEADER = True
+
+# Els avisos de pressupost i els 4xx (límits del xat) s'expliquen als resultats
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'loggers': {
+        'querybudget': {'level': 'ERROR'},
+        'django.request': {'level': 'ERROR'},
+    },
+}
@@ -0,0 +1,21 @@
+"""
+Configuració per als tests::
+
+    python manage.py test --settings=config.settings_test
+
+SQLite en lloc de MongoDB (el test runner en crea una de buida en memòria) i un hash
+de contrasenyes ràpid. La resta és la de producció.
+"""
+from .settings import *  # noqa: F401,F403
+
+DATABASES = {
+    'default': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': ':memory:',
+    }
+}
+
+PASSWORD_HASHERS = ['django.contrib.auth.hashers.MD5PasswordHasher']
+
+# L'índex de cerca es construeix de la base de dades de cada test
+EVENT_SEARCH_INDEX_FILE = None
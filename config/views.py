@@ -1,8 +1,15 @@
+from django.conf import settings
 from django.shortcuts import render
 
+from events.calendar import live_or_starting
+from events.cards import attach_cards
+
+
 def home_view(request):
     """
     Vista principal (pàgina inicial del projecte).
-    Mostra un missatge de benvinguda i opcions segons si l'usuari està autenticat.
+    Mostra un missatge de benvinguda i opcions segons si l'usuari està autenticat,
+    i els esdeveniments en directe o que comencen aviat.
     """
-    return render(request, 'home.html')
+    upcoming = attach_cards(live_or_starting(getattr(settings, 'EVENT_UPCOMING_HOURS', 2), limit=4))
+    return render(request, 'home.html', {'upcoming_events': upcoming})
@@ -1,23 +1,30 @@
 from django.contrib import admin
-from .models import Event
+from .models import Event, Tag
 
 @admin.register(Event)
 class EventAdmin(admin.ModelAdmin):
     list_display = ['title', 'creator', 'category', 'status', 'scheduled_date', 'is_featured', 'created_at']
-    list_filter = ['category', 'status', 'is_featured', 'created_at']
+    list_filter = ['category', 'status', 'is_featured', 'stream_provider', 'created_at']
     search_fields = ['title', 'description', 'tags']
-    readonly_fields = ['created_at', 'updated_at']
+    readonly_fields = ['created_at', 'updated_at', 'ends_at', 'stream_provider', 'stream_embed_url']
     fieldsets = (
         ('Informació Bàsica', {
             'fields': ('title', 'description', 'creator', 'category')
         }),
         ('Programació', {
-            'fields': ('scheduled_date', 'status', 'max_viewers')
+            'fields': ('scheduled_date', 'duration', 'ends_at', 'status', 'max_viewers')
         }),
         ('Multimèdia', {
-            'fields': ('thumbnail', 'stream_url')
+            'fields': ('thumbnail', 'stream_url', 'stream_provider', 'stream_embed_url')
         }),
         ('Metadades', {
             'fields': ('tags', 'is_featured', 'created_at', 'updated_at')
         }),
-    )
\ No newline at end of file
+    )
+
+
+@admin.register(Tag)
+class TagAdmin(admin.ModelAdmin):
+    list_display = ['label', 'name', 'event_count']
+    search_fields = ['name']
+    readonly_fields = ['event_count']
@@ -0,0 +1,140 @@
+"""
+API JSON de només lectura per exportar esdeveniments (integracions amb partners).
+
+``GET /events/api/events/?fields=title,status,scheduled_date``
+
+- ``fields``: camps que es volen (per defecte ``DEFAULT_FIELDS``); només es demanen
+  aquestes columnes a la base de dades.
+- ``category``, ``status``, ``updated_since`` (ISO 8601): filtres.
+- ``after``: retorna els esdeveniments amb pk més gran (per reprendre una exportació).
+- ``limit``: màxim d'esdeveniments (sense límit per defecte).
+- ``format=ndjson``: un objecte JSON per línia en lloc d'un sol document.
+
+La resposta es genera mentre es llegeix el cursor (``iterator()``) i s'envia per trossos
+amb ``StreamingHttpResponse``: la memòria no depèn de quants esdeveniments s'exporten.
+"""
+import json
+from itertools import islice
+
+from django.conf import settings
+from django.http import JsonResponse, StreamingHttpResponse
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from django.views.decorators.http import require_GET
+
+from .models import Event
+
+CHUNK_SIZE = getattr(settings, 'EVENT_API_CHUNK_SIZE', 2000)
+
+# Nom a l'API → columna (values_list) i conversió a JSON
+FIELDS = {
+    'id': ('pk', None),
+    'title': ('title', None),
+    'description': ('description', None),
+    'category': ('category', None),
+    'status': ('status', None),
+    'scheduled_date': ('scheduled_date', 'datetime'),
+    'duration': ('duration', None),
+    'ends_at': ('ends_at', 'datetime'),
+    'creator_id': ('creator_id', None),
+    'creator': ('creator__username', None),
+    'tags': ('tags', 'tags'),
+    'max_viewers': ('max_viewers', None),
+    'is_featured': ('is_featured', None),
+    'stream_url': ('stream_url', None),
+    'stream_provider': ('stream_provider', None),
+    'stream_embed_url': ('stream_embed_url', None),
+    'thumbnail': ('thumbnail', 'file'),
+    'created_at': ('created_at', 'datetime'),
+    'updated_at': ('updated_at', 'datetime'),
+}
+DEFAULT_FIELDS = ('id', 'title', 'category', 'status', 'scheduled_date')
+
+
+def _datetime(value):
+    return value.isoformat() if value else None
+
+
+def _tags(value):
+    return [tag.strip() for tag in value.split(',') if tag.strip()] if value else []
+
+
+def _file(value):
+    return settings.MEDIA_URL + value if value else None
+
+
+CONVERTERS = {'datetime': _datetime, 'tags': _tags, 'file': _file}
+
+
+def parse_fields(value):
+    """Camps demanats, en ordre i sense repetits; ValueError si n'hi ha cap de desconegut"""
+    if not value:
+        return list(DEFAULT_FIELDS)
+    fields = list(dict.fromkeys(name.strip() for name in value.split(',') if name.strip()))
+    unknown = [name for name in fields if name not in FIELDS]
+    if unknown:
+        raise ValueError(f"Camps desconeguts: {', '.join(unknown)}")
+    return fields
+
+
+def _rows(queryset, fields):
+    """Diccionaris de l'API, llegint el cursor per trossos"""
+    columns = [FIELDS[name][0] for name in fields]
+    converters = [CONVERTERS.get(FIELDS[name][1]) for name in fields]
+    plain = not any(converters)
+    for values in queryset.values_list(*columns).iterator(chunk_size=CHUNK_SIZE):
+        if not plain:
+            values = [convert(value) if convert else value for convert, value in zip(converters, values)]
+        yield dict(zip(fields, values))
+
+
+def _stream(rows, ndjson):
+    """Text JSON per trossos de ``CHUNK_SIZE`` esdeveniments"""
+    encode = json.JSONEncoder(ensure_ascii=False, separators=(',', ':')).encode
+    count = 0
+    if not ndjson:
+        yield '{"results":['
+    for batch in iter(lambda: list(islice(rows, CHUNK_SIZE)), []):
+        if ndjson:
+            yield '\n'.join(map(encode, batch)) + '\n'
+        else:
+            # Tot el tros d'una vegada, sense els claudàtors de la llista
+            yield (',' if count else '') + encode(batch)[1:-1]
+        count += len(batch)
+    if not ndjson:
+        yield f'],"count":{count}}}'
+
+
+@require_GET
+def event_export_api(request):
+    try:
+        fields = parse_fields(request.GET.get('fields'))
+        after = int(request.GET.get('after') or 0)
+        limit = int(request.GET.get('limit') or 0)
+        updated_since = request.GET.get('updated_since')
+        if updated_since:
+            updated_since = parse_datetime(updated_since.replace(' ', '+'))
+            if updated_since is None:
+                raise ValueError('updated_since ha de ser una data ISO 8601')
+            if timezone.is_naive(updated_since):
+                updated_since = timezone.make_aware(updated_since)
+    except ValueError as error:
+        return JsonResponse({'error': str(error)}, status=400)
+
+    events = Event.objects.filter(pk__gt=after).order_by('pk')
+    for name in ('category', 'status'):
+        value = request.GET.get(name)
+        if value:
+            events = events.filter(**{name: value})
+    if updated_since:
+        events = events.filter(updated_at__gte=updated_since)
+    if limit > 0:
+        events = events[:limit]
+
+    ndjson = request.GET.get('format') == 'ndjson'
+    response = StreamingHttpResponse(
+        _stream(_rows(events, fields), ndjson),
+        content_type='application/x-ndjson' if ndjson else 'application/json',
+    )
+    response['X-Fields'] = ','.join(fields)
+    return response
@@ -3,4 +3,7 @@ from django.apps import AppConfig
 class EventsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'events'
-    verbose_name = 'Esdeveniments'
\ No newline at end of file
+    verbose_name = 'Esdeveniments'
+
+    def ready(self):
+        from . import checks, signals  # noqa: F401
\ No newline at end of file
@@ -0,0 +1,140 @@
+"""
+Consultes per dates: el calendari d'esdeveniments per dies o per hores i "en directe o
+començant aviat".
+
+Totes filtren per ``status`` i un rang de ``scheduled_date``, que és l'índex
+``event_status_schedule_idx``: mai es recorre la col·lecció sencera.
+
+Els calendaris es guarden a la memòria cau per finestra (alineada al dia o a l'hora,
+perquè les peticions de la mateixa finestra comparteixin la clau) durant
+``EVENT_CALENDAR_CACHE_SECONDS``, o fins que es desa o s'esborra un esdeveniment.
+"""
+from datetime import datetime, time, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.core.cache import cache
+from django.urls import reverse
+from django.utils import timezone
+
+from .models import Event
+
+CACHE_SECONDS = getattr(settings, 'EVENT_CALENDAR_CACHE_SECONDS', 60)
+
+VERSION_CACHE_KEY = 'events:calendar:version'
+
+BUCKETS = {'day': timedelta(days=1), 'hour': timedelta(hours=1)}
+MAX_BUCKETS = {'day': 62, 'hour': 72}
+DEFAULT_WINDOW = {'day': timedelta(days=7), 'hour': timedelta(hours=24)}
+
+# Els esborranys i els cancel·lats no surten al calendari
+CALENDAR_STATUSES = ('scheduled', 'live', 'finished')
+
+
+def invalidate_calendar():
+    try:
+        cache.incr(VERSION_CACHE_KEY)
+    except ValueError:
+        cache.add(VERSION_CACHE_KEY, 1, None)
+
+
+def floor_to_bucket(moment, bucket):
+    """Inici (hora local) del dia o de l'hora que conté ``moment``"""
+    moment = timezone.localtime(moment)
+    if bucket == 'day':
+        return timezone.make_aware(datetime.combine(moment.date(), time.min))
+    return moment.replace(minute=0, second=0, microsecond=0)
+
+
+def next_bucket(slot, bucket):
+    """Inici de l'interval següent (amb els canvis d'hora, un dia no sempre fa 24 hores)"""
+    if bucket == 'day':
+        return timezone.make_aware(datetime.combine(slot.date() + timedelta(days=1), time.min))
+    return timezone.localtime(slot.astimezone(dt_timezone.utc) + BUCKETS[bucket])
+
+
+def calendar_window(start=None, end=None, bucket='day'):
+    """
+    Finestra (inici, final) alineada als intervals, amb un màxim de ``MAX_BUCKETS`` intervals.
+    Sense inici, comença ara; sense final, dura ``DEFAULT_WINDOW``.
+    """
+    start = floor_to_bucket(start or timezone.now(), bucket)
+    end = end or start + DEFAULT_WINDOW[bucket]
+    aligned = floor_to_bucket(end, bucket)
+    end = aligned if aligned == end else next_bucket(aligned, bucket)
+    limit = start
+    for _ in range(MAX_BUCKETS[bucket]):
+        limit = next_bucket(limit, bucket)
+    if end <= start or end > limit:
+        end = next_bucket(start, bucket) if end <= start else limit
+    return start, end
+
+
+def calendar(start, end, bucket='day', category=None):
+    """
+    Esdeveniments de la finestra agrupats per dia o per hora:
+    [{'start', 'count', 'events': [...]}] amb tots els intervals, també els buits.
+    """
+    version = cache.get(VERSION_CACHE_KEY, 0)
+    key = f'events:calendar:{version}:{bucket}:{start.isoformat()}:{end.isoformat()}:{category or ""}'
+    buckets = cache.get(key)
+    if buckets is not None:
+        return buckets
+
+    events = Event.objects.filter(
+        status__in=CALENDAR_STATUSES, scheduled_date__gte=start, scheduled_date__lt=end,
+    )
+    if category:
+        events = events.filter(category=category)
+    rows = events.order_by('scheduled_date', 'pk').values_list(
+        'pk', 'title', 'status', 'category', 'scheduled_date',
+    )
+
+    starts = []
+    slot = start
+    while slot < end:
+        starts.append(slot)
+        slot = next_bucket(slot, bucket)
+    buckets = [{'start': slot.isoformat(), 'count': 0, 'events': []} for slot in starts]
+
+    position = 0
+    for pk, title, status, event_category, scheduled_date in rows:
+        # Les files arriben ordenades: només cal avançar l'interval
+        while position + 1 < len(starts) and scheduled_date >= starts[position + 1]:
+            position += 1
+        entry = buckets[position]
+        entry['count'] += 1
+        entry['events'].append({
+            'id': pk,
+            'title': title,
+            'status': status,
+            'category': event_category,
+            'scheduled_date': scheduled_date.isoformat(),
+            'url': reverse('events:event_detail', kwargs={'pk': pk}),
+        })
+
+    cache.set(key, buckets, CACHE_SECONDS)
+    return buckets
+
+
+def live_or_starting(hours=2, limit=None):
+    """
+    Esdeveniments en directe (que encara no s'han acabat) i els programats que comencen en
+    les pròximes ``hours`` hores: consultes per rang sobre (status, ends_at) i
+    (status, scheduled_date).
+    """
+    now = timezone.now()
+    live = (
+        Event.objects.filter(status='live', ends_at__gt=now)
+        .select_related('creator')
+        .order_by('ends_at', 'pk')  # Els que acaben abans primer, en ordre de l'índex
+    )
+    upcoming = (
+        Event.objects.filter(status='scheduled', scheduled_date__gte=now,
+                             scheduled_date__lt=now + timedelta(hours=hours))
+        .select_related('creator')
+        .order_by('scheduled_date', 'pk')
+    )
+    if limit:
+        live, upcoming = live[:limit], upcoming[:limit]
+    events = list(live) + list(upcoming)
+    return events[:limit] if limit else events
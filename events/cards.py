@@ -0,0 +1,84 @@
+"""
+Memòria cau de les targetes d'esdeveniment renderitzades (events/includes/event_card.html).
+
+Cada targeta es guarda a la memòria cau ``EVENT_CARD_CACHE`` (LocMem amb ``MAX_ENTRIES``,
+que descarta les menys usades) amb la clau (pk, ``updated_at``, idioma, destacada). Desar
+l'esdeveniment canvia ``updated_at`` i per tant la clau, així una targeta guardada mai
+és vella respecte de l'esdeveniment; les dades del creador poden tardar fins a
+``EVENT_CARD_CACHE_SECONDS`` a refrescar-se.
+
+Les vistes demanen totes les targetes d'una pàgina amb un sol ``get_many`` i només
+renderitzen les que falten (``attach_cards``).
+"""
+import threading
+
+from django.conf import settings
+from django.core.cache import caches
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+from django.utils.translation import get_language
+
+CACHE_ALIAS = getattr(settings, 'EVENT_CARD_CACHE', 'event_cards')
+CACHE_SECONDS = getattr(settings, 'EVENT_CARD_CACHE_SECONDS', 3600)
+
+TEMPLATE = 'events/includes/event_card.html'
+
+
+def card_key(event, featured=False):
+    return f'card:{event.pk}:{event.updated_at.timestamp():.6f}:{get_language()}:{int(featured)}'
+
+
+class CardCache:
+    """Targetes renderitzades, amb recompte d'encerts i fallades del procés"""
+
+    def __init__(self, alias=CACHE_ALIAS, timeout=CACHE_SECONDS):
+        self.alias = alias
+        self.timeout = timeout
+        self.stats = {'hits': 0, 'misses': 0}
+        self._lock = threading.Lock()
+
+    @property
+    def cache(self):
+        return caches[self.alias]
+
+    @property
+    def hit_rate(self):
+        total = self.stats['hits'] + self.stats['misses']
+        return self.stats['hits'] / total if total else 0.0
+
+    def render_many(self, events, featured=False):
+        """{pk: html} de les targetes dels esdeveniments (un get_many i un set_many)"""
+        keys = {event.pk: card_key(event, featured) for event in events}
+        if not keys:
+            return {}
+        cached = self.cache.get_many(list(keys.values()))
+
+        cards = {}
+        missing = {}
+        for event in events:
+            html = cached.get(keys[event.pk])
+            if html is None:
+                # Sense request: la targeta no pot dependre de l'usuari que la veu
+                html = render_to_string(TEMPLATE, {'event': event, 'featured': featured})
+                missing[keys[event.pk]] = html
+            cards[event.pk] = mark_safe(html)
+
+        if missing:
+            self.cache.set_many(missing, self.timeout)
+        with self._lock:
+            self.stats['hits'] += len(cards) - len(missing)
+            self.stats['misses'] += len(missing)
+        return cards
+
+
+# Instància única del procés
+card_cache = CardCache()
+
+
+def attach_cards(events, featured=False):
+    """Posa ``event.card_html`` a cada esdeveniment (les plantilles el fan servir si hi és)"""
+    events = list(events)
+    cards = card_cache.render_many(events, featured)
+    for event in events:
+        event.card_html = cards[event.pk]
+    return events
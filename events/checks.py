@@ -0,0 +1,12 @@
+from django.core import checks
+
+from config.checks import shared_cache_error
+
+
+@checks.register()
+def check_invalidation_cache(app_configs, **kwargs):
+    """Les generacions de pàgines, facetes i calendaris s'incrementen a la memòria cau per defecte"""
+    return shared_cache_error(
+        'La invalidació de pàgines, facetes i calendaris (events.pagecache, events.facets, events.calendar)',
+        'events.E001',
+    )
@@ -0,0 +1,90 @@
+"""
+Recomptes per categoria i per estat (facetes) dels llistats d'esdeveniments.
+
+Una sola agregació agrupada per (categoria, estat) dona els recomptes de les dues facetes:
+la de categories es calcula amb l'estat triat i la d'estats amb la categoria triada, de
+manera que cada opció mostra quants esdeveniments hi hauria si s'hi canviés.
+
+Les parelles es guarden a la memòria cau amb una clau que depèn dels altres filtres
+(cerca, etiqueta...) i d'una versió que s'incrementa cada vegada que es desa o s'esborra
+un esdeveniment (events.signals), així cap canvi deixa recomptes vells més enllà del que
+tarda a arribar la nova versió. La versió és a la memòria cau per defecte: amb més d'un
+procés ha de ser compartida, o els altres no veuen els canvis fins que caduquen els
+recomptes (``manage.py check`` ho comprova, events/checks.py).
+"""
+import hashlib
+import json
+from collections import Counter
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count
+
+from .models import Event
+from .search import SearchResults, search_index
+
+FACET_CACHE_SECONDS = getattr(settings, 'EVENT_FACET_CACHE_SECONDS', 300)
+
+VERSION_CACHE_KEY = 'events:facets:version'
+
+
+def _version():
+    version = cache.get(VERSION_CACHE_KEY)
+    if version is None:
+        cache.add(VERSION_CACHE_KEY, 1, None)
+        version = cache.get(VERSION_CACHE_KEY, 1)
+    return version
+
+
+def invalidate_facets():
+    """Deixa sense validesa tots els recomptes guardats"""
+    try:
+        cache.incr(VERSION_CACHE_KEY)
+    except ValueError:
+        cache.add(VERSION_CACHE_KEY, 1, None)
+
+
+def facet_pairs(source, key):
+    """
+    Recompte per (categoria, estat) d'un queryset d'Event o d'uns SearchResults, guardat a
+    la memòria cau sota ``key`` (diccionari amb els filtres que defineixen ``source``).
+    """
+    digest = hashlib.md5(json.dumps(key, sort_keys=True, default=str).encode()).hexdigest()
+    cache_key = f'events:facets:{_version()}:{digest}'
+    pairs = cache.get(cache_key)
+    if pairs is None:
+        if isinstance(source, SearchResults):
+            counts = search_index.facet_pairs(source.pks())
+        else:
+            counts = {
+                (category, status): count
+                for category, status, count in source.order_by()
+                .values_list('category', 'status').annotate(count=Count('pk'))
+            }
+        pairs = sorted(counts.items())
+        cache.set(cache_key, pairs, FACET_CACHE_SECONDS)
+    return pairs
+
+
+class Facets:
+    """Recomptes per a la barra de filtres, a partir de les parelles de ``facet_pairs``"""
+
+    def __init__(self, pairs, category=None, status=None):
+        self.selected_category = category or ''
+        self.selected_status = status or ''
+        categories = Counter()
+        statuses = Counter()
+        self.total = 0
+        for (pair_category, pair_status), count in pairs:
+            if not status or pair_status == status:
+                categories[pair_category] += count
+            if not category or pair_category == category:
+                statuses[pair_status] += count
+                if not status or pair_status == status:
+                    self.total += count
+        self.categories = [(value, label, categories[value]) for value, label in Event.CATEGORY_CHOICES]
+        self.statuses = [(value, label, statuses[value]) for value, label in Event.STATUS_CHOICES]
+        self.status_counts = statuses
+
+    def __bool__(self):
+        return any(count for _, _, count in self.categories)
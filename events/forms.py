@@ -26,7 +26,7 @@ class EventCreationForm(forms.ModelForm):
 
     class Meta:
         model = Event
-        fields = ['title', 'description', 'category', 'scheduled_date',
+        fields = ['title', 'description', 'category', 'scheduled_date', 'duration',
                   'thumbnail', 'max_viewers', 'tags', 'stream_url']
         widgets = {
             'title': forms.TextInput(attrs={'class': 'form-control', 'placeholder': 'Títol de l\'esdeveniment'}),
@@ -34,6 +34,7 @@ class EventCreationForm(forms.ModelForm):
                 attrs={'class': 'form-control', 'rows': 4, 'placeholder': 'Descripció detallada...'}),
             'category': forms.Select(attrs={'class': 'form-control'}),
             'thumbnail': forms.FileInput(attrs={'class': 'form-control'}),
+            'duration': forms.NumberInput(attrs={'class': 'form-control', 'min': 1, 'max': Event.MAX_DURATION}),
             'max_viewers': forms.NumberInput(attrs={'class': 'form-control', 'min': 1, 'max': 1000}),
             'tags': forms.TextInput(
                 attrs={'class': 'form-control', 'placeholder': 'etiqueta1, etiqueta2, etiqueta3...'}),
@@ -44,6 +45,7 @@ class EventCreationForm(forms.ModelForm):
             'description': 'Descripció',
             'category': 'Categoria',
             'scheduled_date': 'Data i hora',
+            'duration': 'Durada (minuts)',
             'thumbnail': 'Imatge de portada',
             'max_viewers': 'Màxim espectadors',
             'tags': 'Etiquetes',
@@ -92,7 +94,7 @@ class EventUpdateForm(forms.ModelForm):
 
     class Meta:
         model = Event
-        fields = ['title', 'description', 'category', 'scheduled_date',
+        fields = ['title', 'description', 'category', 'scheduled_date', 'duration',
                   'thumbnail', 'max_viewers', 'tags', 'status', 'stream_url']
         widgets = {
             'title': forms.TextInput(attrs={'class': 'form-control'}),
@@ -100,6 +102,7 @@ class EventUpdateForm(forms.ModelForm):
             'category': forms.Select(attrs={'class': 'form-control'}),
             'status': forms.Select(attrs={'class': 'form-control'}),
             'thumbnail': forms.FileInput(attrs={'class': 'form-control'}),
+            'duration': forms.NumberInput(attrs={'class': 'form-control', 'min': 1, 'max': Event.MAX_DURATION}),
             'max_viewers': forms.NumberInput(attrs={'class': 'form-control', 'min': 1, 'max': 1000}),
             'tags': forms.TextInput(attrs={'class': 'form-control'}),
             'stream_url': forms.URLInput(attrs={'class': 'form-control'}),
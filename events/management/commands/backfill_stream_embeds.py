@@ -0,0 +1,41 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from events.models import Event
+from events.streams import resolve_stream
+
+
+class Command(BaseCommand):
+    help = 'Calcula el proveïdor i la URL per incrustar dels esdeveniments que encara no en tenen'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true',
+                            help='Recalcula tots els esdeveniments (després d\'afegir un proveïdor)')
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        events = Event.objects.exclude(stream_url='').order_by('pk')
+        if not options['all']:
+            events = events.filter(stream_embed_url='')
+
+        started = time.perf_counter()
+        updated = 0
+        batch = []
+        # bulk_update no toca updated_at: no és un canvi de l'esdeveniment
+        for pk, stream_url, provider, embed_url in events.values_list(
+                'pk', 'stream_url', 'stream_provider', 'stream_embed_url').iterator(chunk_size=options['batch_size']):
+            new_provider, new_embed_url = resolve_stream(stream_url)
+            if (new_provider, new_embed_url) != (provider, embed_url):
+                batch.append(Event(pk=pk, stream_provider=new_provider, stream_embed_url=new_embed_url))
+            if len(batch) >= options['batch_size']:
+                Event.objects.bulk_update(batch, ['stream_provider', 'stream_embed_url'])
+                updated += len(batch)
+                batch = []
+        if batch:
+            Event.objects.bulk_update(batch, ['stream_provider', 'stream_embed_url'])
+            updated += len(batch)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'{updated} esdeveniments actualitzats ({time.perf_counter() - started:.1f} s)'
+        ))
@@ -0,0 +1,48 @@
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.template.loader import render_to_string
+
+from events.cards import TEMPLATE, CardCache
+from events.models import Event
+
+
+class Command(BaseCommand):
+    help = "Mesura el renderitzat de les targetes d'esdeveniment amb i sense la memòria cau"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--pages', type=int, default=50, help='Pàgines de 12 targetes')
+        parser.add_argument('--repeat', type=int, default=5, help='Passades sobre les mateixes pàgines')
+
+    def handle(self, *args, **options):
+        events = list(Event.objects.select_related('creator').order_by('-scheduled_date', '-pk')
+                      [:options['pages'] * 12])
+        if not events:
+            self.stdout.write(self.style.ERROR('No hi ha esdeveniments. Executa primer seed_events.'))
+            return
+        pages = [events[start:start + 12] for start in range(0, len(events), 12)]
+
+        def plain(page):
+            return [render_to_string(TEMPLATE, {'event': event}) for event in page]
+
+        cards = CardCache()
+        cards.cache.clear()
+        self.report('sense memòria cau', plain, pages, options['repeat'])
+        self.report('primera passada', cards.render_many, pages, 1)
+        self.report('amb memòria cau', cards.render_many, pages, options['repeat'])
+        self.stdout.write(
+            f"Encerts: {cards.stats['hits']}, fallades: {cards.stats['misses']} "
+            f"({cards.hit_rate:.1%})"
+        )
+
+    def report(self, label, render, pages, repeat):
+        timings = []
+        for _ in range(repeat):
+            for page in pages:
+                started = time.perf_counter()
+                render(page)
+                timings.append((time.perf_counter() - started) * 1000)
+        self.stdout.write(self.style.SUCCESS(
+            f'{label:<20} mediana {statistics.median(timings):7.2f} ms per pàgina'
+        ))
@@ -0,0 +1,85 @@
+import os
+import resource
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.test import RequestFactory
+from django.utils import timezone
+
+from events.api import event_export_api
+from events.models import Event
+
+User = get_user_model()
+
+BENCH_URL = 'https://www.twitch.tv/benchmark-export'
+
+
+def current_rss():
+    """Memòria resident ara mateix, en bytes (el màxim del procés si no hi ha /proc)"""
+    try:
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+class Command(BaseCommand):
+    help = "Mesura el rendiment de l'exportació JSON en streaming (/events/api/events/)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--create', type=int, default=0,
+                            help='Esdeveniments temporals a crear abans de mesurar (s\'esborren al final)')
+        parser.add_argument('--fields', action='append',
+                            help='Conjunt de camps a provar (es pot repetir)')
+        parser.add_argument('--format', choices=['json', 'ndjson'], default='json')
+
+    def handle(self, *args, **options):
+        if options['create']:
+            self.create(options['create'])
+        try:
+            field_sets = options['fields'] or ['id,title,status,scheduled_date', 'id,title,description,'
+                                               'category,status,scheduled_date,creator,tags,stream_url,updated_at']
+            for fields in field_sets:
+                self.export(fields, options['format'])
+        finally:
+            if options['create']:
+                Event.objects.filter(stream_url=BENCH_URL).delete()
+
+    def create(self, count):
+        user = User.objects.order_by('pk').first()
+        if user is None:
+            self.stdout.write(self.style.ERROR('No hi ha usuaris. Executa primer seed_users.'))
+            return
+        now = timezone.now()
+        Event.objects.bulk_create(
+            (Event(title=f'Exportació {i}', description='Descripció de prova ' * 10, creator=user,
+                   scheduled_date=now, tags='bench,export', stream_url=BENCH_URL) for i in range(count)),
+            batch_size=2000,
+        )
+
+    def export(self, fields, output_format):
+        request = RequestFactory().get('/events/api/events/', {'fields': fields, 'format': output_format})
+        rss_before = rss_peak = current_rss()
+        started = time.perf_counter()
+        first_byte = None
+        size = chunks = 0
+        response = event_export_api(request)
+        for chunk in response.streaming_content:
+            if first_byte is None:
+                first_byte = time.perf_counter() - started
+            size += len(chunk)
+            chunks += 1
+            rss_peak = max(rss_peak, current_rss())
+        elapsed = time.perf_counter() - started
+
+        rows = Event.objects.count()
+        self.stdout.write(self.style.SUCCESS(f'fields={fields}'))
+        self.stdout.write(
+            f'  {rows} esdeveniments, {size / 1e6:.1f} MB en {chunks} trossos, {elapsed:.2f} s '
+            f'({rows / elapsed:,.0f} esdeveniments/s, {size / 1e6 / elapsed:.1f} MB/s)'
+        )
+        self.stdout.write(
+            f'  primer byte {first_byte * 1000:.1f} ms, '
+            f'memòria +{(rss_peak - rss_before) / 1e6:.1f} MB durant l\'exportació'
+        )
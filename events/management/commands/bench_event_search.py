@@ -0,0 +1,118 @@
+import itertools
+import random
+import statistics
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+from django.utils import timezone
+
+from events.models import Event
+from events.search import SearchIndex
+
+User = get_user_model()
+
+COMMON_WORDS = [
+    'gaming', 'torneig', 'música', 'concert', 'directe', 'tutorial', 'programació', 'python',
+    'xerrada', 'intel·ligència', 'artificial', 'art', 'digital', 'esports', 'futbol', 'bàsquet',
+    'educació', 'ciència', 'tecnologia', 'indie', 'acústic', 'competició', 'premis', 'jugadors',
+    'entrevista', 'podcast', 'cuina', 'receptes', 'viatges', 'història', 'matemàtiques',
+]
+SYLLABLES = ['ba', 'ca', 'de', 'fi', 'go', 'la', 'me', 'no', 'pa', 'ri', 'sa', 'to', 'ver', 'xa', 'zu']
+QUERIES = ['python', 'concert indie', 'torneig gam', 'intel·ligencia', 'programacio tut', 'fut',
+           'esports premis', 'mus', 'digital art', 'cuina receptes']
+
+
+def _corpus(count, rng):
+    vocabulary = [''.join(rng.choices(SYLLABLES, k=rng.randint(2, 4))) for _ in range(50000)]
+    # Les paraules de les consultes, entre les freqüents però no les que més
+    for position, word in enumerate(COMMON_WORDS):
+        vocabulary.insert(50 + position * 10, word)
+    # Distribució de Zipf: poques paraules molt freqüents i moltes de rares
+    cumulative = list(itertools.accumulate(1 / (rank + 1) for rank in range(len(vocabulary))))
+    for pk in range(1, count + 1):
+        words = rng.choices(vocabulary, cum_weights=cumulative, k=30)
+        yield (
+            pk,
+            ' '.join(words[:5]).capitalize(),
+            ' '.join(words[5:27]),
+            ','.join(words[27:]),
+            rng.choice(Event.CATEGORY_CHOICES)[0],
+            rng.choice(Event.STATUS_CHOICES)[0],
+        )
+
+
+class Command(BaseCommand):
+    help = "Mesura la cerca d'esdeveniments amb l'índex invertit i la compara amb icontains"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--events', type=int, default=1_000_000,
+                            help="Esdeveniments sintètics a l'índex en memòria")
+        parser.add_argument('--db-events', type=int, default=20000,
+                            help='Esdeveniments a la base de dades per comparar amb icontains (0 per saltar)')
+        parser.add_argument('--repeat', type=int, default=20, help='Repeticions per consulta')
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+
+        started = time.perf_counter()
+        index = SearchIndex()
+        index.max_cached_results = 0  # Mesurar cada cerca sencera
+        index.build(_corpus(options['events'], rng))
+        self.stdout.write(f"Índex de {len(index)} esdeveniments construït en {time.perf_counter() - started:.1f} s")
+        self.report('índex', lambda query: index.search(query)[:12], options['repeat'])
+
+        if options['db_events']:
+            self.compare_with_db(options['db_events'], options['repeat'], rng)
+
+    def compare_with_db(self, count, repeat, rng):
+        user = User.objects.order_by('pk').first()
+        if user is None:
+            self.stdout.write(self.style.ERROR('No hi ha usuaris. Executa primer seed_users.'))
+            return
+
+        now = timezone.now()
+        Event.objects.bulk_create(
+            (
+                Event(title=title, description=description, tags=tags, category=category,
+                      status=status, creator=user, scheduled_date=now,
+                      stream_url='https://www.twitch.tv/benchmark')
+                for _, title, description, tags, category, status in _corpus(count, rng)
+            ),
+            batch_size=2000,
+        )
+        try:
+            index = SearchIndex()
+            index.max_cached_results = 0
+            index.build_from_db()
+            self.stdout.write(f'\nBase de dades amb {Event.objects.count()} esdeveniments:')
+
+            def icontains(query):
+                events = Event.objects.filter(
+                    Q(title__icontains=query) | Q(description__icontains=query) | Q(tags__icontains=query)
+                ).order_by('-scheduled_date')
+                return events.count(), list(events[:12])
+
+            def indexed(query):
+                ranked = index.search(query)
+                return len(ranked), Event.objects.in_bulk(ranked[:12])
+
+            self.report('icontains', icontains, repeat)
+            self.report('índex + in_bulk', indexed, repeat)
+        finally:
+            Event.objects.filter(stream_url='https://www.twitch.tv/benchmark', scheduled_date=now).delete()
+
+    def report(self, label, search, repeat):
+        timings = []
+        for query in QUERIES:
+            for _ in range(repeat):
+                started = time.perf_counter()
+                search(query)
+                timings.append((time.perf_counter() - started) * 1000)
+        timings.sort()
+        p95 = timings[int(len(timings) * 0.95) - 1]
+        self.stdout.write(self.style.SUCCESS(
+            f'{label:<16} mediana {statistics.median(timings):8.2f} ms   p95 {p95:8.2f} ms'
+        ))
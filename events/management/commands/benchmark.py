@@ -0,0 +1,97 @@
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from config import benchmarks
+
+DEFAULT_BASELINE = os.path.join(settings.BASE_DIR, 'benchmark_baseline.json')
+
+
+class Command(BaseCommand):
+    help = (
+        "Micro-benchmarks del xat, el llistat d'esdeveniments, els mètodes d'Event i els canvis "
+        "d'estat; compara amb el fitxer de referència i falla si hi ha regressions"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--baseline', default=DEFAULT_BASELINE, help='Fitxer JSON de referència')
+        parser.add_argument('--save', action='store_true',
+                            help='Desa els resultats com a nova referència en lloc de comparar')
+        parser.add_argument('--threshold', type=float, default=15.0,
+                            help='Percentatge de pujada del mínim que compta com a regressió')
+        parser.add_argument('--rounds', type=int, default=10, help='Rondes per cas')
+        parser.add_argument('--retries', type=int, default=benchmarks.RETRIES,
+                            help='Vegades que es torna a mesurar un cas que surt més lent')
+        parser.add_argument('--only', action='append', default=[],
+                            help='Només els casos que contenen aquest text (es pot repetir)')
+        parser.add_argument('--list', action='store_true', help='Mostra els casos i surt')
+
+    def handle(self, *args, **options):
+        if options['list']:
+            for name in benchmarks.BENCHMARKS:
+                self.stdout.write(name)
+            return
+
+        names = [
+            name for name in benchmarks.BENCHMARKS
+            if not options['only'] or any(part in name for part in options['only'])
+        ]
+        if not names:
+            raise CommandError('Cap cas coincideix amb --only (vegeu --list).')
+        if settings.DEBUG:
+            self.stdout.write(self.style.WARNING(
+                'DEBUG està activat: cada consulta es guarda i els temps surten més alts '
+                '(fes servir DJANGO_SETTINGS_MODULE=config.settings_loadtest).'
+            ))
+
+        fixture = benchmarks.Fixture.ensure(self.stdout.write)
+        if fixture.user is None or fixture.chat_event_pk is None:
+            raise CommandError('Les dades de prova no tenen usuaris o missatges. Executa seed_users i seed_events.')
+        meta = benchmarks.metadata(fixture, options['rounds'])
+        results = benchmarks.run(names, options['rounds'], fixture)
+
+        if options['save'] or not os.path.exists(options['baseline']):
+            benchmarks.save(options['baseline'], meta, results)
+            self.print_results(results)
+            self.stdout.write(self.style.SUCCESS(f"Referència desada a {options['baseline']}"))
+            return
+
+        baseline = benchmarks.load(options['baseline'])
+        if baseline['meta'].get('fixture') != meta['fixture']:
+            self.stdout.write(self.style.WARNING(
+                f"Les dades de prova no són les de la referència ({baseline['meta'].get('fixture')} "
+                f"ara {meta['fixture']}): la comparació no és exacta."
+            ))
+        rows = benchmarks.confirm(results, baseline, options['threshold'], fixture, options['rounds'],
+                                  retries=options['retries'], write=self.stdout.write)
+        self.print_comparison(rows)
+        regressions = [name for name, *_, regressed in rows if regressed]
+        if regressions:
+            raise CommandError(
+                f"{len(regressions)} regressions (més del {options['threshold']:g} % o més consultes): "
+                f"{', '.join(regressions)}"
+            )
+        self.stdout.write(self.style.SUCCESS(f"Cap regressió respecte a {options['baseline']}"))
+
+    def print_results(self, results):
+        self.stdout.write(f"{'cas':<44} {'mediana µs':>12} {'mín µs':>10} {'p95 µs':>10} {'consultes':>10}")
+        for name, result in results.items():
+            self.stdout.write(
+                f"{name:<44} {result['median_us']:>12.1f} {result['min_us']:>10.1f} "
+                f"{result['p95_us']:>10.1f} {result['queries']:>10}"
+            )
+
+    def print_comparison(self, rows):
+        self.stdout.write(f"{'cas':<44} {'abans mín µs':>12} {'ara mín µs':>12} {'canvi':>9} {'consultes':>10}")
+        for name, result, reference, change, regressed in rows:
+            if reference is None:
+                self.stdout.write(
+                    f"{name:<44} {'-':>12} {result['min_us']:>12.1f} {'nou':>9} {result['queries']:>10}"
+                )
+                continue
+            line = (
+                f"{name:<44} {reference['min_us']:>12.1f} {result['min_us']:>12.1f} "
+                f"{change:>+8.1f}% {reference['queries']:>4} → {result['queries']:<3}"
+            )
+            self.stdout.write(self.style.ERROR(line) if regressed else line)
@@ -0,0 +1,131 @@
+import json
+import random
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client
+from django.utils import timezone
+
+from config import loadtest
+from events.models import Event
+
+User = get_user_model()
+
+PUBLISHED_STATUSES = ['scheduled', 'live', 'finished']
+
+
+class Command(BaseCommand):
+    help = (
+        "Simula usuaris concurrents (llistat, detalls, xat cada 3 s i ràfegues de missatges) contra "
+        "config.wsgi o config.asgi en procés i mesura latència, ritme i consultes per URL"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interface', choices=['wsgi', 'asgi'], default='wsgi')
+        parser.add_argument('--scenario', help='Fitxer JSON amb els valors de l\'escenari a canviar')
+        parser.add_argument('--users', type=int, help='Usuaris simultanis (per sobre de l\'escenari)')
+        parser.add_argument('--duration', type=float, help='Segons de mesura (per sobre de l\'escenari)')
+        parser.add_argument('--events', type=int, default=1000,
+                            help='Esdeveniments (els més recents) entre els quals es reparteixen les visites')
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--output', help='Fitxer JSON on desar els resultats')
+
+    def handle(self, *args, **options):
+        scenario = self.scenario(options)
+        if not getattr(settings, 'QUERY_BUDGET_HEADER', settings.DEBUG):
+            self.stdout.write(self.style.WARNING(
+                'QUERY_BUDGET_HEADER està desactivat: no es comptaran les consultes '
+                '(fes servir DJANGO_SETTINGS_MODULE=config.settings_loadtest).'
+            ))
+
+        rng = random.Random(options['seed'])
+        event_pks = list(
+            Event.objects.filter(status__in=PUBLISHED_STATUSES)
+            .order_by('-scheduled_date')
+            .values_list('pk', flat=True)[:options['events']]
+        )
+        live_pks = list(Event.objects.filter(status='live').order_by('pk').values_list('pk', flat=True)[:200])
+        if not event_pks:
+            raise CommandError('No hi ha esdeveniments. Executa primer seed_users i seed_events.')
+        # Quins són els populars no depèn de l'ordre de la base de dades
+        rng.shuffle(event_pks)
+        rng.shuffle(live_pks)
+        targets = loadtest.Targets(event_pks, live_pks)
+        sessions = self.sessions(scenario, rng)
+
+        if options['interface'] == 'asgi':
+            from config.asgi import application
+            run = loadtest.run_asgi
+        else:
+            from config.wsgi import application
+            run = loadtest.run_wsgi
+
+        self.stdout.write(
+            f"{options['interface'].upper()}: {scenario['users']} usuaris ({sum(s.authenticated for s in sessions)} "
+            f"amb sessió), {scenario['duration']} s, {len(event_pks)} esdeveniments, {len(live_pks)} en directe"
+        )
+        recorder = loadtest.Recorder()
+        started_at = timezone.now()
+        run(application, scenario, targets, sessions, options['seed'], recorder)
+
+        results = {
+            'meta': {
+                'interface': options['interface'],
+                'started_at': started_at.isoformat(),
+                'settings': settings.SETTINGS_MODULE,
+                'database': settings.DATABASES['default']['ENGINE'],
+                'seed': options['seed'],
+                'events': len(event_pks),
+                'live_events': len(live_pks),
+                'scenario': scenario,
+            },
+            **recorder.report(),
+        }
+        self.print_report(results)
+        if options['output']:
+            with open(options['output'], 'w') as handle:
+                json.dump(results, handle, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"Resultats desats a {options['output']}"))
+
+    def scenario(self, options):
+        scenario = dict(loadtest.DEFAULT_SCENARIO)
+        if options['scenario']:
+            with open(options['scenario']) as handle:
+                overrides = json.load(handle)
+            unknown = set(overrides) - set(scenario)
+            if unknown:
+                raise CommandError(f"Claus desconegudes a l'escenari: {', '.join(sorted(unknown))}")
+            scenario.update(overrides)
+        for name in ('users', 'duration'):
+            if options[name] is not None:
+                scenario[name] = options[name]
+        return scenario
+
+    def sessions(self, scenario, rng):
+        """Una sessió per usuari simulat; les autenticades, amb usuaris reals iniciats"""
+        authenticated = round(scenario['users'] * scenario['authenticated'])
+        users = list(User.objects.filter(is_active=True, is_superuser=False).order_by('pk')[:authenticated])
+        if len(users) < authenticated:
+            self.stdout.write(self.style.WARNING(f'Només hi ha {len(users)} usuaris per iniciar sessió.'))
+        sessions = []
+        for user in users:
+            client = Client()
+            client.force_login(user)
+            sessions.append(loadtest.Session(client.cookies[settings.SESSION_COOKIE_NAME].value))
+        sessions += [loadtest.Session() for _ in range(scenario['users'] - len(sessions))]
+        rng.shuffle(sessions)
+        return sessions
+
+    def print_report(self, results):
+        header = (f"{'URL':<28} {'peticions':>9} {'per s':>7} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} "
+                  f"{'màx ms':>8} {'consultes':>10}  estats")
+        self.stdout.write(header)
+        rows = list(results['urls'].items()) + [('TOTAL', results['totals'])]
+        for name, row in rows:
+            queries = '-' if row['queries_mean'] is None else f"{row['queries_mean']:.1f}/{row['queries_max']}"
+            statuses = ' '.join(f'{status}:{count}' for status, count in row['status'].items())
+            self.stdout.write(
+                f"{name:<28} {row['requests']:>9} {row['throughput']:>7.1f} {row['p50_ms']:>8.1f} "
+                f"{row['p95_ms']:>8.1f} {row['p99_ms']:>8.1f} {row['max_ms']:>8.1f} {queries:>10}  {statuses}"
+            )
@@ -0,0 +1,39 @@
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from events.models import DeletedEvent
+from events.search import TOMBSTONE_DAYS, SearchIndex
+
+
+class Command(BaseCommand):
+    help = "Reconstrueix l'índex de cerca d'esdeveniments i en desa la instantània"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', default=getattr(settings, 'EVENT_SEARCH_INDEX_FILE', None),
+                            help='Fitxer de la instantània (per defecte EVENT_SEARCH_INDEX_FILE)')
+
+    def handle(self, *args, **options):
+        output = options['output']
+        if not output:
+            self.stdout.write(self.style.ERROR('Cal EVENT_SEARCH_INDEX_FILE o --output.'))
+            return
+
+        started = time.perf_counter()
+        index = SearchIndex()
+        index.build_from_db()
+        built = time.perf_counter() - started
+        index.save(output)
+
+        # Els índexs més vells que les files que queden es comparen sencers (events.search)
+        pruned, _ = DeletedEvent.objects.filter(
+            deleted_at__lt=timezone.now() - timedelta(days=TOMBSTONE_DAYS)
+        ).delete()
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Indexats {len(index)} esdeveniments en {built:.1f} s → {output} '
+            f'({pruned} esborrats antics descartats)'
+        ))
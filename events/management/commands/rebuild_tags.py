@@ -0,0 +1,19 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from events.tags import rebuild_tags
+
+
+class Command(BaseCommand):
+    help = 'Torna a generar les etiquetes normalitzades (Tag) i els seus recomptes a partir de Event.tags'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        events, tags = rebuild_tags(options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f'{events} esdeveniments, {tags} etiquetes en ús ({time.perf_counter() - started:.1f} s)'
+        ))
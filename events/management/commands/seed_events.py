@@ -1,149 +1,296 @@
-from django.core.management.base import BaseCommand
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.conf import settings
 from django.contrib.auth import get_user_model
+from events.calendar import invalidate_calendar
+from events.facets import invalidate_facets
 from events.models import Event
+from events.pagecache import invalidate_all
+from events.streams import resolve_stream
+from chat.models import ChatMessage
+from config.seeding import (
+    Throughput, bulk_insert, chunk_random, chunks, context, default_workers, explicit_timestamps,
+    run_chunks, skewed_weights,
+)
 from django.utils import timezone
-from datetime import timedelta
+from django.utils.dateparse import parse_datetime
+from datetime import datetime, timedelta, timezone as dt_timezone
 import random
 
 User = get_user_model()
 
+SAMPLE_EVENTS = [
+    {
+        'title': 'Marató de Gaming: Fortnite Tournament',
+        'description': 'Torneig de Fortnite amb premis increïbles! Uneix-te a la competició més esperada de l\'any. Competeix amb els millors jugadors i guanya premis exclusius.',
+        'category': 'gaming',
+        'max_viewers': 500,
+        'is_featured': True,
+        'tags': 'gaming,fortnite,tournament,esports',
+        'stream_url': 'https://www.youtube.com/watch?v=dQw4w9WgXcQ'
+    },
+    {
+        'title': 'Concert Acústic: Música Indie',
+        'description': 'Sessió acústica amb les millors bandes indie del moment. No et perdis aquesta experiència única de música en viu amb artistes emergents.',
+        'category': 'music',
+        'max_viewers': 200,
+        'is_featured': True,
+        'tags': 'music,indie,acoustic,live',
+        'stream_url': 'https://www.twitch.tv/musiclive'
+    },
+    {
+        'title': 'Xerrada sobre Intel·ligència Artificial',
+        'description': 'Descobreix els últims avenços en IA i com estan transformant la societat. Experts del sector compartiran les seves experiències.',
+        'category': 'technology',
+        'max_viewers': 300,
+        'is_featured': False,
+        'tags': 'technology,ai,inteligencia artificial,xerrada',
+        'stream_url': 'https://www.youtube.com/watch?v=abcdefghijk'
+    },
+    {
+        'title': 'Tutorial de Programació Python',
+        'description': 'Aprèn Python des de zero amb aquest tutorial complet. Perfecte per a principiants que volen iniciar-se en la programació.',
+        'category': 'education',
+        'max_viewers': 150,
+        'is_featured': False,
+        'tags': 'education,python,programming,tutorial',
+        'stream_url': 'https://www.youtube.com/watch?v=python123'
+    },
+    {
+        'title': 'Directe de Art Digital',
+        'description': 'Sessió de creació d\'art digital en directe. Observa com es crea una peça d\'art des de zero amb eines digitals.',
+        'category': 'art',
+        'max_viewers': 100,
+        'is_featured': False,
+        'tags': 'art,digital,creativity,live',
+        'stream_url': 'https://www.twitch.tv/artdigital'
+    },
+    {
+        'title': 'Partit de Lliga de Videojocs',
+        'description': 'Segueix en directe aquest emocionant partit de la lliga professional de videojocs. Els millors equips es enfrenten.',
+        'category': 'gaming',
+        'max_viewers': 1000,
+        'is_featured': True,
+        'tags': 'gaming,esports,competition,live',
+        'stream_url': 'https://www.twitch.tv/esports'
+    },
+    {
+        'title': 'Debat sobre Canvi Climàtic',
+        'description': 'Debat entre experts sobre les solucions al canvi climàtic. Una conversa necessària per al futur del planeta.',
+        'category': 'talk',
+        'max_viewers': 250,
+        'is_featured': False,
+        'tags': 'talk,climate,environment,debat',
+        'stream_url': 'https://www.youtube.com/watch?v=climate123'
+    },
+    {
+        'title': 'Sessió de Yoga en Directe',
+        'description': 'Classe de yoga per a tots els nivells. Connecta amb el teu cos i ment en aquesta sessió relaxant.',
+        'category': 'sports',
+        'max_viewers': 80,
+        'is_featured': False,
+        'tags': 'sports,yoga,wellness,health',
+        'stream_url': 'https://www.youtube.com/watch?v=yoga456'
+    },
+    {
+        'title': 'Festival de Música Electrónica',
+        'description': 'Festival virtual de música electrónica amb els millors DJs internacionals. Una experiència sonora única.',
+        'category': 'music',
+        'max_viewers': 5000,
+        'is_featured': True,
+        'tags': 'music,electronic,festival,dj',
+        'stream_url': 'https://www.youtube.com/watch?v=electronic789'
+    },
+    {
+        'title': 'Taller d\'Emprenedoria',
+        'description': 'Aprèn a crear el teu propi negoci amb aquest taller pràctic. Experts en emprenedoria compartiran els seus consells.',
+        'category': 'education',
+        'max_viewers': 200,
+        'is_featured': False,
+        'tags': 'education,entrepreneurship,business,workshop',
+        'stream_url': 'https://www.youtube.com/watch?v=business456'
+    }
+]
+
+
+# Dates programades: des de fa PAST_DAYS dies fins d'aquí a FUTURE_DAYS dies
+PAST_DAYS = 30
+FUTURE_DAYS = 15
+DURATIONS = [30, 45, 60, 60, 90, 120, 180]
+FEATURED_RATE = 0.02
+DRAFT_RATE = 0.03
+CANCELLED_RATE = 0.02
+
+MESSAGES = [
+    'Hola a tothom!', 'Bona tarda!', 'Quina passada', 'Se sent molt bé', 'Es talla una mica',
+    'Gràcies per compartir-ho', 'Genial!', 'Des de Barcelona', 'Des de València', 'Des de Girona',
+    'Quan comença la segona part?', 'Hi haurà gravació?', 'Molt interessant', 'Brutal',
+    'Hola des de Mallorca', 'Quin nivell', 'Pots repetir la pregunta?', 'Gràcies!', 'Jajaja',
+    'Algú més sense so?', 'Ara sí que va', 'Increïble', 'Quina cançó és aquesta?', 'Bravo!',
+]
+EMOJIS = ['', '', '', ' 🔥', ' 👏', ' 😂', ' ❤️', ' 🎉', ' 👍', ' 😮']
+
+
+def event_status(rng, now, scheduled_date, ends_at):
+    roll = rng.random()
+    if roll < DRAFT_RATE:
+        return 'draft'
+    if roll < DRAFT_RATE + CANCELLED_RATE:
+        return 'cancelled'
+    if scheduled_date > now:
+        return 'scheduled'
+    return 'live' if ends_at > now else 'finished'
+
+
+def create_events(task):
+    """Crea els esdeveniments del tros; retorna quants"""
+    index, start, stop = task
+    shared = context()
+    rng = chunk_random(shared['seed'], 'events', index)
+    now = shared['now']
+    events = []
+    for number in range(start, stop):
+        template = SAMPLE_EVENTS[number % len(SAMPLE_EVENTS)]
+        first_round = number < len(SAMPLE_EVENTS)
+        scheduled_date = now + timedelta(seconds=rng.randint(-PAST_DAYS * 86400, FUTURE_DAYS * 86400))
+        duration = rng.choice(DURATIONS)
+        ends_at = scheduled_date + timedelta(minutes=duration)
+        stream_provider, stream_embed_url = shared['streams'][template['stream_url']]
+        events.append(Event(
+            title=template['title'] if first_round else f"{template['title']} #{number + 1}",
+            description=template['description'],
+            creator_id=rng.choices(shared['creators'], cum_weights=shared['creator_weights'])[0],
+            category=template['category'],
+            scheduled_date=scheduled_date,
+            duration=duration,
+            ends_at=ends_at,
+            status=event_status(rng, now, scheduled_date, ends_at),
+            max_viewers=template['max_viewers'],
+            is_featured=template['is_featured'] if first_round else rng.random() < FEATURED_RATE,
+            tags=template['tags'],
+            stream_url=template['stream_url'],
+            stream_provider=stream_provider,
+            stream_embed_url=stream_embed_url,
+        ))
+    return bulk_insert(Event, events, shared['batch_size'])
+
+
+def create_messages(task):
+    """Crea els missatges del tros, repartits segons la popularitat dels esdeveniments"""
+    index, start, stop = task
+    shared = context()
+    rng = chunk_random(shared['seed'], 'messages', index)
+    event_pks, starts, spans = shared['event_pks'], shared['starts'], shared['spans']
+    user_pks = shared['user_pks']
+    positions = rng.choices(range(len(event_pks)), cum_weights=shared['weights'], k=stop - start)
+    rows = sorted(
+        (event_pks[position], starts[position] + rng.random() * spans[position], rng.choice(user_pks),
+         rng.choice(MESSAGES) + rng.choice(EMOJIS))
+        for position in positions
+    )
+    # En ordre de (esdeveniment, data), com l'índex de l'historial: s'hi insereix seguit
+    messages = [
+        ChatMessage(event_id=event_pk, user_id=user_pk, message=message,
+                    created_at=datetime.fromtimestamp(moment, dt_timezone.utc))
+        for event_pk, moment, user_pk, message in rows
+    ]
+    with explicit_timestamps(ChatMessage, 'created_at'):
+        return bulk_insert(ChatMessage, messages, shared['batch_size'])
+
 
 class Command(BaseCommand):
-    help = 'Crea esdeveniments de prova per a la base de dades'
+    help = 'Crea esdeveniments (i missatges de xat) de prova per a la base de dades'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--events', type=int, default=len(SAMPLE_EVENTS), help='Esdeveniments a crear')
+        parser.add_argument('--messages', type=int, default=0,
+                            help='Missatges de xat a crear als esdeveniments en directe i finalitzats')
+        parser.add_argument('--skew', type=float, default=1.1,
+                            help='Exponent de Zipf de la popularitat (més alt, més concentrada)')
+        parser.add_argument('--seed', type=int, default=42, help='Llavor (mateixa llavor, mateixes dades)')
+        parser.add_argument('--anchor',
+                            help='Data i hora ISO 8601 de referència de les dates i els estats (per defecte, ara); '
+                                 'amb la mateixa llavor i la mateixa --anchor surten les mateixes dades')
+        parser.add_argument('--batch-size', type=int, default=2000, help='Files per bulk_create')
+        parser.add_argument('--workers', type=int, default=default_workers(),
+                            help='Processos que generen i insereixen les dades')
 
     def handle(self, *args, **options):
-        users = User.objects.all()
-        if not users:
+        options['anchor'] = self.parse_anchor(options['anchor'])
+        user_pks = list(User.objects.order_by('pk').values_list('pk', flat=True))
+        if not user_pks:
             self.stdout.write(
                 self.style.ERROR('No hi ha usuaris a la base de dades. Executa primer seed_users.')
             )
             return
 
-        events_data = [
-            {
-                'title': 'Marató de Gaming: Fortnite Tournament',
-                'description': 'Torneig de Fortnite amb premis increïbles! Uneix-te a la competició més esperada de l\'any. Competeix amb els millors jugadors i guanya premis exclusius.',
-                'category': 'gaming',
-                'max_viewers': 500,
-                'is_featured': True,
-                'tags': 'gaming,fortnite,tournament,esports',
-                'stream_url': 'https://www.youtube.com/watch?v=dQw4w9WgXcQ'
-            },
-            {
-                'title': 'Concert Acústic: Música Indie',
-                'description': 'Sessió acústica amb les millors bandes indie del moment. No et perdis aquesta experiència única de música en viu amb artistes emergents.',
-                'category': 'music',
-                'max_viewers': 200,
-                'is_featured': True,
-                'tags': 'music,indie,acoustic,live',
-                'stream_url': 'https://www.twitch.tv/musiclive'
-            },
-            {
-                'title': 'Xerrada sobre Intel·ligència Artificial',
-                'description': 'Descobreix els últims avenços en IA i com estan transformant la societat. Experts del sector compartiran les seves experiències.',
-                'category': 'technology',
-                'max_viewers': 300,
-                'is_featured': False,
-                'tags': 'technology,ai,inteligencia artificial,xerrada',
-                'stream_url': 'https://www.youtube.com/watch?v=abcdefghijk'
-            },
-            {
-                'title': 'Tutorial de Programació Python',
-                'description': 'Aprèn Python des de zero amb aquest tutorial complet. Perfecte per a principiants que volen iniciar-se en la programació.',
-                'category': 'education',
-                'max_viewers': 150,
-                'is_featured': False,
-                'tags': 'education,python,programming,tutorial',
-                'stream_url': 'https://www.youtube.com/watch?v=python123'
-            },
-            {
-                'title': 'Directe de Art Digital',
-                'description': 'Sessió de creació d\'art digital en directe. Observa com es crea una peça d\'art des de zero amb eines digitals.',
-                'category': 'art',
-                'max_viewers': 100,
-                'is_featured': False,
-                'tags': 'art,digital,creativity,live',
-                'stream_url': 'https://www.twitch.tv/artdigital'
-            },
-            {
-                'title': 'Partit de Lliga de Videojocs',
-                'description': 'Segueix en directe aquest emocionant partit de la lliga professional de videojocs. Els millors equips es enfrenten.',
-                'category': 'gaming',
-                'max_viewers': 1000,
-                'is_featured': True,
-                'tags': 'gaming,esports,competition,live',
-                'stream_url': 'https://www.twitch.tv/esports'
-            },
-            {
-                'title': 'Debat sobre Canvi Climàtic',
-                'description': 'Debat entre experts sobre les solucions al canvi climàtic. Una conversa necessària per al futur del planeta.',
-                'category': 'talk',
-                'max_viewers': 250,
-                'is_featured': False,
-                'tags': 'talk,climate,environment,debat',
-                'stream_url': 'https://www.youtube.com/watch?v=climate123'
-            },
-            {
-                'title': 'Sessió de Yoga en Directe',
-                'description': 'Classe de yoga per a tots els nivells. Connecta amb el teu cos i ment en aquesta sessió relaxant.',
-                'category': 'sports',
-                'max_viewers': 80,
-                'is_featured': False,
-                'tags': 'sports,yoga,wellness,health',
-                'stream_url': 'https://www.youtube.com/watch?v=yoga456'
-            },
-            {
-                'title': 'Festival de Música Electrónica',
-                'description': 'Festival virtual de música electrónica amb els millors DJs internacionals. Una experiència sonora única.',
-                'category': 'music',
-                'max_viewers': 5000,
-                'is_featured': True,
-                'tags': 'music,electronic,festival,dj',
-                'stream_url': 'https://www.youtube.com/watch?v=electronic789'
-            },
-            {
-                'title': 'Taller d\'Emprenedoria',
-                'description': 'Aprèn a crear el teu propi negoci amb aquest taller pràctic. Experts en emprenedoria compartiran els seus consells.',
-                'category': 'education',
-                'max_viewers': 200,
-                'is_featured': False,
-                'tags': 'education,entrepreneurship,business,workshop',
-                'stream_url': 'https://www.youtube.com/watch?v=business456'
-            }
-        ]
-
-        created_count = 0
-
-        for i, event_data in enumerate(events_data):
-            days_ago = random.randint(0, 30)
-            hours_from_now = random.randint(1, 48)
-
-            scheduled_date = timezone.now() - timedelta(days=days_ago) + timedelta(hours=hours_from_now)
-
-            # Assignar estat basat en la data
-            if scheduled_date < timezone.now():
-                status = random.choice(['live', 'finished'])
-            else:
-                status = 'scheduled'
-
-            event = Event.objects.create(
-                title=event_data['title'],
-                description=event_data['description'],
-                creator=random.choice(users),
-                category=event_data['category'],
-                scheduled_date=scheduled_date,
-                status=status,
-                max_viewers=event_data['max_viewers'],
-                is_featured=event_data.get('is_featured', False),
-                tags=event_data['tags'],
-                stream_url=event_data['stream_url']
-            )
+        if options['events']:
+            self.create_events(options, user_pks)
+        if options['messages']:
+            self.create_messages(options, user_pks)
 
-            created_count += 1
-            self.stdout.write(
-                self.style.SUCCESS(f'Creat esdeveniment: {event.title}')
-            )
+    def parse_anchor(self, value):
+        if not value:
+            return timezone.now()
+        try:
+            anchor = parse_datetime(value)
+        except ValueError:
+            anchor = None
+        if anchor is None:
+            raise CommandError(f'--anchor ha de ser una data i hora ISO 8601: {value}')
+        return anchor if timezone.is_aware(anchor) else timezone.make_aware(anchor)
+
+    def create_events(self, options, user_pks):
+        # Uns pocs creadors fan la majoria d'esdeveniments
+        creators = list(user_pks)
+        random.Random(f"{options['seed']}:creators").shuffle(creators)
+        shared = {
+            'seed': options['seed'],
+            'batch_size': options['batch_size'],
+            'now': options['anchor'],
+            'creators': creators,
+            'creator_weights': skewed_weights(len(creators), options['skew']),
+            'streams': {event['stream_url']: resolve_stream(event['stream_url']) for event in SAMPLE_EVENTS},
+        }
+        progress = Throughput('esdeveniments de prova', self.stdout.write, options['events'])
+        for created in run_chunks(create_events, chunks(options['events']), shared, options['workers']):
+            progress.add(created)
+        self.stdout.write(self.style.SUCCESS(f'S\'han creat {progress.summary()}'))
+
+        # bulk_create no envia els senyals de save: etiquetes, índex de cerca i memòries cau
+        call_command('rebuild_tags', batch_size=options['batch_size'], stdout=self.stdout)
+        if getattr(settings, 'EVENT_SEARCH_INDEX_FILE', None):
+            call_command('rebuild_search_index', stdout=self.stdout)
+        invalidate_all()
+        invalidate_facets()
+        invalidate_calendar()
+
+    def create_messages(self, options, user_pks):
+        rows = list(
+            Event.objects.filter(status__in=['live', 'finished'])
+            .order_by('pk')
+            .values_list('pk', 'scheduled_date', 'ends_at')
+        )
+        if not rows:
+            self.stdout.write(self.style.ERROR('No hi ha esdeveniments en directe o finalitzats.'))
+            return
 
-        self.stdout.write(
-            self.style.SUCCESS(f'S\'han creat {created_count} esdeveniments de prova')
-        )
\ No newline at end of file
+        # Uns pocs esdeveniments molt populars s'emporten gran part dels missatges
+        random.Random(f"{options['seed']}:popular").shuffle(rows)
+        now = options['anchor']
+        shared = {
+            'seed': options['seed'],
+            'batch_size': options['batch_size'],
+            'user_pks': user_pks,
+            'event_pks': [pk for pk, _, _ in rows],
+            'starts': [scheduled_date.timestamp() for _, scheduled_date, _ in rows],
+            'spans': [
+                max((min(ends_at or now, now) - scheduled_date).total_seconds(), 0)
+                for _, scheduled_date, ends_at in rows
+            ],
+            'weights': skewed_weights(len(rows), options['skew']),
+        }
+        progress = Throughput('missatges', self.stdout.write, options['messages'])
+        for created in run_chunks(create_messages, chunks(options['messages']), shared, options['workers']):
+            progress.add(created)
+        self.stdout.write(self.style.SUCCESS(f'S\'han creat {progress.summary()}'))
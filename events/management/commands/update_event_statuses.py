@@ -1,42 +1,61 @@
-from django.core.management.base import BaseCommand
-from django.utils import timezone
-from events.models import Event
-from datetime import timedelta
+import signal
+
+from django.core.management.base import BaseCommand, CommandError
+
+from config.checks import cache_is_shared
+from events.scheduler import HORIZON_MINUTES, POLL_SECONDS, StatusScheduler, apply_transitions
+
+LABELS = {'live': 'EN DIRECTE', 'finished': 'FINALITZATS'}
 
 
 class Command(BaseCommand):
     help = 'Actualitza els estats dels esdeveniments automàticament'
 
-    def handle(self, *args, **options):
-        now = timezone.now()
-        updated_count = 0
-
-        # Esdeveniments programats que han de començar
-        scheduled_to_live = Event.objects.filter(
-            status='scheduled',
-            scheduled_date__lte=now
-        )
+    def add_arguments(self, parser):
+        parser.add_argument('--daemon', action='store_true',
+                            help='Es queda en marxa i canvia cada estat a l\'hora, en lloc d\'una sola passada')
+        parser.add_argument('--poll', type=float, default=POLL_SECONDS,
+                            help='Segons entre consultes dels esdeveniments creats o reprogramats (--daemon)')
+        parser.add_argument('--horizon', type=int, default=HORIZON_MINUTES,
+                            help='Minuts endavant dels canvis que es tenen carregats (--daemon)')
+        parser.add_argument('--allow-local-cache', action='store_true',
+                            help='Funciona encara que CACHES[\'default\'] no sigui compartida: els processos web '
+                                 'mostraran les pàgines, facetes i calendaris vells fins que caduquin')
 
-        for event in scheduled_to_live:
-            event.status = 'live'
-            event.save()
-            updated_count += 1
-            self.stdout.write(
-                self.style.SUCCESS(f'Esdeveniment "{event.title}" passat a EN DIRECTE')
+    def handle(self, *args, **options):
+        # Aquest procés no és el dels web: les generacions que incrementa només els arriben
+        # per una memòria cau compartida
+        if not options['allow_local_cache'] and not cache_is_shared():
+            raise CommandError(
+                "CACHES['default'] és local d'aquest procés i els processos web no veurien les "
+                "pàgines, facetes i calendaris descartats pels canvis d'estat. Fes servir una "
+                "memòria cau compartida (memcached, redis...) o --allow-local-cache."
             )
 
-        # Esdeveniments en directe que han de finalitzar
-        live_events = Event.objects.filter(status='live')
-        for event in live_events:
-            end_time = event.scheduled_date + timedelta(minutes=event.get_duration())
-            if now >= end_time:
-                event.status = 'finished'
-                event.save()
-                updated_count += 1
-                self.stdout.write(
-                    self.style.SUCCESS(f'Esdeveniment "{event.title}" FINALITZAT')
-                )
+        if options['daemon']:
+            self.run_daemon(options['poll'], options['horizon'])
+            return
 
+        updated_count = 0
+        for source, target, count in apply_transitions():
+            updated_count += count
+            if count:
+                self.report(source, target, count)
         self.stdout.write(
             self.style.SUCCESS(f'Actualitzats {updated_count} esdeveniments')
-        )
\ No newline at end of file
+        )
+
+    def run_daemon(self, poll, horizon):
+        scheduler = StatusScheduler(poll_seconds=poll, horizon_minutes=horizon)
+        signal.signal(signal.SIGTERM, lambda *args: scheduler.stop.set())
+        self.stdout.write(f'Canvis d\'estat en marxa (consulta cada {poll} s, {horizon} min endavant)')
+        try:
+            scheduler.run(on_transition=self.report)
+        except KeyboardInterrupt:
+            pass
+        self.stdout.write('Aturat')
+
+    def report(self, source, target, count):
+        self.stdout.write(
+            self.style.SUCCESS(f'{count} esdeveniments {LABELS.get(target, target)} (abans {source})')
+        )
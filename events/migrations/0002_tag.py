@@ -0,0 +1,66 @@
+# Generated by Django 4.1.13 on 2026-10-18 21:05
+
+import re
+from collections import Counter
+
+from django.db import migrations, models
+
+
+def backfill_tags(apps, schema_editor):
+    """Crea els Tag i els enllaços a partir del text de Event.tags (com events.tags.rebuild_tags)"""
+    Event = apps.get_model('events', 'Event')
+    Tag = apps.get_model('events', 'Tag')
+    Through = Event.tag_set.through
+
+    links = {}
+    labels = {}
+    for pk, text in Event.objects.values_list('pk', 'tags').iterator(chunk_size=2000):
+        names = []
+        for label in (text or '').split(','):
+            label = re.sub(r'\s+', ' ', label.strip().lstrip('#').strip())[:50]
+            name = label.lower()
+            if name and name not in names:
+                names.append(name)
+                labels.setdefault(name, label)
+        links[pk] = names
+
+    counts = Counter(name for names in links.values() for name in names)
+    Tag.objects.bulk_create(
+        [Tag(name=name, label=label, event_count=counts[name]) for name, label in labels.items()],
+        batch_size=2000,
+    )
+    tag_ids = dict(Tag.objects.values_list('name', 'pk'))
+    Through.objects.bulk_create(
+        (Through(event_id=pk, tag_id=tag_ids[name]) for pk, names in links.items() for name in names),
+        batch_size=2000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Tag',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True, verbose_name='Nom')),
+                ('label', models.CharField(max_length=50, verbose_name='Etiqueta')),
+                ('event_count', models.PositiveIntegerField(db_index=True, default=0, verbose_name='Esdeveniments')),
+            ],
+            options={
+                'verbose_name': 'Etiqueta',
+                'verbose_name_plural': 'Etiquetes',
+                'ordering': ['-event_count', 'name'],
+            },
+        ),
+        migrations.AddField(
+            model_name='event',
+            name='tag_set',
+            field=models.ManyToManyField(blank=True, editable=False, related_name='events', to='events.tag', verbose_name='Etiquetes normalitzades'),
+        ),
+        migrations.RunPython(backfill_tags, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 4.1.13 on 2026-10-18 21:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0002_tag'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='event',
+            index=models.Index(fields=['scheduled_date', 'id'], name='event_schedule_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='event',
+            index=models.Index(fields=['category', 'scheduled_date', 'id'], name='event_category_schedule_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='event',
+            index=models.Index(fields=['creator', 'scheduled_date', 'id'], name='event_creator_schedule_idx'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.1.13 on 2026-10-18 21:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0003_event_schedule_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='event',
+            index=models.Index(fields=['category', 'status'], name='event_category_status_idx'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.1.13 on 2026-10-18 21:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0004_event_category_status_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='event',
+            name='stream_embed_url',
+            field=models.URLField(blank=True, editable=False, max_length=500, verbose_name='URL per incrustar'),
+        ),
+        migrations.AddField(
+            model_name='event',
+            name='stream_provider',
+            field=models.CharField(blank=True, editable=False, max_length=20, verbose_name='Proveïdor del stream'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.1.13 on 2026-10-18 21:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0005_event_stream_embed'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='event',
+            index=models.Index(fields=['status', 'scheduled_date', 'id'], name='event_status_schedule_idx'),
+        ),
+    ]
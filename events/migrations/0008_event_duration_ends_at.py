@@ -0,0 +1,45 @@
+# Generated by Django 4.1.13 on 2026-10-18 21:28
+
+from datetime import timedelta
+
+from django.db import migrations, models
+
+
+def backfill_ends_at(apps, schema_editor):
+    """ends_at = scheduled_date + duration per als esdeveniments que ja hi havia"""
+    Event = apps.get_model('events', 'Event')
+    batch = []
+    for pk, scheduled_date, duration in Event.objects.values_list(
+        'pk', 'scheduled_date', 'duration',
+    ).iterator(chunk_size=2000):
+        batch.append(Event(pk=pk, ends_at=scheduled_date + timedelta(minutes=duration)))
+        if len(batch) >= 2000:
+            Event.objects.bulk_update(batch, ['ends_at'])
+            batch = []
+    if batch:
+        Event.objects.bulk_update(batch, ['ends_at'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0007_event_updated_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='event',
+            name='duration',
+            field=models.PositiveIntegerField(default=60, verbose_name='Durada (minuts)'),
+        ),
+        migrations.AddField(
+            model_name='event',
+            name='ends_at',
+            field=models.DateTimeField(editable=False, null=True, verbose_name='Data i hora de finalització'),
+        ),
+        migrations.RunPython(backfill_ends_at, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='event',
+            index=models.Index(fields=['status', 'ends_at'], name='event_status_ends_idx'),
+        ),
+    ]
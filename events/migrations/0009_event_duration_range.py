@@ -0,0 +1,19 @@
+# Generated by Django 4.1.13 on 2026-10-18 22:07
+
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0008_event_duration_ends_at'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='event',
+            name='duration',
+            field=models.PositiveIntegerField(default=60, validators=[django.core.validators.MinValueValidator(1, "La durada ha d'estar entre 1 i 1440 minuts."), django.core.validators.MaxValueValidator(1440, "La durada ha d'estar entre 1 i 1440 minuts.")], verbose_name='Durada (minuts)'),
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 4.1.13 on 2026-10-18 22:19
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0009_event_duration_range'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DeletedEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('event_id', models.PositiveIntegerField(verbose_name='Esdeveniment')),
+                ('deleted_at', models.DateTimeField(db_index=True, default=django.utils.timezone.now, verbose_name="Data d'esborrat")),
+            ],
+            options={
+                'verbose_name': 'Esdeveniment esborrat',
+                'verbose_name_plural': 'Esdeveniments esborrats',
+            },
+        ),
+    ]
@@ -1,15 +1,34 @@
 # events/models.py
+from datetime import timedelta
+
 from django.db import models
 from django.conf import settings  # ← AÑADE ESTO
 from django.contrib.auth import get_user_model  # ← O ESTO
+from django.core.validators import MaxValueValidator, MinValueValidator
 from django.urls import reverse
 from django.utils import timezone
-import re
+
+from .streams import resolve_stream
 
 # OPCIÓN 1: Usar get_user_model() (RECOMENDADO)
 User = get_user_model()
 
 
+class Tag(models.Model):
+    """Etiqueta normalitzada; es manté sincronitzada amb Event.tags (events.tags)"""
+    name = models.CharField(max_length=50, unique=True, verbose_name="Nom")
+    label = models.CharField(max_length=50, verbose_name="Etiqueta")
+    event_count = models.PositiveIntegerField(default=0, db_index=True, verbose_name="Esdeveniments")
+
+    class Meta:
+        ordering = ['-event_count', 'name']
+        verbose_name = "Etiqueta"
+        verbose_name_plural = "Etiquetes"
+
+    def __str__(self):
+        return self.label
+
+
 class Event(models.Model):
     # Opciones para categorías
     CATEGORY_CHOICES = [
@@ -32,6 +51,13 @@ class Event(models.Model):
         ('cancelled', 'Cancel·lat'),
     ]
 
+    # Durada en minuts (per defecte i màxima)
+    DEFAULT_DURATION = 60
+    MAX_DURATION = 24 * 60
+
+    # Camps dels quals es recorda el valor carregat (from_db)
+    TRACKED_FIELDS = ('tags',)
+
     # Campos del modelo
     title = models.CharField(max_length=200, verbose_name="Títol")
     description = models.TextField(verbose_name="Descripció")
@@ -46,56 +72,92 @@ class Event(models.Model):
 
     category = models.CharField(max_length=20, choices=CATEGORY_CHOICES, default='gaming', verbose_name="Categoria")
     scheduled_date = models.DateTimeField(verbose_name="Data i hora programada")
+    duration = models.PositiveIntegerField(
+        default=DEFAULT_DURATION,
+        validators=[
+            MinValueValidator(1, f"La durada ha d'estar entre 1 i {MAX_DURATION} minuts."),
+            MaxValueValidator(MAX_DURATION, f"La durada ha d'estar entre 1 i {MAX_DURATION} minuts."),
+        ],
+        verbose_name="Durada (minuts)",
+    )
+    # scheduled_date + duration, calculat a save(); bulk_create i update() l'han de posar ells
+    ends_at = models.DateTimeField(null=True, editable=False, verbose_name="Data i hora de finalització")
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='scheduled', verbose_name="Estat")
     thumbnail = models.ImageField(upload_to='event_thumbnails/', blank=True, null=True, verbose_name="Miniatura")
     max_viewers = models.PositiveIntegerField(default=100, verbose_name="Màxim espectadors")
     is_featured = models.BooleanField(default=False, verbose_name="Destacat")
     tags = models.CharField(max_length=255, blank=True, verbose_name="Etiquetes")
+    tag_set = models.ManyToManyField(Tag, blank=True, editable=False, related_name='events',
+                                     verbose_name="Etiquetes normalitzades")
     stream_url = models.URLField(max_length=500, verbose_name="URL del stream")
+    # Calculats a save() a partir de stream_url (events.streams)
+    stream_provider = models.CharField(max_length=20, blank=True, editable=False, verbose_name="Proveïdor del stream")
+    stream_embed_url = models.URLField(max_length=500, blank=True, editable=False, verbose_name="URL per incrustar")
     created_at = models.DateTimeField(auto_now_add=True, verbose_name="Data de creació")
     updated_at = models.DateTimeField(auto_now=True, verbose_name="Data d'actualització")
 
     class Meta:
         ordering = ['-scheduled_date']
+        indexes = [
+            # Paginació per clau (events.pagination): (scheduled_date, pk) amb i sense filtre
+            models.Index(fields=['scheduled_date', 'id'], name='event_schedule_idx'),
+            models.Index(fields=['category', 'scheduled_date', 'id'], name='event_category_schedule_idx'),
+            models.Index(fields=['creator', 'scheduled_date', 'id'], name='event_creator_schedule_idx'),
+            # Facetes (events.facets): l'agregació per (categoria, estat) només llegeix l'índex
+            models.Index(fields=['category', 'status'], name='event_category_status_idx'),
+            # Rangs de dates per estat (events.calendar, filtres de dates i paginació per estat)
+            models.Index(fields=['status', 'scheduled_date', 'id'], name='event_status_schedule_idx'),
+            # Els en directe que ja s'han acabat, en directe ara (events.scheduler, events.calendar)
+            models.Index(fields=['status', 'ends_at'], name='event_status_ends_idx'),
+            # Canvis des d'una data (sincronització de l'índex de cerca, events.scheduler)
+            models.Index(fields=['updated_at'], name='event_updated_idx'),
+        ]
         verbose_name = "Esdeveniment"
         verbose_name_plural = "Esdeveniments"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Valors tal com es van carregar: les etiquetes no es tornen a sincronitzar si no canvien (events.signals)
+        instance._loaded_values = {field: instance.__dict__.get(field) for field in cls.TRACKED_FIELDS}
+        return instance
+
+    def save(self, *args, **kwargs):
+        # El proveïdor i la URL per incrustar es calculen una sola vegada, en desar
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None or 'stream_url' in update_fields:
+            self.stream_provider, self.stream_embed_url = resolve_stream(self.stream_url)
+            if update_fields is not None:
+                kwargs['update_fields'] = {*update_fields, 'stream_provider', 'stream_embed_url'}
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None or {'scheduled_date', 'duration'} & set(update_fields):
+            self.ends_at = self.get_ends_at()
+            if update_fields is not None:
+                kwargs['update_fields'] = {*update_fields, 'ends_at'}
+        super().save(*args, **kwargs)
+
     # Métodos (se mantienen igual)
     def get_absolute_url(self):
         return reverse('events:event_detail', kwargs={'pk': self.pk})
 
     def get_stream_embed_url(self):
-        """Convierte URL de YouTube/Twitch a embed"""
-        if not self.stream_url:
-            return ""
-
-        if 'youtube.com' in self.stream_url or 'youtu.be' in self.stream_url:
-            video_id = None
-            patterns = [
-                r'youtube\.com/watch\?v=([^&]+)',
-                r'youtu\.be/([^?]+)',
-                r'youtube\.com/embed/([^?]+)'
-            ]
-
-            for pattern in patterns:
-                match = re.search(pattern, self.stream_url)
-                if match:
-                    video_id = match.group(1)
-                    break
+        """URL per incrustar el stream (guardada; es calcula si la fila encara no la té)"""
+        if self.stream_embed_url or not self.stream_url:
+            return self.stream_embed_url
+        return resolve_stream(self.stream_url)[1]
 
-            if video_id:
-                return f"https://www.youtube.com/embed/{video_id}"
-
-        elif 'twitch.tv' in self.stream_url:
-            return self.stream_url.replace('twitch.tv/', 'twitch.tv/embed/')
-
-        return self.stream_url
+    def get_ends_at(self):
+        if self.scheduled_date is None:
+            return None
+        return self.scheduled_date + timedelta(minutes=self.duration or self.DEFAULT_DURATION)
 
     def get_tags_list(self):
-        """Convierte string de tags a lista"""
-        if self.tags:
-            return [tag.strip() for tag in self.tags.split(',') if tag.strip()]
-        return []
+        """Convierte string de tags a lista (es guarda mentre tags no canviï)"""
+        cached = self.__dict__.get('_tags_list')
+        if cached is None or cached[0] != self.tags:
+            tags = [tag.strip() for tag in self.tags.split(',') if tag.strip()] if self.tags else []
+            cached = self._tags_list = (self.tags, tags)
+        return cached[1]
 
     @property
     def is_upcoming(self):
@@ -105,9 +167,18 @@ class Event(models.Model):
     def is_live_now(self):
         return self.status == 'live'
 
-    @property
-    def duration(self):
-        return 60
+    def __str__(self):
+        return self.title
+
+
+class DeletedEvent(models.Model):
+    """Esdeveniment esborrat: els altres processos el treuen del seu índex de cerca (events.search)"""
+    event_id = models.PositiveIntegerField(verbose_name="Esdeveniment")
+    deleted_at = models.DateTimeField(default=timezone.now, db_index=True, verbose_name="Data d'esborrat")
+
+    class Meta:
+        verbose_name = "Esdeveniment esborrat"
+        verbose_name_plural = "Esdeveniments esborrats"
 
     def __str__(self):
-        return self.title
\ No newline at end of file
+        return f'{self.event_id} ({self.deleted_at:%Y-%m-%d %H:%M})'
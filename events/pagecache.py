@@ -0,0 +1,115 @@
+"""
+Memòria cau de pàgina sencera per als visitants anònims (llistat i categories).
+
+La clau és el camí més la query string normalitzada (paràmetres ordenats, sense els buits)
+i la generació de les pàgines. Totes les pàgines mostren els recomptes de cada categoria i
+estat i el núvol d'etiquetes, així que desar o esborrar qualsevol esdeveniment (o un canvi
+d'estat del planificador) incrementa la generació i les descarta totes. La generació és a
+la memòria cau per defecte: amb més d'un procés ha de ser compartida (events/checks.py).
+
+Quan una pàgina no hi és, només un procés la genera (``cache.add`` d'un bloqueig); els
+altres esperen fins a ``EVENT_PAGE_CACHE_LOCK_WAIT`` que aparegui i, si no, la generen
+sense desar-la.
+
+No es guarden mai les respostes d'usuaris autenticats, les que tenen missatges pendents
+(django.contrib.messages), les que no són 200 ni les que posen galetes.
+"""
+import functools
+import hashlib
+import time
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.contrib.messages import get_messages
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.utils.cache import patch_vary_headers
+from django.utils.translation import get_language
+
+CACHE_SECONDS = getattr(settings, 'EVENT_PAGE_CACHE_SECONDS', 300)
+LOCK_SECONDS = getattr(settings, 'EVENT_PAGE_CACHE_LOCK_SECONDS', 10)
+LOCK_WAIT = getattr(settings, 'EVENT_PAGE_CACHE_LOCK_WAIT', 2)
+LOCK_POLL = 0.05
+
+GENERATION_KEY = 'pagecache:generation'
+
+
+def invalidate_all():
+    """Descarta totes les pàgines guardades"""
+    try:
+        cache.incr(GENERATION_KEY)
+    except ValueError:
+        cache.set(GENERATION_KEY, time.time_ns(), None)
+
+
+def _generation():
+    generation = cache.get(GENERATION_KEY)
+    if generation is None:
+        # Si la generació s'ha perdut, una de nova evita tornar a trobar pàgines velles
+        cache.add(GENERATION_KEY, time.time_ns(), None)
+        generation = cache.get(GENERATION_KEY)
+    return generation
+
+
+def normalized_query(request):
+    """Query string amb els paràmetres ordenats i sense els buits"""
+    items = sorted(
+        (key, value) for key, values in request.GET.lists() for value in values if value.strip()
+    )
+    return urlencode(items)
+
+
+def _cacheable_request(request):
+    if request.method not in ('GET', 'HEAD') or request.user.is_authenticated:
+        return False
+    # len() no marca els missatges com a llegits
+    return not len(get_messages(request))
+
+
+def _cacheable_response(response):
+    return (
+        response.status_code == 200
+        and not response.cookies
+        and not getattr(response, 'streaming', False)
+    )
+
+
+def cache_anonymous_page(view):
+    """Decorador de vista: guarda la resposta sencera per als visitants anònims"""
+
+    @functools.wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if not _cacheable_request(request):
+            return view(request, *args, **kwargs)
+
+        signature = f'{request.path}?{normalized_query(request)}|{get_language()}'
+        page_key = 'pagecache:page:{}:{}'.format(hashlib.md5(signature.encode()).hexdigest(), _generation())
+
+        cached = cache.get(page_key)
+        if cached is None:
+            lock_key = page_key + ':lock'
+            if cache.add(lock_key, 1, LOCK_SECONDS):
+                try:
+                    response = view(request, *args, **kwargs)
+                    if _cacheable_response(response):
+                        cache.set(page_key, (response.content, response['Content-Type']), CACHE_SECONDS)
+                finally:
+                    cache.delete(lock_key)
+                response['X-Page-Cache'] = 'miss'
+                return response
+
+            # Un altre procés ja la genera: esperar-la en lloc de generar-la també
+            deadline = time.monotonic() + LOCK_WAIT
+            while cached is None and time.monotonic() < deadline:
+                time.sleep(LOCK_POLL)
+                cached = cache.get(page_key)
+            if cached is None:
+                return view(request, *args, **kwargs)
+
+        content, content_type = cached
+        response = HttpResponse(content, content_type=content_type)
+        response['X-Page-Cache'] = 'hit'
+        patch_vary_headers(response, ('Cookie',))
+        return response
+
+    return wrapper
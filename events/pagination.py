@@ -0,0 +1,131 @@
+"""
+Paginació per clau (keyset) dels llistats d'esdeveniments.
+
+En lloc de ``OFFSET`` (que obliga la base de dades a saltar totes les files de les pàgines
+anteriors) cada pàgina demana les files que van després de l'última de la pàgina
+anterior en l'ordre (``scheduled_date``, ``pk``), de manera que la pàgina 500 costa el
+mateix que la primera. La posició viatja en un cursor opac i signat (``?cursor=``).
+
+Els totals que es mostren són aproximats: ``approximate_count`` guarda el ``COUNT`` de
+cada consulta a la memòria cau ``EVENT_COUNT_CACHE_SECONDS``.
+"""
+import hashlib
+from datetime import datetime
+
+from django.conf import settings
+from django.core import signing
+from django.core.cache import cache
+from django.core.exceptions import EmptyResultSet
+from django.utils.functional import cached_property
+
+COUNT_CACHE_SECONDS = getattr(settings, 'EVENT_COUNT_CACHE_SECONDS', 60)
+
+CURSOR_SALT = 'events.pagination'
+NEXT = 'n'
+PREVIOUS = 'p'
+
+
+def approximate_count(queryset, timeout=COUNT_CACHE_SECONDS):
+    """``queryset.count()`` guardat a la memòria cau (pot anar endarrerit fins a ``timeout``)"""
+    try:
+        sql, params = queryset.query.sql_with_params()
+    except EmptyResultSet:
+        return 0
+    key = 'events:count:' + hashlib.md5(f'{sql}|{params!r}'.encode()).hexdigest()
+    count = cache.get(key)
+    if count is None:
+        count = queryset.count()
+        cache.set(key, count, timeout)
+    return count
+
+
+def encode_cursor(event, direction):
+    return signing.dumps([event.scheduled_date.isoformat(), event.pk, direction],
+                         salt=CURSOR_SALT, compress=True)
+
+
+def decode_cursor(token):
+    """(scheduled_date, pk, direction) o None si el cursor no és vàlid"""
+    try:
+        date, pk, direction = signing.loads(token, salt=CURSOR_SALT)
+        return datetime.fromisoformat(date), int(pk), direction
+    except (signing.BadSignature, TypeError, ValueError):
+        return None
+
+
+class KeysetPaginator:
+    """
+    Pagina un queryset d'Event del més nou al més antic (``-scheduled_date``, ``-pk``).
+    Els filtres del queryset es mantenen; l'ordre el posa el paginador.
+    """
+
+    def __init__(self, queryset, per_page):
+        self.queryset = queryset
+        self.per_page = per_page
+
+    def get_page(self, cursor=None):
+        """Pàgina del cursor (``?cursor=``); la primera si no n'hi ha o no és vàlid"""
+        position = decode_cursor(cursor) if cursor else None
+        if position is None:
+            rows = list(self.queryset.order_by('-scheduled_date', '-pk')[:self.per_page + 1])
+            return KeysetPage(self, rows[:self.per_page], has_next=len(rows) > self.per_page,
+                              has_previous=False)
+
+        # Rang sobre scheduled_date (que pot fer servir l'índex) i, dins de la mateixa data,
+        # el pk: amb un OR la base de dades recorreria l'índex des del principi
+        date, pk, direction = position
+        if direction == PREVIOUS:
+            after = self.queryset.filter(scheduled_date__gte=date).exclude(scheduled_date=date, pk__lte=pk)
+            rows = list(after.order_by('scheduled_date', 'pk')[:self.per_page + 1])
+            more = len(rows) > self.per_page
+            rows = rows[:self.per_page][::-1]
+            if not rows:
+                return self.get_page()
+            return KeysetPage(self, rows, has_next=True, has_previous=more)
+
+        before = self.queryset.filter(scheduled_date__lte=date).exclude(scheduled_date=date, pk__gte=pk)
+        rows = list(before.order_by('-scheduled_date', '-pk')[:self.per_page + 1])
+        return KeysetPage(self, rows[:self.per_page], has_next=len(rows) > self.per_page,
+                          has_previous=True)
+
+    @cached_property
+    def count(self):
+        return approximate_count(self.queryset)
+
+
+class KeysetPage:
+    """Pàgina de KeysetPaginator; es recorre com una Page de Django"""
+
+    cursor_based = True
+
+    def __init__(self, paginator, object_list, has_next, has_previous):
+        self.paginator = paginator
+        self.object_list = object_list
+        self._has_next = has_next
+        self._has_previous = has_previous
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def has_next(self):
+        return self._has_next and bool(self.object_list)
+
+    def has_previous(self):
+        return self._has_previous and bool(self.object_list)
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+    @cached_property
+    def next_cursor(self):
+        return encode_cursor(self.object_list[-1], NEXT) if self.has_next() else ''
+
+    @cached_property
+    def previous_cursor(self):
+        return encode_cursor(self.object_list[0], PREVIOUS) if self.has_previous() else ''
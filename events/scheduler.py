@@ -0,0 +1,167 @@
+"""
+Canvis d'estat automàtics segons l'hora: programat → en directe quan arriba
+``scheduled_date`` i en directe → finalitzat quan arriba ``ends_at``. Cada transició és
+una consulta per rang sobre (estat, data), amb els índexs ``event_status_schedule_idx`` i
+``event_status_ends_idx``.
+
+``apply_transitions`` fa cada transició amb ``update()`` per trossos de claus, sense
+carregar ni desar els esdeveniments un a un. Com que ``update()`` no envia els senyals de
+save, aquí mateix es descarten les pàgines, les facetes i els calendaris afectats i els
+buffers del xat dels que s'acaben, i es canvia l'estat a l'índex de cerca. ``updated_at`` passa a ser l'hora del canvi: les
+targetes guardades canvien de clau i els altres processos porten el canvi al seu índex de
+cerca. Les pàgines, facetes i calendaris es descarten a ``CACHES['default']``: com que la
+comanda corre en un altre procés que els servidors web, es nega a funcionar si aquesta
+memòria cau no és compartida (si no es passa ``--allow-local-cache``).
+
+``StatusScheduler`` (``update_event_statuses --daemon``) guarda en un heap les hores dels
+pròxims canvis (les de ``EVENT_STATUS_HORIZON_MINUTES`` endavant), dorm fins al primer i
+aleshores aplica les transicions. Cada ``EVENT_STATUS_POLL_SECONDS`` mira quins
+esdeveniments s'han desat des de l'última vegada (índex ``event_updated_idx``) per afegir
+les hores dels creats o reprogramats: no es recorre mai la col·lecció sencera.
+"""
+import heapq
+import logging
+import threading
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.utils import timezone
+
+from chat.cache import recent_messages
+from .calendar import invalidate_calendar
+from .facets import invalidate_facets
+from .models import Event
+from .pagecache import invalidate_all
+from .search import search_index
+
+logger = logging.getLogger('events.scheduler')
+
+POLL_SECONDS = getattr(settings, 'EVENT_STATUS_POLL_SECONDS', 1)
+HORIZON_MINUTES = getattr(settings, 'EVENT_STATUS_HORIZON_MINUTES', 60)
+
+# Claus per cada update (pk__in)
+CHUNK_SIZE = 500
+
+# Marge per als esdeveniments que es desen just mentre es consulta
+POLL_MARGIN = timedelta(seconds=1)
+
+# (estat d'origen, estat nou, camp amb l'hora del canvi), en ordre
+TRANSITIONS = (
+    ('scheduled', 'live', 'scheduled_date'),
+    ('live', 'finished', 'ends_at'),
+)
+
+
+def apply_transitions(now=None):
+    """Aplica els canvis d'estat pendents; retorna [(origen, destí, esdeveniments)]"""
+    now = now or timezone.now()
+    applied = []
+    for source, target, field in TRANSITIONS:
+        due = list(
+            Event.objects.filter(status=source, **{f'{field}__lte': now})
+            .order_by()
+            .values_list('pk', flat=True)
+        )
+        changed = 0
+        for start in range(0, len(due), CHUNK_SIZE):
+            pks = due[start:start + CHUNK_SIZE]
+            # status=source de nou: no es trepitja un canvi fet mentrestant
+            changed += Event.objects.filter(pk__in=pks, status=source).update(status=target, updated_at=now)
+        if due:
+            _expire(due, source, target)
+        applied.append((source, target, changed))
+    return applied
+
+
+def _expire(pks, source, target):
+    invalidate_all()
+    invalidate_facets()
+    invalidate_calendar()
+    if source == 'live':
+        # Com discard_ended_chat_buffer (chat.signals), que update() no dispara
+        recent_messages.expire(pks)
+    if search_index.ready:
+        search_index.set_status(pks, target)
+
+
+def next_transition(status, scheduled_date, ends_at):
+    """Hora del pròxim canvi automàtic d'un esdeveniment, o None si no en té"""
+    moments = {'scheduled_date': scheduled_date, 'ends_at': ends_at}
+    for source, _, field in TRANSITIONS:
+        if status == source:
+            return moments[field]
+    return None
+
+
+class StatusScheduler:
+    """Aplica les transicions a l'hora, amb un heap de les hores dels pròxims canvis"""
+
+    def __init__(self, poll_seconds=POLL_SECONDS, horizon_minutes=HORIZON_MINUTES):
+        self.poll = timedelta(seconds=poll_seconds)
+        self.horizon = timedelta(minutes=horizon_minutes)
+        self.stop = threading.Event()
+        self._heap = []
+        self._queued = set()
+        self._loaded_until = None
+        self._synced_at = None
+
+    def _push(self, moment):
+        if moment is not None and moment <= self._loaded_until and moment not in self._queued:
+            self._queued.add(moment)
+            heapq.heappush(self._heap, moment)
+
+    def load(self, now):
+        """Hores dels canvis fins a ``now + horizon``: una consulta per rang per transició"""
+        self._heap, self._queued = [], set()
+        self._loaded_until = now + self.horizon
+        for source, _, field in TRANSITIONS:
+            moments = Event.objects.filter(
+                status=source, **{f'{field}__gt': now, f'{field}__lte': self._loaded_until},
+            ).order_by().values_list(field, flat=True)
+            for moment in moments.iterator():
+                self._push(moment)
+        self._synced_at = now
+
+    def poll_changes(self, now):
+        """Afegeix les hores dels esdeveniments desats des de l'última consulta"""
+        changed = (
+            Event.objects.filter(updated_at__gte=self._synced_at - POLL_MARGIN)
+            .order_by()
+            .values_list('status', 'scheduled_date', 'ends_at')
+        )
+        for row in changed:
+            self._push(next_transition(*row))
+        self._synced_at = now
+
+    def run_once(self, now=None):
+        """Un pas del bucle; retorna les transicions aplicades (buida si no tocava cap)"""
+        now = now or timezone.now()
+        if self._loaded_until is None or now + self.horizon / 2 >= self._loaded_until:
+            self.load(now)
+            applied = apply_transitions(now)
+        else:
+            self.poll_changes(now)
+            applied = []
+            if self._heap and self._heap[0] <= now:
+                while self._heap and self._heap[0] <= now:
+                    self._queued.discard(heapq.heappop(self._heap))
+                applied = apply_transitions(now)
+        return [transition for transition in applied if transition[2]]
+
+    def seconds_to_wait(self, now=None):
+        now = now or timezone.now()
+        wait = self.poll
+        if self._heap:
+            wait = min(wait, self._heap[0] - now)
+        return max(wait.total_seconds(), 0)
+
+    def run(self, on_transition=None):
+        """Bucle fins que s'activa ``self.stop``"""
+        while not self.stop.is_set():
+            close_old_connections()
+            for source, target, count in self.run_once():
+                logger.info('%d esdeveniments: %s → %s', count, source, target)
+                if on_transition:
+                    on_transition(source, target, count)
+            self.stop.wait(self.seconds_to_wait())
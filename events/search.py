@@ -0,0 +1,481 @@
+"""
+Cercador d'esdeveniments amb un índex invertit en memòria.
+
+Indexa el títol, les etiquetes i la descripció de cada esdeveniment (amb més pes el
+títol i les etiquetes), ordena els resultats amb BM25 i tracta l'última paraula de la
+cerca com a prefix perquè funcioni mentre s'escriu. El text es normalitza per al català
+i el castellà: minúscules, sense accents, ``l·l`` com ``ll``, sense apòstrofs
+(``l'any`` → ``any``) i sense paraules buides.
+
+L'índex es manté al dia amb els senyals de desar i esborrar Event (events.signals) i,
+per als canvis fets en altres processos, cada ``EVENT_SEARCH_REFRESH_SECONDS`` es
+tornen a indexar els esdeveniments amb ``updated_at`` posterior a l'última sincronització.
+Els esborrats es llegeixen igual de ``DeletedEvent`` (una fila per esborrat, amb
+``deleted_at`` indexat). Les files es guarden ``EVENT_SEARCH_TOMBSTONE_DAYS`` (les
+descarta ``rebuild_search_index``); si l'índex és més vell, es compara amb totes les
+claus de la base de dades.
+
+La primera cerca del procés carrega la instantània de ``EVENT_SEARCH_INDEX_FILE`` (la
+genera la comanda ``rebuild_search_index``) o, si no n'hi ha, construeix l'índex des
+de la base de dades. Si la instantània canvia, els processos la tornen a carregar. La
+instantània és en format ``marshal`` (només dades, no executa codi en llegir-la com
+``pickle``) i depèn de la versió de Python: s'ha de generar amb la dels processos.
+"""
+import bisect
+import heapq
+import logging
+import marshal
+import math
+import os
+import re
+import threading
+import time
+import unicodedata
+from collections import Counter, OrderedDict
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+logger = logging.getLogger('events.search')
+
+INDEX_FILE = getattr(settings, 'EVENT_SEARCH_INDEX_FILE', None)
+REFRESH_SECONDS = getattr(settings, 'EVENT_SEARCH_REFRESH_SECONDS', 5)
+TOMBSTONE_DAYS = getattr(settings, 'EVENT_SEARCH_TOMBSTONE_DAYS', 7)
+
+# Pes de cada camp en la freqüència del terme
+FIELD_WEIGHTS = (('title', 3), ('tags', 2), ('description', 1))
+
+# Paràmetres de BM25
+K1 = 1.2
+B = 0.75
+
+# Termes que pot representar com a màxim un prefix (els més freqüents)
+MAX_PREFIX_TERMS = 50
+MIN_PREFIX_LENGTH = 2
+
+# Marge per als esdeveniments que es desen just mentre es sincronitza
+REFRESH_MARGIN_SECONDS = 1
+
+SNAPSHOT_VERSION = 2
+
+STOPWORDS = frozenset("""
+    a al als amb an cap com d de dels des del el els en entre es et hi i ja la les li lo
+    ma mes meu mi na ni no o per pero perque que se ses si sobre son sota su sus te ti tu
+    un una uns unes va y ya yo con las los para por sin este esta esto ese esa eso le les
+    lo mas muy pero como cuando donde su sus mi mis tu tus nos os
+""".split())
+
+WORD = re.compile(r'[^\W_]+')
+
+
+def fold(text):
+    """Minúscules i sense accents (``Intel·ligència`` → ``intelligencia``)"""
+    text = unicodedata.normalize('NFKD', text.lower().replace('·', ''))
+    return ''.join(char for char in text if not unicodedata.combining(char))
+
+
+def tokenize(text):
+    """Paraules normalitzades del text, sense paraules buides ni lletres soltes"""
+    return [
+        word for word in WORD.findall(fold(text or ''))
+        if len(word) > 1 and word not in STOPWORDS
+    ]
+
+
+def _frequencies(title, description, tags):
+    """Freqüència ponderada per camp de cada terme i llargada ponderada del document"""
+    fields = {'title': title, 'description': description, 'tags': tags}
+    frequencies = {}
+    length = 0
+    for field, weight in FIELD_WEIGHTS:
+        for word in tokenize(fields[field]):
+            frequencies[word] = frequencies.get(word, 0) + weight
+            length += weight
+    return frequencies, length
+
+
+class SearchIndex:
+    """Índex invertit: terme → {pk: freqüència ponderada}"""
+
+    # Cerques recents que es guarden per paginar-les sense tornar-les a calcular
+    max_cached_results = 128
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._postings = {}
+        self._terms = []  # Termes ordenats, per als prefixos
+        self._lengths = {}  # pk → llargada ponderada del document
+        self._doc_terms = {}  # pk → termes, per poder-lo treure
+        self._filters = {}  # pk → (categoria, estat)
+        self._total_length = 0
+        self._generation = 0  # Canvia amb cada modificació; invalida self._results
+        self._results = OrderedDict()
+        self.ready = False
+        self.synced_at = None
+        self._snapshot_mtime = None
+        self._refreshed = 0.0
+
+    def __len__(self):
+        return len(self._lengths)
+
+    # --- Manteniment -----------------------------------------------------------
+
+    def add(self, pk, title, description, tags, category, status):
+        """Indexa (o reindexa) un esdeveniment"""
+        frequencies, length = _frequencies(title, description, tags)
+        with self._lock:
+            self._remove(pk)
+            self._generation += 1
+            for word, frequency in frequencies.items():
+                postings = self._postings.get(word)
+                if postings is None:
+                    postings = self._postings[word] = {}
+                    bisect.insort(self._terms, word)
+                postings[pk] = frequency
+            self._lengths[pk] = length
+            self._doc_terms[pk] = tuple(frequencies)
+            self._filters[pk] = (category, status)
+            self._total_length += length
+
+    def add_event(self, event):
+        self.add(event.pk, event.title, event.description, event.tags, event.category, event.status)
+
+    def remove(self, pk):
+        with self._lock:
+            self._remove(pk)
+            self._generation += 1
+
+    def set_status(self, pks, status):
+        """Canvia l'estat dels esdeveniments indicats sense tornar-los a indexar"""
+        with self._lock:
+            filters = self._filters
+            for pk in pks:
+                if pk in filters:
+                    filters[pk] = (filters[pk][0], status)
+            self._generation += 1
+
+    def _remove(self, pk):
+        terms = self._doc_terms.pop(pk, None)
+        if terms is None:
+            return
+        for word in terms:
+            # Els termes buits es queden (amb {}) per no desordenar self._terms
+            self._postings[word].pop(pk, None)
+        self._total_length -= self._lengths.pop(pk)
+        del self._filters[pk]
+
+    # --- Cerca -----------------------------------------------------------------
+
+    def search(self, query, category=None, status=None):
+        """
+        Claus primàries dels esdeveniments que contenen totes les paraules de la cerca,
+        de més a menys rellevant (SearchResults). L'última paraula també troba els termes
+        que hi comencen.
+        """
+        words = tokenize(query)
+        if not words:
+            return SearchResults({})
+        prefix_last = not query[-1:].isspace() and len(words[-1]) >= MIN_PREFIX_LENGTH
+
+        # Les pàgines següents d'una mateixa cerca no la tornen a calcular
+        key = (tuple(words), prefix_last, category, status)
+        with self._lock:
+            cached = self._results.get(key)
+            if cached is not None and cached[0] == self._generation:
+                return cached[1]
+            results = self._search(words, prefix_last, category, status)
+            self._results[key] = (self._generation, results)
+            self._results.move_to_end(key)
+            if len(self._results) > self.max_cached_results:
+                self._results.popitem(last=False)
+        return results
+
+    def _search(self, words, prefix_last, category, status):
+        groups = []
+        for position, word in enumerate(words):
+            if prefix_last and position == len(words) - 1:
+                terms = self._expand(word)
+            else:
+                terms = [word] if self._postings.get(word) else []
+            if not terms:
+                return SearchResults({})
+            groups.append(terms)
+
+        candidates = self._match_all(groups)
+        if category or status:
+            filters = self._filters
+            candidates = [
+                pk for pk in candidates
+                if (not category or filters[pk][0] == category)
+                and (not status or filters[pk][1] == status)
+            ]
+        scores = self._score(candidates, groups)
+        return SearchResults(scores)
+
+    def _expand(self, prefix):
+        """Termes que comencen pel prefix, els més freqüents primer"""
+        terms = self._terms
+        position = bisect.bisect_left(terms, prefix)
+        found = []
+        while position < len(terms) and terms[position].startswith(prefix):
+            if self._postings[terms[position]]:
+                found.append(terms[position])
+            position += 1
+        if len(found) > MAX_PREFIX_TERMS:
+            found = sorted(found, key=lambda word: len(self._postings[word]), reverse=True)
+            found = found[:MAX_PREFIX_TERMS]
+        return found
+
+    def _match_all(self, groups):
+        """Esdeveniments que tenen algun terme de cada grup (de més petit a més gran)"""
+        candidates = None
+        for terms in sorted(groups, key=lambda terms: sum(len(self._postings[t]) for t in terms)):
+            if len(terms) == 1:
+                docs = self._postings[terms[0]].keys()
+            else:
+                docs = set().union(*(self._postings[word] for word in terms))
+            candidates = set(docs) if candidates is None else candidates.intersection(docs)
+            if not candidates:
+                break
+        return candidates
+
+    def _score(self, candidates, groups):
+        total_docs = len(self._lengths)
+        lengths = self._lengths
+        # norm(d) = K1 * (1 - B + B * llargada(d) / llargada mitjana)
+        base = K1 * (1 - B)
+        slope = K1 * B * total_docs / self._total_length if self._total_length else 0.0
+
+        if len(groups) == 1 and len(groups[0]) == 1:
+            # Un sol terme (el cas més habitual): tots els candidats són a les seves entrades
+            postings = self._postings[groups[0][0]]
+            weight = self._idf(len(postings), total_docs) * (K1 + 1)
+            if len(candidates) == len(postings):
+                matches = postings.items()
+            else:
+                matches = ((pk, postings[pk]) for pk in candidates)
+            return {
+                pk: weight * frequency / (frequency + base + slope * lengths[pk])
+                for pk, frequency in matches
+            }
+
+        scores = dict.fromkeys(candidates, 0.0)
+        for terms in groups:
+            for word in terms:
+                postings = self._postings[word]
+                weight = self._idf(len(postings), total_docs) * (K1 + 1)
+                if len(scores) < len(postings):
+                    matches = [(pk, postings[pk]) for pk in scores if pk in postings]
+                else:
+                    matches = [(pk, frequency) for pk, frequency in postings.items() if pk in scores]
+                for pk, frequency in matches:
+                    scores[pk] += weight * frequency / (frequency + base + slope * lengths[pk])
+        return scores
+
+    def narrow(self, results, category=None, status=None):
+        """Els resultats d'una cerca que són de la categoria i l'estat indicats"""
+        if not category and not status:
+            return results
+        filters = self._filters
+        with self._lock:
+            pks = {
+                pk for pk in results.pks()
+                if pk in filters
+                and (not category or filters[pk][0] == category)
+                and (not status or filters[pk][1] == status)
+            }
+        return results.restrict(pks)
+
+    def facet_pairs(self, pks):
+        """Recompte per (categoria, estat) dels esdeveniments indicats (events.facets)"""
+        filters = self._filters
+        with self._lock:
+            return Counter(filters[pk] for pk in pks if pk in filters)
+
+    @staticmethod
+    def _idf(document_frequency, total_docs):
+        return math.log(1 + (total_docs - document_frequency + 0.5) / (document_frequency + 0.5))
+
+    # --- Construcció i sincronització --------------------------------------------
+
+    def build(self, rows):
+        """Omple l'índex des de zero amb files (pk, title, description, tags, category, status)"""
+        fresh = SearchIndex()
+        postings = fresh._postings
+        for pk, title, description, tags, category, status in rows:
+            frequencies, length = _frequencies(title, description, tags)
+            for word, frequency in frequencies.items():
+                postings.setdefault(word, {})[pk] = frequency
+            fresh._lengths[pk] = length
+            fresh._doc_terms[pk] = tuple(frequencies)
+            fresh._filters[pk] = (category, status)
+            fresh._total_length += length
+        fresh._terms = sorted(postings)
+        self._replace(fresh._state())
+
+    def build_from_db(self):
+        from .models import Event
+        synced_at = timezone.now()
+        rows = Event.objects.values_list(
+            'pk', 'title', 'description', 'tags', 'category', 'status'
+        ).iterator(chunk_size=5000)
+        self.build(rows)
+        self.synced_at = synced_at
+        self.ready = True
+
+    def save(self, path):
+        """Desa una instantània (la llegeixen els processos en arrencar)"""
+        with self._lock:
+            state = self._state()
+        temporary = f'{path}.tmp'
+        state['synced_at'] = state['synced_at'].isoformat()
+        with open(temporary, 'wb') as handle:
+            marshal.dump((SNAPSHOT_VERSION, state), handle)
+        os.replace(temporary, path)
+
+    def load(self, path):
+        mtime = os.stat(path).st_mtime
+        with open(path, 'rb') as handle:
+            version, state = marshal.load(handle)
+        if version != SNAPSHOT_VERSION:
+            raise ValueError(f'Versió de l\'índex de cerca desconeguda: {version}')
+        state['synced_at'] = datetime.fromisoformat(state['synced_at'])
+        self._replace(state)
+        self._snapshot_mtime = mtime
+        self.ready = True
+
+    def ensure_ready(self):
+        """Carrega o construeix l'índex el primer cop i després el manté sincronitzat"""
+        if not self.ready:
+            with self._lock:
+                if not self.ready:
+                    self._initial_load()
+                    self._refreshed = time.monotonic()
+                    return
+        if REFRESH_SECONDS is not None and time.monotonic() - self._refreshed >= REFRESH_SECONDS:
+            self.refresh()
+
+    def refresh(self):
+        """Torna a carregar la instantània si ha canviat i porta el que s'ha desat o esborrat des d'aleshores"""
+        from .models import DeletedEvent, Event
+        with self._lock:
+            self._refreshed = time.monotonic()
+            if INDEX_FILE and self._snapshot_changed():
+                try:
+                    self.load(INDEX_FILE)
+                except Exception:
+                    # Es continua amb l'índex d'ara i no es torna a provar fins que el fitxer canviï
+                    logger.exception('No s\'ha pogut carregar l\'índex de cerca de %s', INDEX_FILE)
+                    self._snapshot_mtime = os.stat(INDEX_FILE).st_mtime
+
+            synced_at = timezone.now()
+            since = self.synced_at - timedelta(seconds=REFRESH_MARGIN_SECONDS)
+            changed = Event.objects.filter(updated_at__gte=since).order_by().values_list(
+                'pk', 'title', 'description', 'tags', 'category', 'status'
+            )
+            for row in changed:
+                self.add(*row)
+            if since < synced_at - timedelta(days=TOMBSTONE_DAYS):
+                # Potser ja s'han descartat files d'esborrats posteriors a l'índex
+                existing = set(Event.objects.values_list('pk', flat=True))
+                deleted = [pk for pk in self._lengths if pk not in existing]
+            else:
+                deleted = DeletedEvent.objects.filter(deleted_at__gte=since).values_list('event_id', flat=True)
+            for pk in deleted:
+                if pk in self._lengths:
+                    self.remove(pk)
+            self.synced_at = synced_at
+
+    def _initial_load(self):
+        if INDEX_FILE and os.path.exists(INDEX_FILE):
+            try:
+                self.load(INDEX_FILE)
+                self.refresh()
+                return
+            except Exception:
+                logger.exception('No s\'ha pogut carregar l\'índex de cerca de %s', INDEX_FILE)
+        self.build_from_db()
+
+    def _snapshot_changed(self):
+        try:
+            return os.stat(INDEX_FILE).st_mtime != self._snapshot_mtime
+        except OSError:
+            return False
+
+    def _state(self):
+        return {
+            'postings': self._postings,
+            'terms': self._terms,
+            'lengths': self._lengths,
+            'doc_terms': self._doc_terms,
+            'filters': self._filters,
+            'total_length': self._total_length,
+            'synced_at': self.synced_at,
+        }
+
+    def _replace(self, state):
+        with self._lock:
+            self._postings = state['postings']
+            self._terms = state['terms']
+            self._lengths = state['lengths']
+            self._doc_terms = state['doc_terms']
+            self._filters = state['filters']
+            self._total_length = state['total_length']
+            self.synced_at = state['synced_at']
+            self._generation += 1
+
+
+class SearchResults:
+    """
+    Resultats d'una cerca de més a menys rellevant. Es pot paginar com una llista, però
+    només s'ordenen els primers resultats que es demanen (una pàgina no ordena tot).
+    """
+
+    def __init__(self, scores):
+        self._scores = scores
+        self._ranked = []
+
+    def __len__(self):
+        return len(self._scores)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            stop = index.stop
+            if stop is None or stop < 0 or (index.start or 0) < 0:
+                stop = len(self._scores)
+        else:
+            stop = index + 1 if index >= 0 else len(self._scores)
+        self._rank(stop)
+        return self._ranked[index]
+
+    def __iter__(self):
+        self._rank(len(self._scores))
+        return iter(self._ranked)
+
+    def pks(self):
+        """Claus dels resultats, sense ordenar"""
+        return self._scores.keys()
+
+    def restrict(self, pks):
+        """Els resultats que són a ``pks`` (per combinar la cerca amb altres filtres)"""
+        return SearchResults({pk: score for pk, score in self._scores.items() if pk in pks})
+
+    def _rank(self, count):
+        if count <= len(self._ranked):
+            return
+        scores = self._scores
+        if count * 8 < len(scores):
+            self._ranked = heapq.nlargest(count, scores, key=scores.__getitem__)
+        else:
+            self._ranked = sorted(scores, key=scores.__getitem__, reverse=True)
+
+
+# Instància única del procés
+search_index = SearchIndex()
+
+
+def search_events(query, category=None, status=None):
+    """Claus primàries dels esdeveniments que coincideixen amb la cerca, per rellevància"""
+    search_index.ensure_ready()
+    return search_index.search(query, category=category, status=status)
@@ -0,0 +1,65 @@
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from .calendar import invalidate_calendar
+from .facets import invalidate_facets
+from .models import DeletedEvent, Event
+from .pagecache import invalidate_all
+from .search import search_index
+from .tags import release_event_tags, sync_event_tags
+
+
+@receiver(post_save, sender=Event)
+def index_event(sender, instance, **kwargs):
+    """Manté l'índex de cerca al dia (si encara no s'ha carregat, ja el llegirà de la base de dades)"""
+    if search_index.ready:
+        search_index.add_event(instance)
+
+
+@receiver(post_save, sender=Event)
+def sync_tags(sender, instance, created, raw=False, **kwargs):
+    """Manté Event.tag_set i els recomptes de Tag d'acord amb Event.tags"""
+    if raw:
+        return
+    unchanged = _loaded(instance, 'tags') == instance.tags
+    if (created and not instance.tags) or (not created and unchanged):
+        return
+    sync_event_tags(instance)
+
+
+@receiver(pre_delete, sender=Event)
+def release_tags(sender, instance, **kwargs):
+    release_event_tags(instance)
+
+
+@receiver(post_delete, sender=Event)
+def unindex_event(sender, instance, **kwargs):
+    if search_index.ready:
+        search_index.remove(instance.pk)
+    # Els altres processos el treuen del seu índex en la pròxima sincronització
+    DeletedEvent.objects.create(event_id=instance.pk)
+
+
+@receiver(post_save, sender=Event)
+@receiver(post_delete, sender=Event)
+def expire_facets(sender, **kwargs):
+    """Els recomptes de les facetes i els calendaris guardats deixen de valer"""
+    invalidate_facets()
+    invalidate_calendar()
+
+
+@receiver(post_save, sender=Event)
+@receiver(post_delete, sender=Event)
+def expire_pages(sender, **kwargs):
+    """Descarta les pàgines anònimes: totes mostren les facetes i el núvol d'etiquetes"""
+    invalidate_all()
+
+
+@receiver(post_save, sender=Event)
+def remember_values(sender, instance, **kwargs):
+    """Els valors desats passen a ser els carregats (per al següent save)"""
+    instance._loaded_values = {field: getattr(instance, field) for field in Event.TRACKED_FIELDS}
+
+
+def _loaded(instance, field):
+    return instance.__dict__.get('_loaded_values', {}).get(field)
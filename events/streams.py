@@ -0,0 +1,102 @@
+"""
+Proveïdors de streaming: a partir de la URL del stream, el proveïdor i la URL per incrustar-lo.
+
+Cada proveïdor té els seus patrons ja compilats. ``Event.save`` crida ``resolve_stream`` i
+guarda el resultat a ``Event.stream_provider`` i ``Event.stream_embed_url``, així les
+plantilles només llegeixen un camp. Per als esdeveniments que ja existien, la comanda
+``backfill_stream_embeds``.
+
+Per afegir un proveïdor (per exemple des de ``AppConfig.ready``)::
+
+    from events.streams import stream_providers
+
+    stream_providers.register(
+        'kick', [r'kick\\.com/(?P<id>[\\w-]+)'], 'https://player.kick.com/{id}',
+    )
+
+La plantilla rep els grups amb nom del patró que coincideix i ``url`` (la URL original).
+Els esdeveniments ja desats no canvien fins que es tornen a desar o es torna a executar
+``backfill_stream_embeds --all``.
+"""
+import re
+import threading
+
+MAX_PROVIDER_LENGTH = 20
+
+
+class StreamProvider:
+    def __init__(self, name, patterns, embed):
+        self.name = name
+        self.patterns = [re.compile(pattern, re.IGNORECASE) for pattern in patterns]
+        self.embed = embed
+
+    def match(self, url):
+        """URL per incrustar, o None si la URL no és d'aquest proveïdor"""
+        for pattern in self.patterns:
+            match = pattern.search(url)
+            if match:
+                return self.embed.format(url=url, **match.groupdict())
+        return None
+
+
+class StreamProviderRegistry:
+    """Proveïdors en ordre de registre; el primer que reconeix la URL guanya"""
+
+    def __init__(self):
+        self._providers = {}
+        self._lock = threading.Lock()
+
+    def register(self, name, patterns, embed):
+        if len(name) > MAX_PROVIDER_LENGTH:
+            raise ValueError(f'El nom del proveïdor no pot passar de {MAX_PROVIDER_LENGTH} caràcters')
+        with self._lock:
+            providers = dict(self._providers)
+            providers[name] = StreamProvider(name, patterns, embed)
+            self._providers = providers
+
+    def unregister(self, name):
+        with self._lock:
+            providers = dict(self._providers)
+            providers.pop(name, None)
+            self._providers = providers
+
+    def __iter__(self):
+        return iter(self._providers.values())
+
+    def resolve(self, url):
+        """(proveïdor, URL per incrustar); ('', url) si cap proveïdor la reconeix"""
+        if not url:
+            return '', ''
+        for provider in self._providers.values():
+            embed = provider.match(url)
+            if embed:
+                return provider.name, embed
+        return '', url
+
+
+# Instància única del procés
+stream_providers = StreamProviderRegistry()
+
+stream_providers.register(
+    'youtube',
+    [
+        r'youtube\.com/watch\?(?:[^#]*&)?v=(?P<id>[^&#]+)',
+        r'youtu\.be/(?P<id>[^?&#/]+)',
+        r'youtube\.com/(?:embed|live|shorts)/(?P<id>[^?&#/]+)',
+    ],
+    'https://www.youtube.com/embed/{id}',
+)
+stream_providers.register(
+    'twitch',
+    [r'^(?P<base>.*?twitch\.tv/)(?:embed/)?(?P<path>.+)$'],
+    '{base}embed/{path}',
+)
+stream_providers.register(
+    'vimeo',
+    [r'vimeo\.com/(?:video/)?(?P<id>\d+)'],
+    'https://player.vimeo.com/video/{id}',
+)
+
+
+def resolve_stream(url):
+    return stream_providers.resolve(url)
@@ -0,0 +1,138 @@
+"""
+Etiquetes normalitzades dels esdeveniments.
+
+``Event.tags`` continua sent el text que escriu el creador ("Música, Indie"), però cada
+etiqueta també es guarda una sola vegada com a ``Tag`` (nom normalitzat únic i indexat)
+enllaçada amb ``Event.tag_set``. Així filtrar per etiqueta és una cerca exacta per índex
+("art" no troba "party") i ``Tag.event_count`` porta el recompte per al núvol d'etiquetes.
+
+Els senyals de Event (events.signals) criden ``sync_event_tags`` i ``release_event_tags``.
+Els canvis que no els disparen (``bulk_create``, ``update()``) es reparen amb la comanda
+``rebuild_tags``.
+"""
+import re
+from collections import Counter
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F
+
+from .models import Event, Tag
+from .pagecache import invalidate_all
+
+TAG_CLOUD_SIZE = getattr(settings, 'EVENT_TAG_CLOUD_SIZE', 20)
+TAG_CLOUD_SECONDS = getattr(settings, 'EVENT_TAG_CLOUD_SECONDS', 300)
+
+TOP_TAGS_CACHE_KEY = 'events:top_tags'
+
+MAX_TAG_LENGTH = Tag._meta.get_field('name').max_length
+
+SPACES = re.compile(r'\s+')
+
+
+def normalize_tag(label):
+    """Nom únic d'una etiqueta: minúscules, sense '#' inicial i amb un sol espai entre paraules"""
+    return SPACES.sub(' ', label.strip().lstrip('#').strip().lower())[:MAX_TAG_LENGTH]
+
+
+def parse_tags(text):
+    """{nom normalitzat: etiqueta} de les etiquetes separades per comes, sense repetides"""
+    tags = {}
+    for label in (text or '').split(','):
+        name = normalize_tag(label)
+        if name and name not in tags:
+            tags[name] = SPACES.sub(' ', label.strip().lstrip('#').strip())[:MAX_TAG_LENGTH]
+    return tags
+
+
+def sync_event_tags(event):
+    """Enllaça l'esdeveniment amb les etiquetes de ``event.tags`` i actualitza els recomptes"""
+    wanted = parse_tags(event.tags)
+    current = dict(event.tag_set.values_list('name', 'pk'))
+    added = [name for name in wanted if name not in current]
+    removed = [pk for name, pk in current.items() if name not in wanted]
+    if not added and not removed:
+        return
+
+    with transaction.atomic():
+        if added:
+            tags = [Tag.objects.get_or_create(name=name, defaults={'label': wanted[name]})[0]
+                    for name in added]
+            event.tag_set.add(*tags)
+            Tag.objects.filter(pk__in=[tag.pk for tag in tags]).update(event_count=F('event_count') + 1)
+        if removed:
+            event.tag_set.remove(*removed)
+            Tag.objects.filter(pk__in=removed, event_count__gt=0).update(event_count=F('event_count') - 1)
+    cache.delete(TOP_TAGS_CACHE_KEY)
+
+
+def release_event_tags(event):
+    """Descompta les etiquetes d'un esdeveniment que s'esborrarà"""
+    tag_ids = list(event.tag_set.values_list('pk', flat=True))
+    if tag_ids:
+        Tag.objects.filter(pk__in=tag_ids, event_count__gt=0).update(event_count=F('event_count') - 1)
+        cache.delete(TOP_TAGS_CACHE_KEY)
+
+
+def rebuild_tags(batch_size=2000):
+    """
+    Torna a generar tots els enllaços i recomptes a partir de ``Event.tags``.
+    Retorna (esdeveniments, etiquetes).
+    """
+    links = {}
+    labels = {}
+    for pk, text in Event.objects.values_list('pk', 'tags').iterator(chunk_size=batch_size):
+        tags = parse_tags(text)
+        links[pk] = list(tags)
+        for name, label in tags.items():
+            labels.setdefault(name, label)
+
+    counts = Counter(name for names in links.values() for name in names)
+    Through = Event.tag_set.through
+
+    with transaction.atomic():
+        existing = dict(Tag.objects.values_list('name', 'pk'))
+        Tag.objects.bulk_create(
+            [Tag(name=name, label=labels[name]) for name in labels if name not in existing],
+            batch_size=batch_size,
+        )
+        tag_ids = dict(Tag.objects.values_list('name', 'pk'))
+
+        Through.objects.all().delete()
+        Through.objects.bulk_create(
+            (Through(event_id=pk, tag_id=tag_ids[name]) for pk, names in links.items() for name in names),
+            batch_size=batch_size,
+        )
+
+        tags = list(Tag.objects.all())
+        for tag in tags:
+            tag.event_count = counts.get(tag.name, 0)
+        Tag.objects.bulk_update(tags, ['event_count'], batch_size=batch_size)
+
+    cache.delete(TOP_TAGS_CACHE_KEY)
+    # Sense senyals de Event: les pàgines guardades encara mostren el núvol d'abans
+    invalidate_all()
+    return len(links), len(counts)
+
+
+def top_tags(limit=TAG_CLOUD_SIZE):
+    """
+    Les etiquetes amb més esdeveniments, [(nom, etiqueta, recompte)]. Es llegeixen de
+    ``Tag.event_count`` (indexat) i es guarden a la memòria cau ``TAG_CLOUD_SECONDS``.
+    """
+    tags = cache.get(TOP_TAGS_CACHE_KEY)
+    if tags is None:
+        tags = list(
+            Tag.objects.filter(event_count__gt=0)
+            .order_by('-event_count', 'name')
+            .values_list('name', 'label', 'event_count')[:TAG_CLOUD_SIZE]
+        )
+        cache.set(TOP_TAGS_CACHE_KEY, tags, TAG_CLOUD_SECONDS)
+    return tags[:limit]
+
+
+def get_tag(label):
+    """Tag amb aquest nom (normalitzat), o None"""
+    name = normalize_tag(label)
+    return Tag.objects.filter(name=name).first() if name else None
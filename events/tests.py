@@ -1,3 +1,561 @@
-from django.test import TestCase
+import os
+import tempfile
+from datetime import datetime, timedelta
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core import signing
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from chat.cache import RecentMessageCache, recent_messages
+from config.querybudget import max_queries
+from config.seeding import default_workers
+from .calendar import calendar, calendar_window, live_or_starting
+from .checks import check_invalidation_cache
+from .scheduler import apply_transitions
+from .forms import EventCreationForm, EventUpdateForm
+from .models import DeletedEvent, Event, Tag
+from .pagination import CURSOR_SALT, KeysetPaginator, approximate_count, decode_cursor
+from .search import SearchIndex, search_events
+from .streams import StreamProviderRegistry, resolve_stream, stream_providers
+from .tags import get_tag, normalize_tag, parse_tags, rebuild_tags, top_tags
+from .views import event_detail_view, event_list_view
+
+User = get_user_model()
+
+
+class EventTestCase(TestCase):
+    """Uns quants esdeveniments de categories i estats diferents, amb les memòries cau buides"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='marta', password='secret')
+        cls.torneig = cls.create_event('Torneig de Valorant', category='gaming', status='live')
+        cls.concert = cls.create_event('Concert de música indie', category='music', status='scheduled')
+        cls.final = cls.create_event('Final del torneig de música', category='music', status='finished')
+
+    @classmethod
+    def create_event(cls, title, **fields):
+        fields.setdefault('scheduled_date', timezone.now())
+        fields.setdefault('stream_url', 'https://www.twitch.tv/prova')
+        return Event.objects.create(title=title, description=f'{title}: descripció', creator=cls.user, **fields)
+
+    def setUp(self):
+        cache.clear()
+
+
+class SearchIndexTests(EventTestCase):
+
+    def test_refresh_drops_events_deleted_in_other_processes(self):
+        index = SearchIndex()
+        index.build_from_db()
+        self.assertEqual(set(index.search('torneig').pks()), {self.torneig.pk, self.final.pk})
+
+        # Un altre procés (l'índex d'aquest no rep el senyal) n'esborra un i en crea un altre:
+        # el total no canvia
+        Event.objects.filter(pk=self.final.pk).delete()
+        created = self.create_event('Torneig de tardor', category='gaming')
+        index.refresh()
+        self.assertEqual(set(index.search('torneig').pks()), {self.torneig.pk, created.pk})
+        self.assertEqual(len(index), 3)
+
+    def test_refresh_keeps_the_index_if_the_snapshot_is_unreadable(self):
+        index = SearchIndex()
+        index.build_from_db()
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'search.idx')
+            with open(path, 'wb') as handle:
+                handle.write(b'no marshal')
+            with mock.patch('events.search.INDEX_FILE', path), self.assertLogs('events.search', 'ERROR'):
+                index.refresh()
+            self.assertEqual(len(index), 3)
+            with mock.patch('events.search.INDEX_FILE', path), mock.patch.object(index, 'load') as load:
+                index.refresh()
+            load.assert_not_called()
+
+    def test_old_index_is_compared_with_every_event(self):
+        # Més vell que els esborrats que es guarden: no n'hi ha prou amb DeletedEvent
+        index = SearchIndex()
+        index.build_from_db()
+        Event.objects.filter(pk=self.final.pk).delete()
+        DeletedEvent.objects.all().delete()
+        index.synced_at -= timedelta(days=30)
+        index.refresh()
+        self.assertEqual(set(index.search('torneig').pks()), {self.torneig.pk})
+
+    def test_snapshot_round_trip(self):
+        index = SearchIndex()
+        index.build_from_db()
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'search.idx')
+            index.save(path)
+            loaded = SearchIndex()
+            loaded.load(path)
+        self.assertEqual(loaded.synced_at, index.synced_at)
+        self.assertEqual(list(loaded.search('music')), list(index.search('music')))
+        self.assertEqual(loaded.facet_pairs(loaded.search('music').pks()),
+                         index.facet_pairs(index.search('music').pks()))
+
+    def test_list_searches_once_per_request(self):
+        with mock.patch('events.views.search_events', wraps=search_events) as search:
+            response = self.client.get(reverse('events:event_list'), {'search': 'torneig', 'category': 'music'})
+        self.assertEqual(search.call_count, 1)
+        self.assertEqual([event.pk for event in response.context['page_obj'].object_list], [self.final.pk])
+        # Les facetes es compten amb tots els resultats de la cerca
+        counts = {value: count for value, _, count in response.context['facets'].categories}
+        self.assertEqual((counts['gaming'], counts['music']), (1, 1))
+
+
+class KeysetPaginatorTests(EventTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        # Set esdeveniments a la mateixa hora: l'ordre dins de la data el dona el pk
+        moment = timezone.now() - timedelta(days=1)
+        cls.tied = [cls.create_event(f'Empat {number}', scheduled_date=moment) for number in range(7)]
+
+    def walk(self, paginator):
+        """Totes les pàgines endavant i, des de l'última, endarrere"""
+        pages = [paginator.get_page()]
+        while pages[-1].has_next():
+            pages.append(paginator.get_page(pages[-1].next_cursor))
+        backwards = [pages[-1]]
+        while backwards[-1].has_previous():
+            backwards.append(paginator.get_page(backwards[-1].previous_cursor))
+        return [[event.pk for event in page] for page in pages], [[event.pk for event in page] for page in backwards]
+
+    def test_ties_on_scheduled_date(self):
+        expected = list(Event.objects.order_by('-scheduled_date', '-pk').values_list('pk', flat=True))
+        for per_page in (2, 3, 4):
+            with self.subTest(per_page=per_page):
+                forward, backwards = self.walk(KeysetPaginator(Event.objects.all(), per_page))
+                self.assertEqual(sum(forward, []), expected)
+                self.assertEqual(backwards, forward[::-1])
+
+    def test_filters_are_kept(self):
+        forward, _ = self.walk(KeysetPaginator(Event.objects.filter(title__startswith='Empat'), 3))
+        self.assertEqual(sum(forward, []), [event.pk for event in reversed(self.tied)])
+
+    def test_cursor_is_signed(self):
+        paginator = KeysetPaginator(Event.objects.all(), 3)
+        cursor = paginator.get_page().next_cursor
+        self.assertIsNotNone(decode_cursor(cursor))
+
+        tampered = cursor[:-1] + ('A' if cursor[-1] != 'A' else 'B')
+        forged = signing.dumps(['2000-01-01T00:00:00+00:00', 1, 'n'], salt='un altre')
+        garbage = signing.dumps(['ahir', 1, 'n'], salt=CURSOR_SALT)
+        first = [event.pk for event in paginator.get_page()]
+        for token in (tampered, forged, garbage, 'no-és-un-cursor'):
+            with self.subTest(token=token):
+                self.assertIsNone(decode_cursor(token))
+                # Un cursor dolent torna a la primera pàgina
+                self.assertEqual([event.pk for event in paginator.get_page(token)], first)
+
+    def test_approximate_count(self):
+        queryset = Event.objects.filter(title__startswith='Empat')
+        self.assertEqual(approximate_count(queryset), 7)
+        self.create_event('Empat de més')
+        # Guardat a la memòria cau fins que caduca
+        self.assertEqual(approximate_count(queryset), 7)
+        cache.clear()
+        self.assertEqual(approximate_count(queryset), 8)
+        # Sense SQL possible (pk__in buit, none()): zero sense consultar
+        with self.assertNumQueries(0):
+            self.assertEqual(approximate_count(Event.objects.filter(pk__in=[])), 0)
+            self.assertEqual(approximate_count(Event.objects.none()), 0)
+
+
+class PageCacheTests(EventTestCase):
+
+    def get_list(self):
+        response = self.client.get(reverse('events:event_list'))
+        return response['X-Page-Cache'], response.content.decode()
+
+    def test_saving_or_deleting_an_event_replaces_the_cached_list(self):
+        self.assertEqual(self.get_list()[0], 'miss')
+        self.assertEqual(self.get_list()[0], 'hit')
+
+        self.concert.title = 'Concert ajornat'
+        self.concert.save()
+        state, content = self.get_list()
+        self.assertEqual(state, 'miss')
+        self.assertIn('Concert ajornat', content)
+        self.assertEqual(self.get_list()[0], 'hit')
+
+        self.concert.delete()
+        state, content = self.get_list()
+        self.assertEqual(state, 'miss')
+        self.assertNotIn('Concert ajornat', content)
+
+    def test_any_change_replaces_the_pages_of_every_category(self):
+        # Totes les pàgines mostren els recomptes de cada categoria i estat
+        url = reverse('events:event_list')
+        self.client.get(url, {'category': 'music'})
+        self.create_event('Segon torneig', category='gaming', status='live')
+        response = self.client.get(url, {'category': 'music'})
+        self.assertEqual(response['X-Page-Cache'], 'miss')
+        counts = {value: count for value, _, count in response.context['facets'].categories}
+        self.assertEqual(counts['gaming'], 2)
+
+        # També els canvis d'estat del planificador, que fan update() sense senyals
+        apply_transitions(timezone.now() + timedelta(days=2))
+        response = self.client.get(url, {'category': 'music'})
+        self.assertEqual(response['X-Page-Cache'], 'miss')
+        counts = {value: count for value, _, count in response.context['facets'].statuses}
+        self.assertEqual(counts['live'], 0)
+
+    def test_several_processes_need_a_shared_cache(self):
+        self.assertEqual(check_invalidation_cache(None), [])
+        with override_settings(WEB_PROCESSES=4):
+            self.assertEqual([error.id for error in check_invalidation_cache(None)], ['events.E001'])
+
+
+class QueryBudgetTests(EventTestCase):
+    """Les vistes no passen del pressupost que declaren amb @query_budget"""
+
+    def test_event_list(self):
+        url = reverse('events:event_list')
+        for params in ({}, {'category': 'music'}, {'search': 'torneig', 'status': 'live'}):
+            cache.clear()
+            with max_queries(event_list_view.query_budget):
+                self.client.get(url, params)
+        # Autenticat: sense la memòria cau de pàgines
+        self.client.force_login(self.user)
+        with max_queries(event_list_view.query_budget):
+            self.client.get(url)
+
+    def test_event_detail(self):
+        url = reverse('events:event_detail', args=[self.torneig.pk])
+        with max_queries(event_detail_view.query_budget):
+            self.assertEqual(self.client.get(url).status_code, 200)
+        self.client.force_login(self.user)
+        with max_queries(event_detail_view.query_budget):
+            self.assertEqual(self.client.get(url).status_code, 200)
+
+    def test_streaming_queries_are_counted_without_header(self):
+        with mock.patch('config.querybudget.RESPONSE_HEADER', True):
+            response = self.client.get(reverse('events:event_list'))
+            self.assertIn('X-Query-Count', response)
+            response = self.client.get(reverse('events:event_export_api'))
+            self.assertNotIn('X-Query-Count', response)
+            with self.assertLogs('querybudget', 'DEBUG') as logs:
+                b''.join(response.streaming_content)
+        self.assertIn('event_export_api: 1 consultes', logs.output[-1])
+
+
+class UpdateEventStatusesTests(EventTestCase):
+
+    def test_refuses_a_cache_the_web_processes_cannot_see(self):
+        with self.assertRaisesMessage(CommandError, '--allow-local-cache'):
+            call_command('update_event_statuses', stdout=StringIO())
+
+        output = StringIO()
+        call_command('update_event_statuses', allow_local_cache=True, stdout=output)
+        self.assertIn('Actualitzats', output.getvalue())
+
+    def test_finished_events_drop_their_chat_buffer(self):
+        recent_messages.clear()
+        self.addCleanup(recent_messages.clear)
+        other_process = RecentMessageCache()
+        for buffers in (recent_messages, other_process):
+            self.assertIsNotNone(buffers.state(self.torneig.pk))
+
+        apply_transitions(timezone.now() + timedelta(days=2))
+        for buffers in (recent_messages, other_process):
+            self.assertIsNone(buffers.state(self.torneig.pk))
+
+
+class EventFormTests(EventTestCase):
+
+    def form_data(self, duration):
+        return {
+            'title': 'Nou directe', 'description': 'Prova', 'category': 'talk', 'status': 'scheduled',
+            'scheduled_date': (timezone.now() + timedelta(days=1)).strftime('%Y-%m-%dT%H:%M'),
+            'duration': duration, 'max_viewers': 10, 'stream_url': 'https://www.twitch.tv/prova',
+        }
+
+    def test_duration_must_be_between_1_and_max(self):
+        for form in (EventCreationForm(self.form_data(1)),
+                     EventUpdateForm(self.form_data(Event.MAX_DURATION), instance=self.concert)):
+            self.assertTrue(form.is_valid(), form.errors)
+        for duration in (0, Event.MAX_DURATION + 1):
+            for form in (EventCreationForm(self.form_data(duration)),
+                         EventUpdateForm(self.form_data(duration), instance=self.concert)):
+                self.assertFalse(form.is_valid())
+                self.assertIn('duration', form.errors)
+
+
+class StreamProviderTests(EventTestCase):
+
+    def test_known_providers(self):
+        cases = [
+            ('https://www.youtube.com/watch?v=abc123&t=10', ('youtube', 'https://www.youtube.com/embed/abc123')),
+            ('https://youtu.be/abc123?si=x', ('youtube', 'https://www.youtube.com/embed/abc123')),
+            ('https://www.youtube.com/live/abc123', ('youtube', 'https://www.youtube.com/embed/abc123')),
+            ('https://www.twitch.tv/prova', ('twitch', 'https://www.twitch.tv/embed/prova')),
+            ('https://www.twitch.tv/embed/prova', ('twitch', 'https://www.twitch.tv/embed/prova')),
+            ('https://VIMEO.com/123456', ('vimeo', 'https://player.vimeo.com/video/123456')),
+            ('https://example.com/directe', ('', 'https://example.com/directe')),
+            ('', ('', '')),
+        ]
+        for url, expected in cases:
+            with self.subTest(url=url):
+                self.assertEqual(resolve_stream(url), expected)
+
+    def test_registry(self):
+        registry = StreamProviderRegistry()
+        registry.register('kick', [r'kick\.com/(?P<id>[\w-]+)'], 'https://player.kick.com/{id}')
+        registry.register('tot', [r'(?P<rest>.+)'], '{url}#tot')
+        # El primer registrat que la reconeix guanya
+        self.assertEqual(registry.resolve('https://kick.com/prova'), ('kick', 'https://player.kick.com/prova'))
+        self.assertEqual(registry.resolve('https://a.cat/x'), ('tot', 'https://a.cat/x#tot'))
+        registry.unregister('kick')
+        self.assertEqual(registry.resolve('https://kick.com/prova')[0], 'tot')
+        with self.assertRaises(ValueError):
+            registry.register('x' * 21, [r'x'], '{url}')
+
+    def test_save_stores_provider_and_embed(self):
+        event = self.create_event('Vimeo', stream_url='https://vimeo.com/42')
+        self.assertEqual((event.stream_provider, event.stream_embed_url),
+                         ('vimeo', 'https://player.vimeo.com/video/42'))
+        # Només es recalcula si es desa stream_url
+        event.stream_url = 'https://youtu.be/xyz'
+        event.save(update_fields=['title'])
+        event.refresh_from_db()
+        self.assertEqual(event.stream_provider, 'vimeo')
+        event.stream_url = 'https://youtu.be/xyz'
+        event.save(update_fields=['stream_url'])
+        event.refresh_from_db()
+        self.assertEqual((event.stream_provider, event.stream_embed_url),
+                         ('youtube', 'https://www.youtube.com/embed/xyz'))
+
+    def test_backfill_stream_embeds(self):
+        # Files d'abans de guardar-ho i un proveïdor nou
+        Event.objects.filter(pk=self.torneig.pk).update(stream_provider='', stream_embed_url='')
+        updated_at = Event.objects.get(pk=self.torneig.pk).updated_at
+        call_command('backfill_stream_embeds', stdout=StringIO())
+        event = Event.objects.get(pk=self.torneig.pk)
+        self.assertEqual(event.stream_embed_url, 'https://www.twitch.tv/embed/prova')
+        self.assertEqual(event.updated_at, updated_at)
+
+        # Un proveïdor afegit després: només --all torna a calcular els que ja en tenen
+        kick = self.create_event('Kick', stream_url='https://kick.com/prova')
+        self.assertEqual(kick.stream_provider, '')
+        stream_providers.register('kick', [r'kick\.com/(?P<id>[\w-]+)'], 'https://player.kick.com/{id}')
+        self.addCleanup(stream_providers.unregister, 'kick')
+        call_command('backfill_stream_embeds', stdout=StringIO())
+        self.assertEqual(Event.objects.get(pk=kick.pk).stream_provider, '')
+        output = StringIO()
+        call_command('backfill_stream_embeds', all=True, stdout=output)
+        self.assertEqual(Event.objects.values_list('stream_provider', 'stream_embed_url').get(pk=kick.pk),
+                         ('kick', 'https://player.kick.com/prova'))
+        self.assertIn('1 esdeveniments actualitzats', output.getvalue())
+
+
+class CalendarTests(EventTestCase):
+
+    @staticmethod
+    def local(*args):
+        return timezone.make_aware(datetime(*args))
+
+    def test_window_is_aligned_and_capped(self):
+        start, end = calendar_window(self.local(2030, 6, 4, 15, 30), None, 'day')
+        self.assertEqual((start, end), (self.local(2030, 6, 4), self.local(2030, 6, 11)))
+        start, end = calendar_window(self.local(2030, 6, 4, 15, 30), self.local(2030, 6, 4, 18, 10), 'hour')
+        self.assertEqual((start, end), (self.local(2030, 6, 4, 15), self.local(2030, 6, 4, 19)))
+        # Com a molt 62 dies, i almenys un interval
+        _, end = calendar_window(self.local(2030, 1, 1), self.local(2031, 1, 1), 'day')
+        self.assertEqual(end, self.local(2030, 3, 4))
+        _, end = calendar_window(self.local(2030, 6, 4), self.local(2030, 6, 1), 'day')
+        self.assertEqual(end, self.local(2030, 6, 5))
+
+    def test_daylight_saving_changes(self):
+        # 29 de març de 2026: a Madrid les 2:00 passen a ser les 3:00
+        buckets = calendar(*calendar_window(self.local(2026, 3, 28), self.local(2026, 3, 31), 'day'), 'day')
+        self.assertEqual([bucket['start'] for bucket in buckets],
+                         ['2026-03-28T00:00:00+01:00', '2026-03-29T00:00:00+01:00', '2026-03-30T00:00:00+02:00'])
+        buckets = calendar(*calendar_window(self.local(2026, 3, 29, 1), self.local(2026, 3, 29, 4), 'hour'), 'hour')
+        self.assertEqual([bucket['start'] for bucket in buckets],
+                         ['2026-03-29T01:00:00+01:00', '2026-03-29T03:00:00+02:00'])
+
+    def test_events_are_grouped_by_bucket(self):
+        day = self.local(2030, 6, 4)
+        self.create_event('Matí', scheduled_date=day + timedelta(hours=9), category='music', status='scheduled')
+        self.create_event('Nit', scheduled_date=day + timedelta(hours=23, minutes=59), status='scheduled')
+        self.create_event('Demà', scheduled_date=day + timedelta(days=1), status='scheduled')
+        self.create_event('Esborrany', scheduled_date=day + timedelta(hours=10), status='draft')
+
+        buckets = calendar(day, day + timedelta(days=3))
+        self.assertEqual([bucket['count'] for bucket in buckets], [2, 1, 0])
+        self.assertEqual([event['title'] for event in buckets[0]['events']], ['Matí', 'Nit'])
+        self.assertEqual(calendar(day, day + timedelta(days=3), category='music')[0]['count'], 1)
+
+        # Guardat fins que es desa un esdeveniment
+        with self.assertNumQueries(0):
+            calendar(day, day + timedelta(days=3))
+        self.create_event('Tarda', scheduled_date=day + timedelta(hours=17), status='live')
+        self.assertEqual(calendar(day, day + timedelta(days=3))[0]['count'], 3)
+
+    def test_calendar_view(self):
+        url = reverse('events:event_calendar')
+        self.assertEqual(self.client.get(url, {'bucket': 'week'}).status_code, 400)
+        self.assertEqual(self.client.get(url, {'category': 'cuina'}).status_code, 400)
+        data = self.client.get(url, {'bucket': 'hour', 'start': '2030-06-04T10:00', 'end': '2030-06-04T12:00'}).json()
+        self.assertEqual((data['start'], data['end']), ('2030-06-04T10:00:00+02:00', '2030-06-04T12:00:00+02:00'))
+        self.assertEqual(len(data['buckets']), 2)
+
+    def test_live_or_starting(self):
+        now = timezone.now()
+        Event.objects.filter(pk=self.torneig.pk).update(ends_at=now - timedelta(minutes=1))
+        live = self.create_event('En directe', status='live', scheduled_date=now - timedelta(minutes=10))
+        soon = self.create_event('Aviat', status='scheduled', scheduled_date=now + timedelta(hours=1))
+        self.create_event('Més tard', status='scheduled', scheduled_date=now + timedelta(hours=3))
+        self.assertEqual([event.pk for event in live_or_starting(hours=2)], [live.pk, soon.pk])
+        self.assertEqual([event.pk for event in live_or_starting(hours=2, limit=1)], [live.pk])
+
+    def test_list_filters_by_local_days(self):
+        self.create_event('Primer minut', scheduled_date=self.local(2030, 6, 4), status='scheduled')
+        self.create_event('Últim minut', scheduled_date=self.local(2030, 6, 4, 23, 59), status='scheduled')
+        self.create_event('Endemà', scheduled_date=self.local(2030, 6, 5), status='scheduled')
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('events:event_list'), {'date_from': '2030-06-04', 'date_to': '2030-06-04'})
+        self.assertEqual(sorted(event.title for event in response.context['page_obj']), ['Primer minut', 'Últim minut'])
+
+
+class TagTests(EventTestCase):
+
+    def counts(self):
+        return dict(Tag.objects.filter(event_count__gt=0).values_list('name', 'event_count'))
+
+    def test_parse_tags(self):
+        self.assertEqual(normalize_tag('  #Música   Indie '), 'música indie')
+        self.assertEqual(parse_tags('Música, #indie,  Indie ,, música'), {'música': 'Música', 'indie': 'indie'})
+        self.assertEqual(parse_tags(None), {})
+
+    def test_links_and_counts_follow_event_tags(self):
+        rock = self.create_event('Rock', tags='Música, Rock')
+        self.create_event('Jazz', tags='música, jazz')
+        self.assertEqual(self.counts(), {'música': 2, 'rock': 1, 'jazz': 1})
+        self.assertEqual(Tag.objects.get(name='música').label, 'Música')
+
+        rock.tags = 'Rock, Directe'
+        rock.save()
+        self.assertEqual(self.counts(), {'música': 1, 'rock': 1, 'jazz': 1, 'directe': 1})
+        rock.delete()
+        self.assertEqual(self.counts(), {'música': 1, 'jazz': 1})
+
+    def test_top_tags_are_cached_until_tags_change(self):
+        self.create_event('Rock', tags='Música, Rock')
+        self.create_event('Jazz', tags='música')
+        self.assertEqual(top_tags(), [('música', 'Música', 2), ('rock', 'Rock', 1)])
+        with self.assertNumQueries(0):
+            top_tags()
+        self.create_event('Pop', tags='pop')
+        self.assertEqual(len(top_tags()), 3)
+        self.assertEqual(top_tags(limit=1), [('música', 'Música', 2)])
+
+    def test_filter_is_an_exact_tag(self):
+        self.create_event('Festa', tags='party')
+        art = self.create_event('Exposició', tags='Art')
+        self.assertEqual(get_tag('#ART'), Tag.objects.get(name='art'))
+        self.assertIsNone(get_tag('par'))
+
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('events:event_list'), {'tag': 'art'})
+        self.assertEqual([event.pk for event in response.context['page_obj']], [art.pk])
+        response = self.client.get(reverse('events:event_list'), {'tag': 'part'})
+        # "part" no és cap etiqueta, encara que sigui el principi de "party"
+        self.assertEqual(list(response.context['page_obj']), [])
+
+    def test_rebuild_repairs_bulk_changes(self):
+        # bulk_create i update() no envien senyals
+        Event.objects.bulk_create([
+            Event(title='Sense senyal', description='x', creator=self.user, scheduled_date=timezone.now(),
+                  stream_url='https://www.twitch.tv/prova', tags='Retro, Gaming'),
+        ])
+        Event.objects.filter(pk=self.torneig.pk).update(tags='gaming')
+        self.assertEqual(self.counts(), {})
+        self.assertEqual(rebuild_tags(), (4, 2))
+        self.assertEqual(self.counts(), {'gaming': 2, 'retro': 1})
+        self.assertEqual(list(self.torneig.tag_set.values_list('name', flat=True)), ['gaming'])
+
+
+class TagBackfillMigrationTests(TransactionTestCase):
+    """events.0002_tag omple Tag i Event.tag_set amb el text de Event.tags"""
+
+    before = [('events', '0001_initial')]
+
+    def setUp(self):
+        executor = MigrationExecutor(connection)
+        self.latest = executor.loader.graph.leaf_nodes()
+        executor.migrate(self.before)
+        self.addCleanup(self.migrate_to_latest)
+        self.apps = executor.loader.project_state(self.before).apps
+
+    def migrate_to_latest(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(self.latest)
+
+    def test_backfill(self):
+        User = self.apps.get_model(*settings.AUTH_USER_MODEL.split('.'))
+        Event = self.apps.get_model('events', 'Event')
+        user = User.objects.create(username='marta')
+        fields = {'description': 'x', 'creator': user, 'scheduled_date': timezone.now(), 'stream_url': ''}
+        first = Event.objects.create(title='Primer', tags='Música,  #Indie Rock , música', **fields)
+        second = Event.objects.create(title='Segon', tags='indie rock', **fields)
+        Event.objects.create(title='Sense etiquetes', tags='', **fields)
+
+        executor = MigrationExecutor(connection)
+        executor.migrate([('events', '0002_tag')])
+        apps = executor.loader.project_state([('events', '0002_tag')]).apps
+        Tag = apps.get_model('events', 'Tag')
+        Event = apps.get_model('events', 'Event')
+
+        self.assertEqual(sorted(Tag.objects.values_list('name', 'label', 'event_count')),
+                         [('indie rock', 'Indie Rock', 2), ('música', 'Música', 1)])
+        self.assertEqual(sorted(Event.objects.get(pk=first.pk).tag_set.values_list('name', flat=True)),
+                         ['indie rock', 'música'])
+        self.assertEqual(list(Event.objects.get(pk=second.pk).tag_set.values_list('name', flat=True)),
+                         ['indie rock'])
+        # Els noms són els mateixos que dona normalize_tag
+        self.assertEqual({normalize_tag(label) for label in ('Música', '#Indie Rock')},
+                         set(Tag.objects.values_list('name', flat=True)))
+
+
+class SeedEventsTests(EventTestCase):
+
+    def seed(self, **options):
+        output = StringIO()
+        call_command('seed_events', events=30, messages=200, seed=7, stdout=output, **options)
+        return output.getvalue()
+
+    def seeded(self):
+        return list(
+            Event.objects.exclude(pk__in=[self.torneig.pk, self.concert.pk, self.final.pk])
+            .order_by('title').values_list('title', 'scheduled_date', 'duration', 'status')
+        )
+
+    def test_same_seed_and_anchor_give_the_same_events(self):
+        output = self.seed(anchor='2025-03-01T12:00:00+00:00')
+        self.assertIn("S'han creat 30 esdeveniments de prova en ", output)
+        first = self.seeded()
+        Event.objects.exclude(pk__in=[self.torneig.pk, self.concert.pk, self.final.pk]).delete()
+
+        self.seed(anchor='2025-03-01T12:00:00+00:00')
+        self.assertEqual(self.seeded(), first)
+
+    def test_invalid_anchor(self):
+        with self.assertRaisesMessage(CommandError, '--anchor'):
+            self.seed(anchor='dimarts')
+
+    def test_sqlite_is_seeded_by_one_process(self):
+        self.assertEqual(default_workers(), 1)
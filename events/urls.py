@@ -1,5 +1,5 @@
 from django.urls import path
-from . import views
+from . import api, views
 
 app_name = 'events'
 
@@ -10,5 +10,7 @@ urlpatterns = [
     path('<int:pk>/edit/', views.event_update_view, name='event_update'),
     path('<int:pk>/delete/', views.event_delete_view, name='event_delete'),
     path('my-events/', views.my_events_view, name='my_events'),
+    path('calendar/', views.event_calendar_view, name='event_calendar'),
+    path('api/events/', api.event_export_api, name='event_export_api'),
     path('category/<str:category>/', views.events_by_category_view, name='events_by_category'),
 ]
\ No newline at end of file
@@ -1,20 +1,60 @@
+from datetime import datetime, time, timedelta
+
 from django.shortcuts import render, get_object_or_404, redirect
+from django.http import JsonResponse
+from django.utils.dateparse import parse_date, parse_datetime
 from django.core.exceptions import ObjectDoesNotExist
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.contrib.auth import get_user_model
 from django.core.paginator import Paginator
-from django.db.models import Q
 from django.utils import timezone
 from chat.forms import ChatMessageForm
+from config.querybudget import query_budget
 from .models import Event
+from .calendar import BUCKETS, calendar, calendar_window
+from .cards import attach_cards
+from .facets import Facets, facet_pairs
+from .pagecache import cache_anonymous_page
+from .pagination import KeysetPaginator
+from .search import search_events, search_index
+from .tags import get_tag, top_tags
 from .forms import EventCreationForm, EventUpdateForm, EventSearchForm
 
 User = get_user_model()
 
+
+def _start_of_day(day):
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def _parse_day(value):
+    try:
+        return parse_date((value or '').strip())
+    except ValueError:
+        return None
+
+
+def _parse_moment(value):
+    """Data (``2025-12-04``) o data i hora (``2025-12-04T18:00``) del calendari, o None"""
+    value = (value or '').strip()
+    if not value:
+        return None
+    try:
+        moment = parse_datetime(value)
+    except ValueError:
+        return None
+    if moment is None:
+        day = _parse_day(value)
+        return _start_of_day(day) if day else None
+    return moment if timezone.is_aware(moment) else timezone.make_aware(moment)
+
+
+@query_budget(8)
+@cache_anonymous_page
 def event_list_view(request):
     # Obtener todos los eventos
-    events = Event.objects.all().order_by('-scheduled_date')
+    events = Event.objects.select_related('creator').order_by('-scheduled_date')
 
     # Crear formulario simple
     search_form = EventSearchForm(request.GET or None)
@@ -23,34 +63,71 @@ def event_list_view(request):
     search = request.GET.get('search', '').strip()
     category = request.GET.get('category', '')
     status = request.GET.get('status', '')
+    tag_label = request.GET.get('tag', '').strip()
+    date_from = _parse_day(request.GET.get('date_from'))
+    date_to = _parse_day(request.GET.get('date_to'))
+
+    page_number = request.GET.get('page')
+
+    # Filtre exacte per etiqueta (Tag.name és únic i indexat)
+    tag = get_tag(tag_label) if tag_label else None
+    if tag_label and tag is None:
+        events = events.none()
+    elif tag is not None:
+        events = events.filter(tag_set=tag)
+
+    # Rang de dates (dies sencers, hora local): rang sobre scheduled_date als índexs
+    if date_from:
+        events = events.filter(scheduled_date__gte=_start_of_day(date_from))
+    if date_to:
+        events = events.filter(scheduled_date__lt=_start_of_day(date_to + timedelta(days=1)))
+
+    # Les facetes es compten sense els filtres de categoria i estat (events.facets)
+    facet_key = {'search': search, 'tag': tag.name if tag else tag_label,
+                 'date_from': date_from, 'date_to': date_to}
 
     if search:
-        events = events.filter(
-            Q(title__icontains=search) |
-            Q(description__icontains=search) |
-            Q(tags__icontains=search)
-        )
+        # Cerca amb l'índex invertit (events.search): resultats per rellevància i
+        # només es porten de la base de dades els esdeveniments de la pàgina
+        narrowed = tag_label or date_from or date_to
+        tagged = set(events.values_list('pk', flat=True)) if narrowed else None
+        matches = search_events(search)
+        ranked = search_index.narrow(matches, category or None, status or None)
+        if tagged is not None:
+            matches = matches.restrict(tagged)
+            ranked = ranked.restrict(tagged)
+        facets = Facets(facet_pairs(matches, facet_key), category, status)
+        page_obj = Paginator(ranked, 12).get_page(page_number)
+        found = Event.objects.select_related('creator').in_bulk(page_obj.object_list)
+        page_obj.object_list = [found[pk] for pk in page_obj.object_list if pk in found]
+    else:
+        facets = Facets(facet_pairs(events, facet_key), category, status)
 
-    if category:
-        events = events.filter(category=category)
+        if category:
+            events = events.filter(category=category)
 
-    if status:
-        events = events.filter(status=status)
+        if status:
+            events = events.filter(status=status)
 
-    # Paginar
-    paginator = Paginator(events, 12)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+        # Paginar per clau: cada pàgina costa el mateix, sigui la que sigui
+        page_obj = KeysetPaginator(events, 12).get_page(request.GET.get('cursor'))
+
+    # Targetes de la pàgina des de la memòria cau (events.cards)
+    page_obj.object_list = attach_cards(page_obj.object_list)
 
     # Contexto simple
     context = {
         'page_obj': page_obj,
         'search_form': search_form,
+        'facets': facets,
+        'current_tag': tag,
+        'top_tags': top_tags(),
     }
 
     return render(request, 'events/event_list.html', context)
 
 
+@query_budget(6)
 def event_detail_view(request, pk):
     event = get_object_or_404(Event, pk=pk)
 
@@ -72,6 +149,7 @@ def event_detail_view(request, pk):
     })
 
 
+@query_budget(12)
 @login_required
 def event_create_view(request):
     if request.method == 'POST':
@@ -89,6 +167,7 @@ def event_create_view(request):
     return render(request, 'events/event_form.html', context)
 
 
+@query_budget(12)
 @login_required
 def event_update_view(request, pk):
     event = get_object_or_404(Event, pk=pk)
@@ -113,6 +192,7 @@ def event_update_view(request, pk):
     return render(request, 'events/event_form.html', context)
 
 
+@query_budget(12)
 @login_required
 def event_delete_view(request, pk):
     event = get_object_or_404(Event, pk=pk)
@@ -131,28 +211,32 @@ def event_delete_view(request, pk):
     return render(request, 'events/event_confirm_delete.html', context)
 
 
+@query_budget(6)
 @login_required
 def my_events_view(request):
-    events = Event.objects.filter(creator=request.user).select_related('creator')
+    own_events = Event.objects.filter(creator=request.user)
 
     status_filter = request.GET.get('status', '')
-    if status_filter:
-        events = events.filter(status=status_filter)
+    events = own_events.filter(status=status_filter) if status_filter else own_events
+    page_obj = KeysetPaginator(events, 20).get_page(request.GET.get('cursor'))
 
-    total_events = events.count()
-    live_events = events.filter(status='live').count()
-    scheduled_events = events.filter(status='scheduled').count()
+    # Els recomptes surten d'una sola agregació per estat (events.facets)
+    facets = Facets(facet_pairs(own_events, {'creator': request.user.pk}))
 
     context = {
-        'events': events,
-        'total_events': total_events,
-        'live_events': live_events,
-        'scheduled_events': scheduled_events,
+        'events': page_obj,
+        'page_obj': page_obj,
+        'total_events': facets.total,
+        'live_events': facets.status_counts['live'],
+        'scheduled_events': facets.status_counts['scheduled'],
+        'finished_events': facets.status_counts['finished'],
         'current_status_filter': status_filter,
     }
     return render(request, 'events/my_events.html', context)
 
 
+@query_budget(6)
+@cache_anonymous_page
 def events_by_category_view(request, category):
     valid_categories = [choice[0] for choice in Event.CATEGORY_CHOICES]
     if category not in valid_categories:
@@ -161,10 +245,36 @@ def events_by_category_view(request, category):
 
     events = Event.objects.filter(category=category).select_related('creator')
     category_name = dict(Event.CATEGORY_CHOICES)[category]
+    page_obj = KeysetPaginator(events, 12).get_page(request.GET.get('cursor'))
+    page_obj.object_list = attach_cards(page_obj.object_list)
 
     context = {
-        'events': events,
+        'events': page_obj,
+        'page_obj': page_obj,
         'category': category,
         'category_name': category_name,
     }
-    return render(request, 'events/events_by_category.html', context)
\ No newline at end of file
+    return render(request, 'events/events_by_category.html', context)
+
+
+@query_budget(4)
+def event_calendar_view(request):
+    """
+    Calendari en JSON: esdeveniments agrupats per dia o per hora dins d'una finestra.
+    ?bucket=day|hour&start=...&end=...&category=...
+    """
+    bucket = request.GET.get('bucket', 'day')
+    if bucket not in BUCKETS:
+        return JsonResponse({'error': 'bucket ha de ser day o hour'}, status=400)
+    category = request.GET.get('category', '')
+    if category and category not in dict(Event.CATEGORY_CHOICES):
+        return JsonResponse({'error': 'Categoria no vàlida'}, status=400)
+
+    start, end = calendar_window(_parse_moment(request.GET.get('start')),
+                                 _parse_moment(request.GET.get('end')), bucket)
+    return JsonResponse({
+        'bucket': bucket,
+        'start': start.isoformat(),
+        'end': end.isoformat(),
+        'buckets': calendar(start, end, bucket, category or None),
+    })
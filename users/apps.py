@@ -2,5 +2,6 @@ from django.apps import AppConfig
 
 
 class UsersConfig(AppConfig):
-    default_auto_field = 'django.db.models.BigAutoField'
+    # Les taules es van crear amb claus de 32 bits (users/migrations/0001_initial.py)
+    default_auto_field = 'django.db.models.AutoField'
     name = 'users'
@@ -1,12 +1,103 @@
 from django.core.management.base import BaseCommand
 from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
 from django.contrib.auth.models import Group
 from django.db import transaction
 from faker import Faker
+import random
 import unicodedata
 
+from config.seeding import (
+    Throughput, bulk_insert, chunk_random, chunks, context, default_workers, lookup, run_chunks,
+    skewed_weights,
+)
+from users.models import Follow
+
 User = get_user_model()
 
+GROUP_NAMES = ["Organitzadors", "Participants", "Moderadors"]
+DEFAULT_PASSWORD = "password123"
+
+# Noms i cognoms (de Faker) que es combinen per fer els usuaris
+NAME_POOL_SIZE = 500
+
+
+def clean_username(username):
+    return ''.join(
+        c for c in unicodedata.normalize('NFD', username)
+        if unicodedata.category(c) != 'Mn'
+    )
+
+
+def group_for(number):
+    """(grup, prefix del nom visible) de l'usuari número ``number``"""
+    if number % 5 == 0:
+        return "Organitzadors", "🎯 "
+    if number % 3 == 0:
+        return "Moderadors", "🛡 "
+    return "Participants", ""
+
+
+def create_users(task):
+    """Crea els usuaris del tros que encara no existeixen; retorna quants"""
+    index, start, stop = task
+    shared = context()
+    rng = chunk_random(shared["seed"], "users", index)
+    rows = {}
+    for number in range(start + 1, stop + 1):
+        first = rng.choice(shared["first_names"])
+        last = rng.choice(shared["last_names"])
+        username = clean_username(f"{first.lower()}.{last.lower()}{number}")
+        rows[username] = (first, last, *group_for(number))
+
+    existing = lookup(User, "username", rows)
+    users = []
+    for username, (first, last, group, prefix) in rows.items():
+        if username in existing:
+            continue
+        users.append(User(
+            username=username,
+            email=f"{username}@streamevents.com",
+            first_name=first,
+            last_name=last,
+            is_active=True,
+            display_name=f"{prefix}{first} {last}",
+            bio=f"Usuari de prova: {prefix}{first} {last}",
+            password=shared["password"],
+        ))
+    bulk_insert(User, users, shared["batch_size"])
+
+    pks = lookup(User, "username", [user.username for user in users])
+    Through = User.groups.through
+    user_column = f"{User.groups.field.m2m_field_name()}_id"
+    bulk_insert(Through, (
+        Through(**{user_column: pks[user.username], "group_id": shared["groups"][rows[user.username][2]]})
+        for user in users
+    ), shared["batch_size"])
+    return len(users)
+
+
+def create_follows(task):
+    """Seguiments dels usuaris del tros que encara no en tenen; retorna quants"""
+    index, start, stop = task
+    shared = context()
+    rng = chunk_random(shared["seed"], "follows", index)
+    followers = shared["user_pks"][start:stop]
+    already = lookup(Follow, "follower_id", followers, column="follower_id")
+
+    follows = []
+    for follower in followers:
+        # Els populars surten molt més sovint (Zipf): uns pocs tenen molts seguidors
+        targets = set(rng.choices(shared["popular"], cum_weights=shared["weights"],
+                                  k=rng.randint(0, 2 * shared["follows"])))
+        # Es sorteja igualment: els altres usuaris del tros reben els mateixos seguiments
+        if follower in already:
+            continue
+        targets.discard(follower)
+        follows.extend(Follow(follower_id=follower, following_id=target) for target in targets)
+    return bulk_insert(Follow, follows, shared["batch_size"])
+
+
 class Command(BaseCommand):
     """🌱 Genera usuaris i grups de prova per a StreamEvents."""
     help = "🌱 Genera usuaris de prova"
@@ -15,78 +106,88 @@ class Command(BaseCommand):
         # Arguments opcionals
         parser.add_argument("--users", type=int, default=10, help="Nombre d'usuaris a crear")
         parser.add_argument("--clear", action="store_true", help="Elimina usuaris existents")
+        parser.add_argument("--follows", type=int, default=0,
+                            help="Mitjana de seguiments per usuari (0 per no crear-ne)")
+        parser.add_argument("--skew", type=float, default=1.1,
+                            help="Exponent de Zipf de la popularitat (més alt, més concentrada)")
+        parser.add_argument("--seed", type=int, default=42, help="Llavor (mateixa llavor, mateixes dades)")
+        parser.add_argument("--batch-size", type=int, default=2000, help="Files per bulk_create")
+        parser.add_argument("--workers", type=int, default=default_workers(),
+                            help="Processos que generen i insereixen les dades")
 
-    @transaction.atomic
     def handle(self, *args, **options):
         num_users = options["users"]
-        clear = options["clear"]
-        fake = Faker("es_ES")
 
         # 🧹 Elimina usuaris si cal
-        if clear:
+        if options["clear"]:
             deleted = User.objects.filter(is_superuser=False).delete()
             self.stdout.write(self.style.WARNING(f"🗑️ Eliminats {deleted[0]} usuaris."))
 
-        # 👥 Crear grups
-        groups = {}
-        for name in ["Organitzadors", "Participants", "Moderadors"]:
-            group, _ = Group.objects.get_or_create(name=name)
-            groups[name] = group
-        self.stdout.write(self.style.SUCCESS("✅ Grups assegurats."))
-
-        # 👑 Crear admin
-        admin, created = User.objects.get_or_create(
-            username="admin",
-            defaults={
-                "email": "admin@streamevents.com",
-                "first_name": "Admin",
-                "last_name": "Sistema",
-                "is_staff": True,
-                "is_superuser": True,
-            },
-        )
-        if created:
-            admin.set_password("admin123")
-            admin.save()
-            admin.groups.add(groups["Organitzadors"])
-            self.stdout.write(self.style.SUCCESS("👑 Superusuari creat."))
-
-        # 👨‍💻 Crear usuaris de prova
-        for i in range(num_users):
-            first = fake.first_name()
-            last = fake.last_name()
-            username = self.clean_username(f"{first.lower()}.{last.lower()}{i+1}")
-            email = f"{username}@streamevents.com"
-
-            if (i + 1) % 5 == 0:
-                group = groups["Organitzadors"]
-                display = f"🎯 {first} {last}"
-            elif (i + 1) % 3 == 0:
-                group = groups["Moderadors"]
-                display = f"🛡 {first} {last}"
-            else:
-                group = groups["Participants"]
-                display = f"{first} {last}"
-
-            user, created = User.objects.get_or_create(
-                username=username,
+        groups = self.ensure_groups_and_admin()
+
+        # 👨‍💻 Crear usuaris de prova (amb un sol hash de contrasenya per a tots: PBKDF2 per
+        # usuari són centenars de mil·lisegons cadascun)
+        fake = Faker("es_ES")
+        fake.seed_instance(options["seed"])
+        shared = {
+            "seed": options["seed"],
+            "batch_size": options["batch_size"],
+            "password": make_password(DEFAULT_PASSWORD),
+            "groups": {group.name: group.pk for group in groups.values()},
+            "first_names": [fake.first_name() for _ in range(NAME_POOL_SIZE)],
+            "last_names": [fake.last_name() for _ in range(NAME_POOL_SIZE)],
+        }
+        progress = Throughput("usuaris", self.stdout.write, num_users)
+        for created in run_chunks(create_users, chunks(num_users), shared, options["workers"]):
+            progress.add(created)
+        self.stdout.write(self.style.SUCCESS(f"🎉 {progress.summary()}"))
+
+        if options["follows"]:
+            self.create_follows(options)
+
+    def ensure_groups_and_admin(self):
+        with transaction.atomic():
+            # 👥 Crear grups
+            groups = {}
+            for name in GROUP_NAMES:
+                group, _ = Group.objects.get_or_create(name=name)
+                groups[name] = group
+            self.stdout.write(self.style.SUCCESS("✅ Grups assegurats."))
+
+            # 👑 Crear admin
+            admin, created = User.objects.get_or_create(
+                username="admin",
                 defaults={
-                    "email": email,
-                    "first_name": first,
-                    "last_name": last,
-                    "is_active": True,
-                    "display_name": display,
-                    "bio": f"Usuari de prova: {display}",
+                    "email": "admin@streamevents.com",
+                    "first_name": "Admin",
+                    "last_name": "Sistema",
+                    "is_staff": True,
+                    "is_superuser": True,
                 },
             )
-
             if created:
-                user.set_password("password123")
-                user.save()
-                user.groups.add(group)
-                self.stdout.write(f"✅ {username} → {group.name}")
+                admin.set_password("admin123")
+                admin.save()
+                admin.groups.add(groups["Organitzadors"])
+                self.stdout.write(self.style.SUCCESS("👑 Superusuari creat."))
+        return groups
 
-        self.stdout.write(self.style.SUCCESS(f"🎉 {num_users} usuaris creats!"))
+    def create_follows(self, options):
+        user_pks = list(User.objects.filter(is_superuser=False).order_by("pk").values_list("pk", flat=True))
+        popular = list(user_pks)
+        random.Random(f"{options['seed']}:popular").shuffle(popular)
+        shared = {
+            "seed": options["seed"],
+            "batch_size": options["batch_size"],
+            "follows": options["follows"],
+            "user_pks": user_pks,
+            "popular": popular,
+            "weights": skewed_weights(len(popular), options["skew"]),
+        }
+        progress = Throughput("seguiments", self.stdout.write, len(user_pks) * options["follows"])
+        for created in run_chunks(create_follows, chunks(len(user_pks)), shared, options["workers"]):
+            progress.add(created)
+        self.stdout.write(self.style.SUCCESS(f"🤝 {progress.summary()}"))
 
     def clean_username(self, username):
         """
@@ -98,7 +199,4 @@ class Command(BaseCommand):
         >>> cmd.clean_username('iñaki.lópez')
         'inaki.lopez'
         """
-        return ''.join(
-            c for c in unicodedata.normalize('NFD', username)
-            if unicodedata.category(c) != 'Mn'
-        )
+        return clean_username(username)